@@ -12,7 +12,7 @@ export function TelegramImport() {
   const [selectedContactId, setSelectedContactId] = useState('')
   const [selectedFile, setSelectedFile] = useState<File | null>(null)
   const { contacts, isLoading: isLoadingContacts } = useContacts(token)
-  const importMutation = useImportTelegram()
+  const importMutation = useImportTelegram(token)
 
   if (!state) return null
 
@@ -24,43 +24,9 @@ export function WhatsAppImport() {
       return file
     }
 
+    // The backend reads the chat straight from the zip, media included
     if (file.name.endsWith('.zip')) {
-      try {
-        const JSZip = (await import('jszip')).default
-        const zip = new JSZip()
-        const contents = await zip.loadAsync(file)
-
-        const files = Object.keys(contents.files).filter(
-          (name) => !contents.files[name].dir,
-        )
-
-        if (files.length === 0) {
-          setFileError('El archivo ZIP está vacío')
-          return null
-        }
-
-        if (files.length > 1) {
-          setFileError('El archivo ZIP debe contener solo un archivo .txt')
-          return null
-        }
-
-        if (!files[0].endsWith('.txt')) {
-          setFileError('El archivo dentro del ZIP debe ser un .txt')
-          return null
-        }
-
-        const txtFileName = files[0]
-        const txtFileContent = await contents.files[txtFileName].async('blob')
-
-        const extractedFile = new File([txtFileContent], txtFileName, {
-          type: 'text/plain',
-        })
-
-        return extractedFile
-      } catch (error) {
-        setFileError('Error al leer el archivo ZIP')
-        return null
-      }
+      return file
     }
 
     setFileError('Solo se aceptan archivos .txt o .zip')
@@ -1,26 +1,42 @@
-import { useQueries } from '@tanstack/react-query'
+import { useRef } from 'react'
+import { useQuery } from '@tanstack/react-query'
 import { contactsApi } from '@/integrations/api/contact-api'
 import type { Stats } from '@/lib/types/stats-types'
 import type { Contact } from '@/lib/types/contact-types'
 
+// Health score and topic are refreshed in the background when stale. Polling
+// slows down the longer they stay stale, since a failing refresh is retried
+// with growing delays that can reach an hour
+const PENDING_STATS_REFETCH_MS = 3000
+const PENDING_STATS_MAX_REFETCH_MS = 5 * 60 * 1000
+
 export const useAllContactsStats = (contacts: Contact[], userToken: string) => {
-  const queries = useQueries({
-    queries: contacts.map((contact) => ({
-      queryKey: ['contact-stats', contact.id],
-      queryFn: () => contactsApi.getStats(contact.id, userToken),
-      enabled: !!userToken && contacts.length > 0,
-    })),
+  const staleSince = useRef<number | null>(null)
+  const {
+    data = [],
+    isLoading,
+    isError,
+  } = useQuery({
+    queryKey: ['contacts', 'stats'],
+    queryFn: () => contactsApi.getAllStats(userToken),
+    enabled: !!userToken && contacts.length > 0,
+    refetchInterval: (query) => {
+      if (!query.state.data?.some((entry) => entry.stale)) {
+        staleSince.current = null
+        return false
+      }
+      staleSince.current ??= Date.now()
+      const staleMs = Date.now() - staleSince.current
+      return Math.min(
+        Math.max(PENDING_STATS_REFETCH_MS, staleMs / 4),
+        PENDING_STATS_MAX_REFETCH_MS,
+      )
+    },
   })
 
-  const isLoading = queries.some((query) => query.isLoading)
-  const isError = queries.some((query) => query.isError)
-
   const statsMap = new Map<number, Stats>()
-  contacts.forEach((contact, index) => {
-    const queryResult = queries[index]
-    if (queryResult?.data) {
-      statsMap.set(contact.id, queryResult.data)
-    }
+  data.forEach((entry) => {
+    statsMap.set(entry.person_id, entry)
   })
 
   return { statsMap, isLoading, isError }
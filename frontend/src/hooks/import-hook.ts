@@ -20,12 +20,12 @@ export function useImportWhatsApp(userToken: string) {
   })
 }
 
-export function useImportTelegram() {
+export function useImportTelegram(userToken: string) {
   const queryClient = useQueryClient()
 
   return useMutation({
     mutationFn: ({ contactId, file }: { contactId: string; file: File }) =>
-      importApi.importTelegram(contactId, file),
+      importApi.importTelegram(contactId, file, userToken),
     onSuccess: () => {
       queryClient.invalidateQueries({ queryKey: ['contacts'] })
       queryClient.invalidateQueries({ queryKey: ['conversations'] })
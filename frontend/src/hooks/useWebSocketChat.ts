@@ -1,6 +1,7 @@
 import { useCallback, useEffect, useRef, useState } from 'react'
 import { API_BASE_URL } from '@/integrations/api/load-env'
 import type {
+  WebSocketDeltaMessage,
   WebSocketIncomingMessage,
   WebSocketOutgoingMessage,
   WebSocketErrorMessage,
@@ -12,6 +13,7 @@ export interface ChatMessage {
   from: 'user' | 'contact'
   text: string
   isLoading?: boolean
+  isStreaming?: boolean
 }
 
 interface UseWebSocketChatOptions {
@@ -45,7 +47,7 @@ export function useWebSocketChat({
   const getWebSocketUrl = useCallback(() => {
     const wsProtocol = API_BASE_URL.startsWith('https') ? 'wss' : 'ws'
     const baseUrl = API_BASE_URL.replace(/^https?:\/\//, '')
-    return `${wsProtocol}://${baseUrl}/chat/${personId}?token=${encodeURIComponent(token)}`
+    return `${wsProtocol}://${baseUrl}/chat/${personId}?token=${encodeURIComponent(token)}&stream=true`
   }, [personId, token])
 
   const connect = useCallback(() => {
@@ -74,15 +76,38 @@ export function useWebSocketChat({
             const errorMsg = data as WebSocketErrorMessage
             setError(errorMsg.error)
             onError?.(errorMsg.error)
+            // Drop the loading indicator or the partial response
+            setMessages((prev) =>
+              prev.filter((msg) => !msg.isLoading && !msg.isStreaming),
+            )
+            return
+          }
+
+          // It's a piece of the response, grow the message as it arrives
+          if ('delta' in data) {
+            const { delta } = data as WebSocketDeltaMessage
+            setMessages((prev) => {
+              const filtered = prev.filter((msg) => !msg.isLoading)
+              const last = filtered[filtered.length - 1]
+              if (last?.isStreaming) {
+                return [
+                  ...filtered.slice(0, -1),
+                  { ...last, text: last.text + delta },
+                ]
+              }
+              return [...filtered, { from: 'contact', text: delta, isStreaming: true }]
+            })
             return
           }
 
           // It's a response message
           const response = data as WebSocketOutgoingMessage
 
-          // Remove loading indicator and add real response
+          // Replace loading indicator or streamed text with the complete response
           setMessages((prev) => {
-            const filtered = prev.filter((msg) => !msg.isLoading)
+            const filtered = prev.filter(
+              (msg) => !msg.isLoading && !msg.isStreaming,
+            )
             return [...filtered, { from: 'contact', text: response.response }]
           })
 
@@ -131,9 +156,13 @@ export function useWebSocketChat({
     // Add user message to chat
     setMessages((prev) => [...prev, { from: 'user', text: message }])
 
-    // Add loading indicator
+    // Add loading indicator, unless the response already started arriving
     setTimeout(() => {
-      setMessages((prev) => [...prev, { from: 'contact', text: '', isLoading: true }])
+      setMessages((prev) =>
+        prev[prev.length - 1]?.from === 'user'
+          ? [...prev, { from: 'contact', text: '', isLoading: true }]
+          : prev,
+      )
     }, 300)
 
     // Send message to server
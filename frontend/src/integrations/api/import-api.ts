@@ -1,11 +1,15 @@
 import { API_BASE_URL } from './load-env'
+import type { ImportJob } from '@/lib/types/import-types'
+import { ImportJobSchema } from '@/lib/types/import-types'
+
+const JOB_POLL_INTERVAL_MS = 1000
 
 export const importApi = {
   async importWhatsApp(
     contactId: string,
     file: File,
     userToken: string,
-  ): Promise<void> {
+  ): Promise<ImportJob> {
     const formData = new FormData()
     formData.append('file', file)
     formData.append('contact_id', contactId)
@@ -25,21 +29,58 @@ export const importApi = {
       const error = await response.json()
       throw new Error(error.message || 'Failed to import WhatsApp chat')
     }
+
+    const job = ImportJobSchema.parse(await response.json())
+    return importApi.waitForJob(contactId, job.id, userToken)
   },
 
-  async importTelegram(contactId: string, file: File): Promise<void> {
+  async importTelegram(
+    contactId: string,
+    file: File,
+    userToken: string,
+  ): Promise<ImportJob> {
     const formData = new FormData()
     formData.append('file', file)
-    formData.append('contact_id', contactId)
 
-    const response = await fetch(`${API_BASE_URL}/import/telegram`, {
-      method: 'POST',
-      body: formData,
-    })
+    const response = await fetch(
+      `${API_BASE_URL}/contacts/${contactId}/records/integrations/telegram/upload`,
+      {
+        method: 'POST',
+        body: formData,
+        headers: {
+          'User-Token': userToken,
+        },
+      },
+    )
 
     if (!response.ok) {
       const error = await response.json()
       throw new Error(error.message || 'Failed to import Telegram chat')
     }
+
+    const job = ImportJobSchema.parse(await response.json())
+    return importApi.waitForJob(contactId, job.id, userToken)
+  },
+
+  async waitForJob(
+    contactId: string,
+    jobId: number,
+    userToken: string,
+  ): Promise<ImportJob> {
+    for (;;) {
+      const response = await fetch(
+        `${API_BASE_URL}/contacts/${contactId}/records/jobs/${jobId}`,
+        { headers: { 'User-Token': userToken } },
+      )
+      if (!response.ok) throw new Error('Failed to fetch import status')
+
+      const job = ImportJobSchema.parse(await response.json())
+      if (job.status === 'done') return job
+      if (job.status === 'failed') {
+        throw new Error(job.error || 'Failed to import chat')
+      }
+
+      await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+    }
   },
 }
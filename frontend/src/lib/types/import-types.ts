@@ -0,0 +1,15 @@
+import { z } from 'zod'
+
+export const ImportJobSchema = z.object({
+  id: z.number(),
+  source: z.enum(['whatsapp', 'telegram']),
+  status: z.enum(['queued', 'running', 'done', 'failed']),
+  filename: z.string(),
+  parsed_messages: z.number(),
+  inserted_records: z.number(),
+  duplicate_records: z.number(),
+  rows_per_second: z.number().nullable(),
+  error: z.string().nullable(),
+})
+
+export type ImportJob = z.infer<typeof ImportJobSchema>
@@ -8,6 +8,12 @@ export const StatsSchema = z.object({
   last_conversation_topic: z.string(),
   response_time_median_min: z.number(),
   communication_balance: z.number().min(0).max(1),
+  computed_at: z.iso.datetime().nullable(),
+  stale: z.boolean(),
 })
 
-export type Stats = z.infer<typeof StatsSchema>
\ No newline at end of file
+export type Stats = z.infer<typeof StatsSchema>
+
+export type ContactStatsEntry = Stats & {
+  person_id: number
+}
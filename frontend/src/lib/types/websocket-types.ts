@@ -7,7 +7,15 @@ export const WebSocketIncomingMessageSchema = z.object({
 
 export type WebSocketIncomingMessage = z.infer<typeof WebSocketIncomingMessageSchema>
 
-// Message received from server
+// Piece of a response received while it is generated (streaming connections)
+export const WebSocketDeltaMessageSchema = z.object({
+  delta: z.string(),
+  person_id: z.number(),
+})
+
+export type WebSocketDeltaMessage = z.infer<typeof WebSocketDeltaMessageSchema>
+
+// Complete response received from server
 export const WebSocketOutgoingMessageSchema = z.object({
   response: z.string(),
   person_id: z.number(),
@@ -24,6 +32,7 @@ export type WebSocketErrorMessage = z.infer<typeof WebSocketErrorMessageSchema>
 
 // Union type for all possible server messages
 export const WebSocketServerMessageSchema = z.union([
+  WebSocketDeltaMessageSchema,
   WebSocketOutgoingMessageSchema,
   WebSocketErrorMessageSchema,
 ])
@@ -82,7 +82,8 @@ function ContactShowComponent() {
     }
   }
 
-  const isLoading = messages.some((msg) => msg.isLoading)
+  // Busy until the response is complete, also while it streams in
+  const isLoading = messages.some((msg) => msg.isLoading || msg.isStreaming)
 
   if (!contact) {
     return (
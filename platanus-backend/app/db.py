@@ -27,6 +27,11 @@ class Person(Model):
     notes = fields.TextField()
 
     records: fields.ReverseRelation["Record"]
+    ingestion_jobs: fields.ReverseRelation["IngestionJob"]
+    daily_interactions: fields.ReverseRelation["DailyInteraction"]
+    conversation_sessions: fields.ReverseRelation["ConversationSession"]
+    session_analyses: fields.ReverseRelation["SessionAnalysis"]
+    persona_prompt: fields.BackwardOneToOneRelation["PersonaPrompt"]
 
     class Meta:  # type: ignore[reportIncompatibleVariableOverride]
         table = "person"
@@ -41,10 +46,39 @@ class Record(Model):
     source = fields.CharField(max_length=255)
     time = fields.DatetimeField()
     message_text = fields.TextField()
+    # sha256 of (person, time, sender, text), see record_fingerprint
+    fingerprint = fields.CharField(max_length=64, unique=True)
     created_at = fields.DatetimeField(auto_now_add=True)
 
     class Meta:  # type: ignore[reportIncompatibleVariableOverride]
         table = "record"
+        # Latest messages and conversation sessions are time ranges per person
+        indexes = (("person", "time"),)
+
+
+class IngestionJob(Model):
+    id = fields.IntField(primary_key=True)
+    person: fields.ForeignKeyRelation[Person] = fields.ForeignKeyField(
+        "models.Person", related_name="ingestion_jobs", on_delete=fields.CASCADE
+    )
+    source = fields.CharField(max_length=255)
+    # queued, running, done or failed
+    status = fields.CharField(max_length=20, default="queued")
+    filename = fields.CharField(max_length=255)
+    # Copy of the upload, removed once the job is done or failed
+    file_path = fields.CharField(max_length=1024)
+    inserted_records = fields.IntField(default=0)
+    duplicate_records = fields.IntField(default=0)
+    rows_per_second = fields.FloatField(null=True)
+    # Integration specific details, e.g. skipped messages or WhatsApp media
+    details = fields.JSONField(null=True)
+    error = fields.TextField(null=True)
+    created_at = fields.DatetimeField(auto_now_add=True)
+    started_at = fields.DatetimeField(null=True)
+    finished_at = fields.DatetimeField(null=True)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "ingestion_job"
 
 
 class ContactStatsCache(Model):
@@ -59,12 +93,135 @@ class ContactStatsCache(Model):
     last_interaction_date = fields.DatetimeField(null=True)
     response_time_median_min = fields.FloatField(null=True)
     communication_balance = fields.FloatField(null=True)
+    # Running state to fold new uploads in, see ContactStatsAccumulator
+    sent_count = fields.IntField(default=0)
+    received_count = fields.IntField(default=0)
+    last_sender = fields.CharField(max_length=255, null=True)
+    last_run_start = fields.DatetimeField(null=True)
+    response_time_sketch = fields.JSONField(null=True)
+    # Health score and topic predate the latest upload
+    llm_stale = fields.BooleanField(default=False)
+    # When the health score and topic were last analyzed
+    computed_at = fields.DatetimeField(null=True)
+    # When the deterministic stats last moved, newer changes refresh first
+    changed_at = fields.DatetimeField(null=True)
     created_at = fields.DatetimeField(auto_now_add=True)
 
     class Meta:  # type: ignore[reportIncompatibleVariableOverride]
         table = "contact_stats_cache"
 
 
+class DailyInteraction(Model):
+    """Per-day rollup of a person's records, kept up to date by each upload."""
+
+    id = fields.IntField(primary_key=True)
+    person: fields.ForeignKeyRelation[Person] = fields.ForeignKeyField(
+        "models.Person", related_name="daily_interactions", on_delete=fields.CASCADE
+    )
+    # UTC day, like the stored record times
+    day = fields.DateField()
+    sent_count = fields.IntField(default=0)
+    received_count = fields.IntField(default=0)
+    # Sender of the first message of the day
+    initiator = fields.CharField(max_length=255, null=True)
+    # Replies starting that day, see DailyStats
+    response_time_sketch = fields.JSONField(null=True)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "daily_interaction"
+        unique_together = (("person", "day"),)
+
+
+class ConversationSession(Model):
+    """Messages with no gap longer than SESSION_GAP_MINUTES between them.
+
+    Record ids don't follow time once uploads overlap, so a session's
+    messages are found by its time range on the (person, time) index.
+    """
+
+    id = fields.IntField(primary_key=True)
+    person: fields.ForeignKeyRelation[Person] = fields.ForeignKeyField(
+        "models.Person", related_name="conversation_sessions", on_delete=fields.CASCADE
+    )
+    started_at = fields.DatetimeField()
+    ended_at = fields.DatetimeField()
+    message_count = fields.IntField()
+    # Sender of the first message
+    initiator = fields.CharField(max_length=255)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "conversation_session"
+        indexes = (("person", "started_at"),)
+
+
+class SessionAnalysis(Model):
+    """LLM reading of one conversation session, done once per content.
+
+    Keyed by content rather than session id: sessions are recreated on
+    rebuilds, while a conversation whose messages didn't change keeps its
+    analysis. A session that grows gets a new hash and is analyzed again.
+    """
+
+    id = fields.IntField(primary_key=True)
+    person: fields.ForeignKeyRelation[Person] = fields.ForeignKeyField(
+        "models.Person", related_name="session_analyses", on_delete=fields.CASCADE
+    )
+    # sha256 of the session's record fingerprints, see session_content_hash
+    content_hash = fields.CharField(max_length=64, unique=True)
+    started_at = fields.DatetimeField()
+    topic = fields.CharField(max_length=255)
+    sentiment = fields.CharField(max_length=50)
+    summary = fields.TextField()
+    created_at = fields.DatetimeField(auto_now_add=True)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "session_analysis"
+
+
+class PersonaPrompt(Model):
+    """Persona system prompt of a person, kept between chat connections.
+
+    The prefix holds the profile, instructions and history as of the last
+    build. Records uploaded since are appended to the tail, so the prefix
+    stays byte-identical and keeps hitting the provider's prompt cache.
+    Versioned by the records it covers; rebuilt when the profile changes,
+    the tail grows past its budget or an upload reaches back in time.
+    """
+
+    id = fields.IntField(primary_key=True)
+    person: fields.OneToOneRelation[Person] = fields.OneToOneField(
+        "models.Person", related_name="persona_prompt", on_delete=fields.CASCADE
+    )
+    # sha256 of the profile fields and user name the prompt was built from
+    profile_hash = fields.CharField(max_length=64)
+    prefix = fields.TextField()
+    tail = fields.TextField(default="")
+    record_count = fields.IntField()
+    last_record_id = fields.IntField(null=True)
+    last_record_time = fields.DatetimeField(null=True)
+    updated_at = fields.DatetimeField(auto_now=True)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "persona_prompt"
+
+
+class LLMResponse(Model):
+    """Structured LLM response, reused for byte-identical requests.
+
+    Persistent tier of the LLM response cache, see app/utils/llm/cache.py.
+    """
+
+    # sha256 of model, messages, response schema and max_tokens
+    key = fields.CharField(max_length=64, primary_key=True)
+    response = fields.TextField()
+    created_at = fields.DatetimeField()
+    # Least recently used rows are evicted first
+    used_at = fields.DatetimeField(index=True)
+
+    class Meta:  # type: ignore[reportIncompatibleVariableOverride]
+        table = "llm_response"
+
+
 TORTOISE_ORM = {
     "connections": {"default": "sqlite://database.db"},
     "apps": {
@@ -1,10 +1,12 @@
 import os
 from typing import Annotated
 
+import instructor
 import jwt
 from fastapi import Header, HTTPException, Request
 
 from .db import User
+from .utils.llm.pool import llm_client_pool
 
 JWT_SECRET = os.getenv("JWT_SECRET", "fallback-secret-change-me")
 JWT_ALGORITHM = "HS256"
@@ -45,3 +47,8 @@ async def get_user_token_header(
     # Convert token to user object
     user = await user_token_to_user(user_token)
     return user
+
+
+async def get_llm_client() -> instructor.AsyncInstructor:
+    """The process-wide LLM client, sharing one connection pool."""
+    return llm_client_pool.client()
@@ -1,8 +1,32 @@
+from typing import Dict
+
 from fastapi import APIRouter
 
+from app.utils.llm.cache import CacheMetrics, llm_response_cache
+from app.utils.llm.pool import PoolMetrics, llm_client_pool
+from app.utils.llm.prompts import PromptKindMetrics, prompt_metrics
+
 router = APIRouter()
 
 
 @router.get("/")
 async def update_admin():
     return {"message": "Admin getting schwifty"}
+
+
+@router.get("/llm-pool", response_model=PoolMetrics)
+async def llm_pool_metrics():
+    """Usage of the shared LLM connection pool, to size LLM_MAX_CONNECTIONS."""
+    return llm_client_pool.metrics()
+
+
+@router.get("/llm-cache", response_model=CacheMetrics)
+async def llm_cache_metrics():
+    """Hits and misses of the LLM response cache."""
+    return llm_response_cache.metrics()
+
+
+@router.get("/llm-prompts", response_model=Dict[str, PromptKindMetrics])
+async def llm_prompt_metrics():
+    """Estimated prompt tokens and history kept or dropped, per kind of prompt."""
+    return prompt_metrics.kinds
@@ -1,4 +1,5 @@
 import logging
+from contextlib import asynccontextmanager
 
 from dotenv import load_dotenv
 from fastapi import Depends, FastAPI
@@ -13,12 +14,39 @@ from .internal import admin
 from .routers import users
 from .routers.chat import router as chat_router
 from .routers.contacts import create as persons
+from .routers.contacts.records.ingestion import ingestion_queue
+from .routers.contacts.records.utils import (
+    create_record_indexes,
+    upgrade_record_fingerprints,
+)
+from .routers.contacts.stats_cache import upgrade_stats_cache
+from .routers.contacts.stats_scheduler import stats_scheduler
+from .utils.chat_parsers.parallel import shutdown_parse_executor
+from .utils.llm.cache import llm_response_cache
+from .utils.llm.pool import llm_client_pool
 
 logging.basicConfig(
     level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 )
 
-app = FastAPI(dependencies=[])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await upgrade_record_fingerprints()
+    await create_record_indexes()
+    await upgrade_stats_cache()
+    await llm_client_pool.start()
+    await llm_response_cache.prune()
+    await ingestion_queue.start()
+    await stats_scheduler.start()
+    yield
+    await stats_scheduler.stop()
+    await ingestion_queue.stop()
+    await llm_client_pool.stop()
+    shutdown_parse_executor()
+
+
+app = FastAPI(dependencies=[], lifespan=lifespan)
 
 origins = [
     "http://localhost",
@@ -7,6 +7,17 @@ class WebSocketIncomingMessage(BaseModel):
     message: str = Field(description="The user's message to the person")
 
 
+class WebSocketDeltaMessage(BaseModel):
+    """Piece of the person's response, sent as it is generated.
+
+    Only sent on streaming connections, followed by a
+    `WebSocketOutgoingMessage` with the complete response.
+    """
+
+    delta: str = Field(description="Text to append to the response so far")
+    person_id: int = Field(description="ID of the person responding")
+
+
 class WebSocketOutgoingMessage(BaseModel):
     """Message sent from server to client via WebSocket."""
 
@@ -1,16 +1,20 @@
 import json
 import logging
+import time
 
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
+import instructor
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect
 
-from app.db import Person, Record, User
-from app.utils.llm.client import (
-    chat_with_person,
-    create_person_system_prompt,
-    get_instructor_client,
-)
+from app.db import Person, User
+from app.dependencies import get_llm_client
+from app.routers.contacts.persona_prompt import load_persona_prompt
+from app.utils.llm.client import chat_with_person, stream_chat_with_person
 
-from .models import WebSocketErrorMessage, WebSocketOutgoingMessage
+from .models import (
+    WebSocketDeltaMessage,
+    WebSocketErrorMessage,
+    WebSocketOutgoingMessage,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -26,28 +30,14 @@ async def authenticate_websocket(token: str) -> User | None:
     return user
 
 
-async def get_person_with_records(
-    person_id: int, user: User
-) -> tuple[Person | None, list[dict]]:
-    """Fetch person and their message records."""
-    person = await Person.get_or_none(id=person_id, user=user)
-    if not person:
-        return None, []
-
-    records = await Record.filter(person=person).order_by("time").all()
-    message_history = [
-        {
-            "sent_from": record.sent_from,
-            "message_text": record.message_text,
-            "time": record.time.isoformat(),
-        }
-        for record in records
-    ]
-    return person, message_history
-
-
 @router.websocket("/{person_id}")
-async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
+async def chat_websocket(
+    websocket: WebSocket,
+    person_id: int,
+    token: str = "",
+    stream: bool = False,
+    client: instructor.AsyncInstructor = Depends(get_llm_client),
+):
     """
     WebSocket endpoint for chatting with a person.
 
@@ -55,6 +45,9 @@ async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
 
     Send messages as JSON: {"message": "Hello!"}
     Receive responses as JSON: {"response": "Hi there!", "person_id": 123}
+
+    With ?stream=true the response arrives as it is generated, in frames
+    {"delta": "Hi ", "person_id": 123}, then the complete response as above.
     """
     # Authenticate user
     user = await authenticate_websocket(token)
@@ -63,7 +56,7 @@ async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
         return
 
     # Fetch person and validate ownership
-    person, message_history = await get_person_with_records(person_id, user)
+    person = await Person.get_or_none(id=person_id, user=user)
     if not person:
         await websocket.close(code=4004, reason="Person not found")
         return
@@ -74,20 +67,10 @@ async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
         f"WebSocket connected: user={user.username}, person={person.first_name}"
     )
 
-    # Initialize instructor client
-    client = get_instructor_client()
-
-    # Create system prompt with person context
-    system_prompt = create_person_system_prompt(
-        first_name=person.first_name,
-        last_name=person.last_name,
-        relationship_type=person.relationship_type,
-        personality_tags=person.personality_tags or [],
-        notes=person.notes or "",
-        birthday=str(person.birthday),
-        message_history=message_history,
-        user_name=user.username,
-    )
+    # Stored between connections, the prefix is identical across reconnects
+    # and uploads so the provider's prompt cache keeps serving it
+    persona_prompt = await load_persona_prompt(person, user)
+    system_prompt = [persona_prompt.prefix, persona_prompt.tail]
 
     # Session conversation history (in-memory, lasts for the WebSocket connection)
     conversation_history: list[dict] = []
@@ -109,20 +92,36 @@ async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
                     continue
 
                 # Get response from LLM
-                llm_response = chat_with_person(
-                    client=client,
-                    system_prompt=system_prompt,
-                    user_message=user_message,
-                    conversation_history=conversation_history,
-                )
+                if stream:
+                    reply = await stream_reply(
+                        websocket,
+                        client=client,
+                        system_prompt=system_prompt,
+                        user_message=user_message,
+                        conversation_history=conversation_history,
+                        person_id=person_id,
+                    )
+                else:
+                    started = time.perf_counter()
+                    llm_response = await chat_with_person(
+                        client=client,
+                        system_prompt=system_prompt,
+                        user_message=user_message,
+                        conversation_history=conversation_history,
+                    )
+                    reply = llm_response.message
+                    logger.info(
+                        f"Chat reply to person {person_id}: "
+                        f"first byte after {time.perf_counter() - started:.2f}s"
+                    )
 
                 # Add user message and assistant response to conversation history
                 conversation_history.append({"role": "user", "content": user_message})
-                conversation_history.append({"role": "assistant", "content": llm_response.message})
+                conversation_history.append({"role": "assistant", "content": reply})
 
-                # Send response back
+                # Send the complete response back
                 response = WebSocketOutgoingMessage(
-                    response=llm_response.message,
+                    response=reply,
                     person_id=person_id,
                 )
                 await websocket.send_text(response.model_dump_json())
@@ -139,3 +138,31 @@ async def chat_websocket(websocket: WebSocket, person_id: int, token: str = ""):
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: user={user.username}")
+
+
+async def stream_reply(
+    websocket: WebSocket,
+    client: instructor.AsyncInstructor,
+    system_prompt: list[str],
+    user_message: str,
+    conversation_history: list[dict],
+    person_id: int,
+) -> str:
+    """Send the LLM response as delta frames, return the complete text."""
+    started = time.perf_counter()
+    chunks: list[str] = []
+    async for chunk in stream_chat_with_person(
+        client=client,
+        system_prompt=system_prompt,
+        user_message=user_message,
+        conversation_history=conversation_history,
+    ):
+        if not chunks:
+            logger.info(
+                f"Chat reply to person {person_id}: "
+                f"first byte after {time.perf_counter() - started:.2f}s"
+            )
+        chunks.append(chunk)
+        delta = WebSocketDeltaMessage(delta=chunk, person_id=person_id)
+        await websocket.send_text(delta.model_dump_json())
+    return "".join(chunks)
@@ -0,0 +1,99 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from app.db import ConversationSession, Record
+
+from .stats_engine import compute_contacts_sessions
+
+# Silence after which the next message opens a new conversation
+SESSION_GAP_MINUTES = int(os.getenv("SESSION_GAP_MINUTES", "120"))
+
+
+class SessionBuilder:
+    """Splits a time-ordered message stream into conversation sessions.
+
+    Starts from the person's last stored session, so an upload continuing
+    that conversation extends it instead of opening a new one.
+    """
+
+    gap: timedelta
+    sessions: List[ConversationSession]
+
+    def __init__(
+        self,
+        person_id: int,
+        last_session: Optional[ConversationSession],
+        gap_minutes: float = SESSION_GAP_MINUTES,
+    ):
+        self.person_id = person_id
+        self.gap = timedelta(minutes=gap_minutes)
+        self.sessions = [last_session] if last_session else []
+
+    @classmethod
+    async def load(cls, person_id: int) -> "SessionBuilder":
+        return cls(person_id, await last_session(person_id))
+
+    def add(self, time: datetime, sent_from: str):
+        current = self.sessions[-1] if self.sessions else None
+        if current is None or time - current.ended_at > self.gap:
+            current = ConversationSession(
+                person_id=self.person_id,
+                started_at=time,
+                ended_at=time,
+                message_count=0,
+                initiator=sent_from,
+            )
+            self.sessions.append(current)
+        current.ended_at = time
+        current.message_count += 1
+
+    async def save(self):
+        new_sessions = []
+        for session in self.sessions:
+            if session.pk is None:
+                new_sessions.append(session)
+            else:
+                await session.save(update_fields=["ended_at", "message_count"])
+        await ConversationSession.bulk_create(new_sessions, batch_size=1000)
+
+
+async def rebuild_sessions(person_id: int, gap_minutes: float = SESSION_GAP_MINUTES):
+    await rebuild_contacts_sessions([person_id], gap_minutes)
+
+
+async def rebuild_contacts_sessions(
+    person_ids: List[int], gap_minutes: float = SESSION_GAP_MINUTES
+):
+    sessions = await compute_contacts_sessions(person_ids, gap_minutes)
+    await ConversationSession.filter(person_id__in=person_ids).delete()
+    await ConversationSession.bulk_create(
+        [
+            session
+            for person_sessions in sessions.values()
+            for session in person_sessions
+        ],
+        batch_size=1000,
+    )
+
+
+async def last_session(person_id: int) -> Optional[ConversationSession]:
+    return (
+        await ConversationSession.filter(person_id=person_id)
+        .order_by("-started_at")
+        .first()
+    )
+
+
+async def session_messages(
+    session: ConversationSession, limit: Optional[int] = None
+) -> List[Dict[str, str]]:
+    """The session's messages in time order, only its last `limit` if given."""
+    query = Record.filter(
+        person_id=session.person_id,
+        time__gte=session.started_at,
+        time__lte=session.ended_at,
+    ).order_by("-time", "-id")
+    if limit is not None:
+        query = query.limit(limit)
+    return list(reversed(await query.values("sent_from", "message_text")))
@@ -10,11 +10,13 @@ from app.db import User
 from app.dependencies import get_user_token_header
 
 from .records.get import router as records_router
+from .stats import batch_router as batch_stats_router
 from .stats import router as stats_router
 
 router = APIRouter(prefix="/contacts", tags=["contacts"])
 router.include_router(records_router)
 router.include_router(stats_router)
+router.include_router(batch_stats_router)
 
 relationship_types = (
     "Familia",
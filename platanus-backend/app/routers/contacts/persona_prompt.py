@@ -0,0 +1,190 @@
+import hashlib
+import json
+import os
+from datetime import datetime
+from typing import List, Optional
+
+from app.db import ContactStatsCache, Person, PersonaPrompt, Record, User
+from app.utils.llm.client import create_person_system_prompt, persona_history_line
+from app.utils.llm.prompts import PERSONA_PROMPT_TOKENS, estimate_tokens
+
+from .stats_cache import as_stored
+
+# Past this many estimated tokens of appended messages, the prompt is rebuilt
+# with them folded into a new prefix
+PERSONA_TAIL_TOKENS = int(os.getenv("PERSONA_TAIL_TOKENS", "2000"))
+# Bump when create_person_system_prompt changes, so stored prompts are rebuilt
+PERSONA_PROMPT_VERSION = 1
+
+
+class PersonaPromptUpdate:
+    """Appends the records inserted by one upload to the persona prompt tail.
+
+    Only if the person has a stored prompt and the upload continues after
+    its last message. Otherwise, or once the tail would outgrow its budget,
+    the stored prompt is dropped and the next chat connection rebuilds it.
+    """
+
+    person_id: int
+    lines: List[str]
+    tail_tokens: int
+    inserted: int
+    in_order: bool
+    first_time: Optional[datetime]
+    last_time: Optional[datetime]
+    last_fingerprint: Optional[str]
+
+    def __init__(self, person_id: int):
+        self.person_id = person_id
+        self.lines = []
+        self.tail_tokens = 0
+        self.inserted = 0
+        self.in_order = True
+        self.first_time = None
+        self.last_time = None
+        self.last_fingerprint = None
+
+    def add_records(self, records: List[Record]):
+        self.inserted += len(records)
+        for record in records:
+            time = as_stored(record.time)
+            if self.last_time is not None and time < self.last_time:
+                self.in_order = False
+            if self.first_time is None:
+                self.first_time = time
+            self.last_time = time
+            self.last_fingerprint = record.fingerprint
+            if self.tail_tokens <= PERSONA_TAIL_TOKENS:
+                # Past the budget the prompt is rebuilt anyway, stop collecting
+                line = persona_history_line(record.sent_from, record.message_text)
+                self.lines.append(line)
+                self.tail_tokens += estimate_tokens(line) + 1
+
+    async def save(self):
+        if not self.inserted:
+            return
+        prompt = await PersonaPrompt.get_or_none(person_id=self.person_id)
+        if prompt is None:
+            return
+
+        reaches_back = (
+            prompt.last_record_time is not None
+            and self.first_time is not None
+            and self.first_time < prompt.last_record_time
+        )
+        if (
+            not self.in_order
+            or reaches_back
+            # The prefix has no history heading to append under
+            or prompt.record_count == 0
+            or estimate_tokens(prompt.tail) + self.tail_tokens > PERSONA_TAIL_TOKENS
+        ):
+            await prompt.delete()
+            return
+
+        prompt.tail = "\n".join(
+            [prompt.tail, *self.lines] if prompt.tail else self.lines
+        )
+        prompt.record_count += self.inserted
+        # The records were inserted without reading back their ids
+        prompt.last_record_id = (
+            await Record.filter(fingerprint=self.last_fingerprint)
+            .first()
+            .values_list("id", flat=True)
+        )
+        prompt.last_record_time = self.last_time
+        await prompt.save(
+            update_fields=[
+                "tail",
+                "record_count",
+                "last_record_id",
+                "last_record_time",
+                "updated_at",
+            ]
+        )
+
+
+async def load_persona_prompt(person: Person, user: User) -> PersonaPrompt:
+    """The person's persona prompt, rebuilt only if it is out of date.
+
+    Checking a stored prompt reads two rows and scans no records. It is out
+    of date if the profile changed, its tail grew past PERSONA_TAIL_TOKENS
+    or it doesn't cover as many records as the stats cache counts.
+    """
+    prompt = await PersonaPrompt.get_or_none(person_id=person.id)
+    if prompt is not None and await is_current(prompt, person, user):
+        return prompt
+    return await build_persona_prompt(person, user, prompt)
+
+
+async def is_current(prompt: PersonaPrompt, person: Person, user: User) -> bool:
+    if prompt.profile_hash != profile_hash(person, user):
+        return False
+    if estimate_tokens(prompt.tail) > PERSONA_TAIL_TOKENS:
+        return False
+    # Uploads keep both counts in step, a mismatch means the prompt missed some
+    total_interactions = await ContactStatsCache.filter(
+        person_id=person.id
+    ).values_list("total_interactions", flat=True)
+    return not total_interactions or total_interactions[0] == prompt.record_count
+
+
+async def build_persona_prompt(
+    person: Person, user: User, prompt: Optional[PersonaPrompt] = None
+) -> PersonaPrompt:
+    # Only those that could fit in the prompt's token budget, see
+    # create_person_system_prompt
+    records = list(
+        reversed(
+            await Record.filter(person_id=person.id)
+            .order_by("-time", "-id")
+            .limit(PERSONA_PROMPT_TOKENS // 2)
+            .values("id", "sent_from", "message_text", "time")
+        )
+    )
+    prefix = create_person_system_prompt(
+        first_name=person.first_name,
+        last_name=person.last_name,
+        relationship_type=person.relationship_type,
+        personality_tags=person.personality_tags or [],
+        notes=person.notes or "",
+        birthday=str(person.birthday),
+        message_history=records,
+        user_name=user.username,
+    )
+    last_record = records[-1] if records else None
+    values = {
+        "profile_hash": profile_hash(person, user),
+        "prefix": prefix,
+        "tail": "",
+        "record_count": await Record.filter(person_id=person.id).count(),
+        "last_record_id": last_record["id"] if last_record else None,
+        "last_record_time": last_record["time"] if last_record else None,
+    }
+
+    if prompt is None:
+        prompt = PersonaPrompt(person_id=person.id, **values)
+        # A concurrent connection may have stored one first
+        await PersonaPrompt.bulk_create(
+            [prompt], on_conflict=["person_id"], update_fields=list(values)
+        )
+        return prompt
+    prompt.update_from_dict(values)
+    await prompt.save()
+    return prompt
+
+
+def profile_hash(person: Person, user: User) -> str:
+    profile = [
+        PERSONA_PROMPT_VERSION,
+        PERSONA_PROMPT_TOKENS,
+        person.first_name,
+        person.last_name,
+        person.relationship_type,
+        person.personality_tags or [],
+        person.notes or "",
+        str(person.birthday),
+        user.username,
+    ]
+    content = json.dumps(profile, ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
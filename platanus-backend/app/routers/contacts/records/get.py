@@ -21,7 +21,7 @@ async def get_chats_for_person(
     chat_messages = []
     for db_record in db_records:
         source = db_record.source
-        if source not in ["whatsapp"]:
+        if source not in ["whatsapp", "telegram"]:
             raise NotImplementedError(f"Chat source {db_record.source} not implemented")
         chat_message = ChatMessage(
             sent_from=db_record.sent_from,
@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import os
+import shutil
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import IngestionJob, Person, PersonaPrompt, User
+from app.routers.contacts.stats_cache import rebuild_stats_cache
+
+from .models import IngestionJobStatus
+from .writer import RecordWriter, WriteResult
+
+INGESTION_WORKERS = int(os.getenv("INGESTION_WORKERS", "1"))
+INGESTION_UPLOAD_DIR = os.getenv("INGESTION_UPLOAD_DIR", "uploads")
+
+# Runs one upload through an integration's parser and the given writer,
+# returning the integration specific details stored on the job.
+JobHandler = Callable[
+    [IngestionJob, UploadFile, RecordWriter], Awaitable[Optional[Dict[str, Any]]]
+]
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionQueue:
+    """In-process queue running uploads in the background.
+
+    Every job is a row in the database plus a copy of the upload on disk, so
+    work queued or running when the process stops is picked up again on the
+    next start. Records commit batch by batch and are deduplicated by
+    fingerprint, which makes rerunning an interrupted job safe. It also means
+    a job failing midway, e.g. on a third participant, keeps what it wrote.
+    The person's stats are recomputed before a job that had started runs
+    again, since what its previous run wrote never reached them.
+    """
+
+    workers: int
+    handlers: Dict[str, JobHandler]
+
+    def __init__(self, workers: int = INGESTION_WORKERS):
+        self.workers = workers
+        self.handlers = {}
+        self._queue: asyncio.Queue[int] = asyncio.Queue()
+        self._tasks: List[asyncio.Task] = []
+
+    def handler(self, source: str) -> Callable[[JobHandler], JobHandler]:
+        def register(handler: JobHandler) -> JobHandler:
+            self.handlers[source] = handler
+            return handler
+
+        return register
+
+    async def start(self):
+        os.makedirs(INGESTION_UPLOAD_DIR, exist_ok=True)
+        await self._resume_jobs()
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(max(self.workers, 1))
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def submit(
+        self, person_id: int, user: User, source: str, file: UploadFile
+    ) -> IngestionJob:
+        if not await Person.exists(id=person_id, user=user):
+            raise HTTPException(status_code=404, detail="Person not found")
+
+        filename = os.path.basename(file.filename or "upload")
+        file_path = os.path.join(INGESTION_UPLOAD_DIR, f"{uuid.uuid4().hex}-{filename}")
+        await run_in_threadpool(_copy_upload, file, file_path)
+
+        job = await IngestionJob.create(
+            person_id=person_id, source=source, filename=filename, file_path=file_path
+        )
+        self._queue.put_nowait(job.id)
+        logger.info(f"Queued {source} ingestion job {job.id} for person {person_id}")
+        return job
+
+    async def _resume_jobs(self):
+        unfinished = await IngestionJob.filter(
+            status__in=["queued", "running"]
+        ).order_by("id")
+        for job in unfinished:
+            if os.path.exists(job.file_path):
+                job.status = "queued"
+                await job.save(update_fields=["status"])
+                self._queue.put_nowait(job.id)
+                logger.info(f"Resuming ingestion job {job.id}")
+            else:
+                await self._finish(job, error="The uploaded file was lost.")
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception(f"Ingestion job {job_id} crashed")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: int):
+        job = await IngestionJob.get_or_none(id=job_id).select_related("person__user")
+        if job is None or job.status != "queued":
+            return
+
+        handler = self.handlers.get(job.source)
+        if handler is None:
+            await self._finish(job, error=f"Unsupported source {job.source}.")
+            return
+
+        if job.started_at is not None or job.inserted_records:
+            # The previous run was cut off before saving the stats and persona
+            # updates, e.g. the process was killed. Its records come back as
+            # duplicates now and would never be counted.
+            logger.info(f"Recomputing stats of person {job.person_id} for job {job.id}")
+            await rebuild_stats_cache(job.person_id)
+            await PersonaPrompt.filter(person_id=job.person_id).delete()
+
+        job.status = "running"
+        job.started_at = datetime.now(timezone.utc)
+        await job.save(update_fields=["status", "started_at"])
+
+        # A resumed job sees the records of its previous run again, as
+        # duplicates. Carry them over so the counts cover the whole upload.
+        previously_inserted = job.inserted_records
+
+        async def save_progress(result: WriteResult):
+            job.inserted_records = previously_inserted + result.inserted
+            job.duplicate_records = max(result.duplicates - previously_inserted, 0)
+            job.rows_per_second = result.rows_per_second
+            await job.save(
+                update_fields=[
+                    "inserted_records",
+                    "duplicate_records",
+                    "rows_per_second",
+                ]
+            )
+
+        writer = RecordWriter(atomic=False, on_batch=save_progress)
+        try:
+            with open(job.file_path, "rb") as upload_file:
+                upload = UploadFile(upload_file, filename=job.filename)
+                job.details = await handler(job, upload, writer)
+        except HTTPException as e:
+            await self._finish(job, error=str(e.detail))
+            return
+        except ValueError as e:
+            await self._finish(job, error=str(e))
+            return
+        except Exception:
+            logger.exception(f"Ingestion job {job.id} failed")
+            await self._finish(job, error="Unexpected error while importing the chat.")
+            return
+
+        await save_progress(writer.result)
+        await self._finish(job)
+
+    async def _finish(self, job: IngestionJob, error: Optional[str] = None):
+        job.status = "failed" if error else "done"
+        job.error = error
+        job.finished_at = datetime.now(timezone.utc)
+        await job.save(update_fields=["status", "error", "details", "finished_at"])
+
+        if os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        logger.info(f"Ingestion job {job.id} {job.status}")
+
+
+def ingestion_job_status(job: IngestionJob) -> IngestionJobStatus:
+    return IngestionJobStatus(
+        id=job.id,
+        source=job.source,  # type: ignore
+        status=job.status,  # type: ignore
+        filename=job.filename,
+        parsed_messages=job.inserted_records + job.duplicate_records,
+        inserted_records=job.inserted_records,
+        duplicate_records=job.duplicate_records,
+        rows_per_second=job.rows_per_second,
+        details=job.details,
+        error=job.error,
+        created_at=job.created_at,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+    )
+
+
+def _copy_upload(file: UploadFile, file_path: str):
+    file.file.seek(0)
+    with open(file_path, "wb") as destination:
+        shutil.copyfileobj(file.file, destination)
+
+
+ingestion_queue = IngestionQueue()
@@ -0,0 +1,96 @@
+import logging
+from typing import Annotated, Any, AsyncIterator, Dict, List, Set
+
+from fastapi import APIRouter, Depends, HTTPException, UploadFile
+
+from app.db import IngestionJob, User
+from app.dependencies import get_user_token_header
+from app.routers.contacts.records.ingestion import (
+    ingestion_job_status,
+    ingestion_queue,
+)
+from app.routers.contacts.records.models import IngestionJobStatus
+from app.routers.contacts.records.utils import ingest_parsed_messages
+from app.routers.contacts.records.writer import RecordWriter
+from app.utils.chat_parsers.message_parser import (
+    ParsedMessage,
+    validate_message_stream,
+)
+from app.utils.chat_parsers.specific.telegram_message_parser import (
+    TelegramMessagesParser,
+)
+from app.utils.chat_parsers.streaming import iter_text, iter_upload_chunks
+
+router = APIRouter(prefix="/integrations/telegram", tags=["integrations, telegram"])
+
+logger = logging.getLogger(__name__)
+
+JSON_CONTENT_TYPES = ("application/json", "application/octet-stream")
+
+
+@router.post("/participants")
+async def get_participants_from_file(file: UploadFile) -> List[str]:
+    logger.info("Received request to get participants from Telegram chat file")
+    _check_file(file)
+
+    participants: Set[str] = set()
+    try:
+        async for parsed_message in _parse_file(TelegramMessagesParser(), file):
+            participants.add(parsed_message.sender)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return list(participants)
+
+
+@router.post("/upload", status_code=202, response_model=IngestionJobStatus)
+async def upload_telegram_chat(
+    person_id: int,
+    file: UploadFile,
+    user: Annotated[User, Depends(get_user_token_header)],
+):
+    logger.info("Received Telegram chat upload")
+
+    _check_file(file)
+
+    job = await ingestion_queue.submit(person_id, user, "telegram", file)
+    return ingestion_job_status(job)
+
+
+@ingestion_queue.handler("telegram")
+async def _ingest_upload(
+    job: IngestionJob, file: UploadFile, writer: RecordWriter
+) -> Dict[str, Any]:
+    telegram_parser = TelegramMessagesParser()
+    await ingest_parsed_messages(
+        _parse_file(telegram_parser, file),
+        person_id=job.person_id,
+        user=job.person.user,
+        source="telegram",
+        writer=writer,
+    )
+    return {
+        "skipped_messages": telegram_parser.skipped_messages,
+    }
+
+
+def _parse_file(
+    telegram_parser: TelegramMessagesParser, file: UploadFile
+) -> AsyncIterator[ParsedMessage]:
+    chunks = iter_text(iter_upload_chunks(file))
+    return validate_message_stream(telegram_parser.aiter_parse(chunks))
+
+
+def _check_file(file: UploadFile):
+    if not file.filename:
+        raise HTTPException(status_code=400, detail="No file uploaded.")
+
+    if file.content_type not in JSON_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid content type. Only application/json is accepted.",
+        )
+    if not file.filename.endswith(".json"):
+        raise HTTPException(
+            status_code=400, detail="Invalid file type. Only .json files are accepted."
+        )
@@ -1,14 +1,23 @@
 import logging
-from typing import Annotated, List
+from typing import Annotated, Any, AsyncIterator, Dict, List, Set
 
 from fastapi import APIRouter, Depends, HTTPException, UploadFile
 
-from app.db import ContactStatsCache, Record, User
+from app.db import IngestionJob, User
 from app.dependencies import get_user_token_header
-from app.routers.contacts.records.utils import (
-    filter_already_uploaded_records,
-    parsed_chat_to_record,
+from app.routers.contacts.records.ingestion import (
+    ingestion_job_status,
+    ingestion_queue,
 )
+from app.routers.contacts.records.models import IngestionJobStatus
+from app.routers.contacts.records.utils import ingest_parsed_messages
+from app.routers.contacts.records.writer import RecordWriter
+from app.utils.chat_parsers.message_parser import (
+    ParsedMessage,
+    validate_message_stream,
+)
+from app.utils.chat_parsers.parallel import get_parse_executor
+from app.utils.chat_parsers.specific.whatsapp_archive import WhatsAppExport
 from app.utils.chat_parsers.specific.whatsapp_message_parser import (
     WhatsAppMessagesParser,
 )
@@ -17,21 +26,31 @@ router = APIRouter(prefix="/integrations/whatsapp", tags=["integrations, whatsap
 
 logger = logging.getLogger(__name__)
 
+ZIP_CONTENT_TYPES = (
+    "application/zip",
+    "application/x-zip-compressed",
+    "application/octet-stream",
+)
+
 
 @router.post("/participants")
 async def get_participants_from_file(file: UploadFile) -> List[str]:
     logger.info("Received request to get participants from WhatsApp chat file")
     _check_file(file)
 
-    content = await file.read()
-    lines: List[str] = content.decode("utf-8").splitlines()
-    whatsapp_parser = WhatsAppMessagesParser(raw_messages=lines)
-    parsed_chat = whatsapp_parser.parse()
+    participants: Set[str] = set()
+    try:
+        async for parsed_message in _parse_export(
+            WhatsAppMessagesParser(), WhatsAppExport(file)
+        ):
+            participants.add(parsed_message.sender)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    return parsed_chat.participants
+    return list(participants)
 
 
-@router.post("/upload")
+@router.post("/upload", status_code=202, response_model=IngestionJobStatus)
 async def upload_whatsapp_chat(
     person_id: int,
     file: UploadFile,
@@ -41,34 +60,57 @@ async def upload_whatsapp_chat(
 
     _check_file(file)
 
-    content = await file.read()
-    lines: List[str] = content.decode("utf-8").splitlines()
-    whatsapp_parser = WhatsAppMessagesParser(raw_messages=lines)
-    parsed_chat = whatsapp_parser.parse()
-
-    records = parsed_chat_to_record(parsed_chat=parsed_chat, person_id=person_id)
-
-    new_records = await filter_already_uploaded_records(
-        records=records, person_id=person_id, user=user
+    job = await ingestion_queue.submit(person_id, user, "whatsapp", file)
+    return ingestion_job_status(job)
+
+
+@ingestion_queue.handler("whatsapp")
+async def _ingest_upload(
+    job: IngestionJob, file: UploadFile, writer: RecordWriter
+) -> Dict[str, Any]:
+    whatsapp_parser = WhatsAppMessagesParser()
+    export = WhatsAppExport(file)
+    await ingest_parsed_messages(
+        _parse_export(whatsapp_parser, export),
+        person_id=job.person_id,
+        user=job.person.user,
+        source="whatsapp",
+        writer=writer,
     )
-
-    await Record.bulk_create(new_records)
-
-    # Invalidate stats cache for this person
-    await ContactStatsCache.filter(person_id=person_id).delete()
-
-    return {"uploaded_records": len(new_records)}
+    return {
+        "skipped_messages": whatsapp_parser.skipped_messages,
+        "media": [media.model_dump() for media in export.media],
+    }
+
+
+def _parse_export(
+    whatsapp_parser: WhatsAppMessagesParser, export: WhatsAppExport
+) -> AsyncIterator[ParsedMessage]:
+    # Parsing runs in the process pool so big exports don't block the loop
+    parsed_messages = whatsapp_parser.aiter_parse_parallel(
+        export.iter_lines(), executor=get_parse_executor()
+    )
+    return validate_message_stream(parsed_messages)
 
 
 def _check_file(file: UploadFile):
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file uploaded.")
 
+    if file.filename.lower().endswith(".zip"):
+        if file.content_type not in ZIP_CONTENT_TYPES:
+            raise HTTPException(
+                status_code=400,
+                detail="Invalid content type. Only application/zip is accepted.",
+            )
+        return
+
     if file.content_type != "text/plain":
         raise HTTPException(
             status_code=400, detail="Invalid content type. Only text/plain is accepted."
         )
     if not file.filename.endswith(".txt"):
         raise HTTPException(
-            status_code=400, detail="Invalid file type. Only .txt files are accepted."
+            status_code=400,
+            detail="Invalid file type. Only .txt and .zip files are accepted.",
         )
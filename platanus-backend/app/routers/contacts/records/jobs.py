@@ -0,0 +1,25 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, HTTPException
+
+from app.db import IngestionJob, User
+from app.dependencies import get_user_token_header
+from app.routers.contacts.records.ingestion import ingestion_job_status
+from app.routers.contacts.records.models import IngestionJobStatus
+
+router = APIRouter(prefix="/jobs", tags=["records, jobs"])
+
+
+@router.get("/{job_id}", response_model=IngestionJobStatus)
+async def get_ingestion_job(
+    person_id: int,
+    job_id: int,
+    user: Annotated[User, Depends(get_user_token_header)],
+) -> IngestionJobStatus:
+    job = await IngestionJob.get_or_none(
+        id=job_id, person_id=person_id, person__user__id=user.id
+    )
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return ingestion_job_status(job)
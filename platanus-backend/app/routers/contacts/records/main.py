@@ -1,6 +1,10 @@
 from fastapi import APIRouter
 
+from .integrations.telegram import router as telegram_router
 from .integrations.whatsapp import router as whatsapp_router
+from .jobs import router as jobs_router
 
 router = APIRouter(prefix="/{person_id}/records", tags=["records"])
 router.include_router(whatsapp_router)
+router.include_router(telegram_router)
+router.include_router(jobs_router)
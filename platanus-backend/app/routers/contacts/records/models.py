@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Literal
+from typing import Any, Dict, Literal, Optional
 
 from pydantic import BaseModel
 
@@ -9,3 +9,19 @@ class ChatMessage(BaseModel):
     source: Literal["whatsapp", "telegram", "custom"]
     time: datetime
     message_text: str
+
+
+class IngestionJobStatus(BaseModel):
+    id: int
+    source: Literal["whatsapp", "telegram"]
+    status: Literal["queued", "running", "done", "failed"]
+    filename: str
+    parsed_messages: int
+    inserted_records: int
+    duplicate_records: int
+    rows_per_second: Optional[float]
+    details: Optional[Dict[str, Any]]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
@@ -1,8 +1,26 @@
-from typing import List
+import hashlib
+import logging
+from datetime import datetime
+from typing import AsyncIterable, Dict, List, Optional, Tuple
 
-from app.db import Record, User
+from fastapi import HTTPException
+from tortoise import timezone
+from tortoise.transactions import in_transaction
+
+from app.db import ContactStatsCache, Person, PersonaPrompt, Record, User
+from app.routers.contacts.persona_prompt import PersonaPromptUpdate
+from app.routers.contacts.stats_cache import StatsCacheUpdate
+from app.routers.contacts.stats_scheduler import stats_scheduler
 from app.utils.chat_parsers.message_parser import ParsedChat, ParsedMessage
 
+from .writer import RecordWriter, WriteResult
+
+logger = logging.getLogger(__name__)
+
+# Kept in SQLite's user_version. Bump when record_fingerprint changes, so
+# upgrade_record_fingerprints recomputes the stored ones.
+FINGERPRINT_VERSION = 1
+
 
 def parsed_chat_to_record(parsed_chat: ParsedChat, person_id: int) -> List[Record]:
     records: List[Record] = []
@@ -27,20 +45,174 @@ def parsed_message_to_record(
         source=source,
         time=parsed_message.timestamp,
         message_text=parsed_message.message_text,
+        fingerprint=record_fingerprint(
+            person_id=person_id,
+            time=parsed_message.timestamp,
+            sent_from=parsed_message.sender,
+            message_text=parsed_message.message_text,
+        ),
+    )
+
+
+def record_fingerprint(
+    person_id: int, time: datetime, sent_from: str, message_text: str
+) -> str:
+    """Content hash identifying a message, unique per person in the record table.
+
+    Line breaks are left out of the text: WhatsApp exports uploaded before
+    continuation lines were joined with newlines have them glued together.
+    """
+    text = message_text.replace("\n", "")
+    content = "\x1f".join((str(person_id), time.isoformat(), sent_from, text))
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+async def upgrade_record_fingerprints():
+    """Add and backfill the fingerprint column in databases that predate it.
+
+    generate_schemas only creates missing tables, so an older record table
+    lacks the column. Stored fingerprints are also recomputed whenever
+    FINGERPRINT_VERSION is bumped. Records that turn out to be duplicates
+    are deleted, along with the cached stats and persona prompts of their
+    people. Runs once per version, at startup, in one transaction.
+    """
+    async with in_transaction() as connection:
+        rows = await connection.execute_query_dict("PRAGMA user_version")
+        if rows[0]["user_version"] >= FINGERPRINT_VERSION:
+            return
+
+        columns = await connection.execute_query_dict('PRAGMA table_info("record")')
+        added = not any(column["name"] == "fingerprint" for column in columns)
+        if added:
+            logger.info("Adding the record fingerprint column")
+            await connection.execute_script(
+                'ALTER TABLE "record" ADD COLUMN "fingerprint" VARCHAR(64)'
+            )
+
+        updated = 0
+        duplicated_person_ids: List[int] = []
+        person_ids = (
+            await Record.all()
+            .using_db(connection)
+            .distinct()
+            .values_list("person_id", flat=True)
+        )
+        for person_id in person_ids:
+            fingerprints, duplicate_ids = await _recompute_fingerprints(
+                person_id, connection
+            )
+            if duplicate_ids:
+                duplicated_person_ids.append(person_id)
+                await Record.filter(id__in=duplicate_ids).using_db(connection).delete()
+            if fingerprints:
+                await connection.execute_many(
+                    'UPDATE "record" SET "fingerprint" = ? WHERE "id" = ?',
+                    [[fingerprint, id] for id, fingerprint in fingerprints.items()],
+                )
+                updated += len(fingerprints)
+
+        if duplicated_person_ids:
+            for model in (ContactStatsCache, PersonaPrompt):
+                await model.filter(person_id__in=duplicated_person_ids).using_db(
+                    connection
+                ).delete()
+        if added:
+            await connection.execute_script(
+                'CREATE UNIQUE INDEX IF NOT EXISTS "uid_record_fingerprint" '
+                'ON "record" ("fingerprint")'
+            )
+        await connection.execute_script(f"PRAGMA user_version = {FINGERPRINT_VERSION}")
+    logger.info(
+        f"Record fingerprints at version {FINGERPRINT_VERSION}: {updated} updated, "
+        f"duplicates removed for {len(duplicated_person_ids)} people"
+    )
+
+
+async def create_record_indexes():
+    """Create the (person, time) record index in databases that predate it.
+
+    generate_schemas skips the indexes of tables that already exist. The
+    name is the one it gives the index in new databases, so those already
+    have it.
+    """
+    await Record._meta.db.execute_script(
+        'CREATE INDEX IF NOT EXISTS "idx_record_person__b4ee9c" '
+        'ON "record" ("person_id", "time")'
     )
 
 
-async def filter_already_uploaded_records(
-    records: List[Record], person_id: int, user: User
-) -> List[Record]:
-    existing_records = await Record.filter(
-        person_id=person_id, person__user__id=user.id
+async def _recompute_fingerprints(
+    person_id: int, connection
+) -> Tuple[Dict[int, str], List[int]]:
+    """Changed fingerprints by record id, and the ids of later duplicates."""
+    records = (
+        await Record.filter(person_id=person_id)
+        .using_db(connection)
+        .order_by("id")
+        .values_list("id", "time", "sent_from", "message_text", "fingerprint")
     )
-    existing_time = set([existing_record.time for existing_record in existing_records])
+    changed: Dict[int, str] = {}
+    duplicate_ids: List[int] = []
+    seen = set()
+    for id, time, sent_from, message_text, stored in records:
+        # Parsers produce naive datetimes, stored ones read back aware
+        fingerprint = record_fingerprint(
+            person_id, timezone.make_naive(time), sent_from, message_text
+        )
+        if fingerprint in seen:
+            duplicate_ids.append(id)
+            continue
+        seen.add(fingerprint)
+        if fingerprint != stored:
+            changed[id] = fingerprint
+    return changed, duplicate_ids
+
+
+async def ingest_parsed_messages(
+    parsed_messages: AsyncIterable[ParsedMessage],
+    person_id: int,
+    user: User,
+    source: str,
+    writer: Optional[RecordWriter] = None,
+) -> WriteResult:
+    """Convert parsed messages from any integration and write them in batches.
+
+    Duplicates are resolved by the unique fingerprint index, see RecordWriter.
+    Defaults to an atomic writer so a failed upload leaves nothing behind.
+    The person's stats cache and persona prompt are updated from the
+    inserted records.
+    """
+    if not await Person.exists(id=person_id, user=user):
+        raise HTTPException(status_code=404, detail="Person not found")
+
+    records = (
+        parsed_message_to_record(
+            parsed_message=parsed_message, person_id=person_id, source=source
+        )
+        async for parsed_message in parsed_messages
+    )
+    writer = writer or RecordWriter()
+    stats_update = await StatsCacheUpdate.load(person_id)
+    persona_update = PersonaPromptUpdate(person_id)
+
+    def on_insert(new_records: List[Record]):
+        stats_update.add_records(new_records)
+        persona_update.add_records(new_records)
 
-    filtered_records = []
-    for record in records:
-        if record.time not in existing_time:
-            filtered_records.append(record)
+    writer.on_insert = on_insert
+    try:
+        result = await writer.write(records)
+    except BaseException:
+        # Part of the upload may or may not have been committed, let the
+        # next read rebuild the stats from what is actually stored
+        await ContactStatsCache.filter(person_id=person_id).delete()
+        await PersonaPrompt.filter(person_id=person_id).delete()
+        raise
 
-    return filtered_records
+    await stats_update.save()
+    await persona_update.save()
+    if result.inserted:
+        # Even if a refresh is running, it may have read the older messages
+        stats_scheduler.touch_user(user.id)
+        stats_scheduler.schedule(person_id, user.id, timezone.now(), force=True)
+    return result
@@ -0,0 +1,143 @@
+import logging
+import os
+import time
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    List,
+    Optional,
+    TypeVar,
+)
+
+from pydantic import BaseModel
+from tortoise.backends.base.client import BaseDBAsyncClient
+from tortoise.transactions import in_transaction
+
+from app.db import Record
+
+RECORD_BATCH_SIZE = int(os.getenv("RECORD_BATCH_SIZE", "1000"))
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class WriteResult(BaseModel):
+    # elapsed_seconds covers consuming the source too, so for a lazy stream the
+    # rate is the throughput of the whole pipeline, not of SQLite alone.
+    inserted: int = 0
+    duplicates: int = 0
+    batches: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        if not self.elapsed_seconds:
+            return 0.0
+        return (self.inserted + self.duplicates) / self.elapsed_seconds
+
+
+class RecordWriter:
+    """Writes a stream of records in batches inside explicit transactions.
+
+    Each batch is deduplicated against the fingerprint index and inserted
+    with insert-or-ignore. An atomic writer wraps the whole stream in one
+    transaction, so a failure midway, including in the source stream, rolls
+    back the import. Otherwise every batch commits on its own. That releases
+    the SQLite connection between batches, and rerunning the same stream
+    later is safe.
+    """
+
+    batch_size: int
+    atomic: bool
+    on_batch: Optional[Callable[[WriteResult], Awaitable[None]]]
+    on_insert: Optional[Callable[[List[Record]], None]]
+    result: WriteResult
+
+    def __init__(
+        self,
+        batch_size: int = RECORD_BATCH_SIZE,
+        atomic: bool = True,
+        on_batch: Optional[Callable[[WriteResult], Awaitable[None]]] = None,
+        on_insert: Optional[Callable[[List[Record]], None]] = None,
+    ):
+        self.batch_size = batch_size
+        self.atomic = atomic
+        self.on_batch = on_batch
+        self.on_insert = on_insert
+        self.result = WriteResult()
+
+    async def write(self, records: AsyncIterable[Record]) -> WriteResult:
+        self._start = time.perf_counter()
+        if self.atomic:
+            async with in_transaction() as connection:
+                async for batch in batched(records, self.batch_size):
+                    await self._write_batch(batch, connection)
+        else:
+            async for batch in batched(records, self.batch_size):
+                async with in_transaction() as connection:
+                    await self._write_batch(batch, connection)
+                await self._report_batch()
+        self.result.elapsed_seconds = time.perf_counter() - self._start
+
+        logger.info(
+            f"Inserted {self.result.inserted} records "
+            f"({self.result.duplicates} duplicates) in {self.result.batches} "
+            f"batches, {self.result.rows_per_second:.0f} rows/s"
+        )
+        return self.result
+
+    async def _write_batch(self, batch: List[Record], connection: BaseDBAsyncClient):
+        new_records = await filter_already_uploaded_records(batch, using_db=connection)
+        await Record.bulk_create(
+            new_records, ignore_conflicts=True, using_db=connection
+        )
+        if self.on_insert is not None:
+            self.on_insert(new_records)
+        self.result.inserted += len(new_records)
+        self.result.duplicates += len(batch) - len(new_records)
+        self.result.batches += 1
+        if self.atomic:
+            await self._report_batch()
+
+    async def _report_batch(self):
+        self.result.elapsed_seconds = time.perf_counter() - self._start
+        if self.on_batch is not None:
+            await self.on_batch(self.result)
+
+
+async def filter_already_uploaded_records(
+    records: List[Record], using_db: Optional[BaseDBAsyncClient] = None
+) -> List[Record]:
+    """Drop records already stored or repeated in the batch, by fingerprint.
+
+    Only the batch's fingerprints are looked up, so memory stays O(batch)
+    no matter how many records the person already has.
+    """
+    existing_fingerprints = set(
+        await Record.filter(fingerprint__in=[record.fingerprint for record in records])
+        .using_db(using_db)
+        .values_list("fingerprint", flat=True)
+    )
+
+    filtered_records = []
+    for record in records:
+        if record.fingerprint not in existing_fingerprints:
+            existing_fingerprints.add(record.fingerprint)
+            filtered_records.append(record)
+
+    return filtered_records
+
+
+async def batched(items: AsyncIterable[T], size: int) -> AsyncIterator[List[T]]:
+    batch: List[T] = []
+    async for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import logging
+import os
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import instructor
+
+from app.db import ConversationSession, Person, Record, SessionAnalysis, User
+from app.utils.llm.client import ConversationAnalysis, analyze_conversation
+
+from .conversation_sessions import session_messages
+
+# Only the latest sessions feed the health analysis, older ones are never sent
+SESSION_ANALYSIS_HISTORY = int(os.getenv("SESSION_ANALYSIS_HISTORY", "10"))
+# A session is analyzed from its most recent messages
+LLM_HISTORY_MESSAGES = 50
+
+# Awaited before each LLM call, e.g. to wait on the hourly budget
+BeforeLLMCall = Callable[[], Awaitable[None]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class RecentSession:
+    session: ConversationSession
+    content_hash: str
+    # Stored analysis of these exact messages, if any
+    analysis: Optional[SessionAnalysis]
+
+
+async def load_recent_sessions(person: Person) -> List[RecentSession]:
+    """The person's latest sessions, oldest first, with their stored analyses.
+
+    Sessions analyzed before are matched by content hash, so only new or
+    grown sessions lack one. Analyses of sessions that grew or fell out of
+    the window are deleted, they would never be read again.
+    """
+    sessions = list(
+        reversed(
+            await ConversationSession.filter(person_id=person.id)
+            .order_by("-started_at")
+            .limit(SESSION_ANALYSIS_HISTORY)
+        )
+    )
+    hashes = [await session_content_hash(session) for session in sessions]
+    stored: Dict[str, SessionAnalysis] = {
+        analysis.content_hash: analysis
+        for analysis in await SessionAnalysis.filter(content_hash__in=hashes)
+    }
+    await SessionAnalysis.filter(person_id=person.id).exclude(
+        content_hash__in=hashes
+    ).delete()
+    return [
+        RecentSession(session, content_hash, stored.get(content_hash))
+        for session, content_hash in zip(sessions, hashes)
+    ]
+
+
+async def analyze_recent_sessions(
+    client: instructor.AsyncInstructor,
+    person: Person,
+    user: User,
+    before_llm_call: Optional[BeforeLLMCall] = None,
+    concurrent: bool = False,
+    use_cache: bool = True,
+) -> List[Optional[SessionAnalysis]]:
+    """Analyses of the person's latest sessions, oldest first.
+
+    Only sessions without a stored analysis reach the LLM, one call each,
+    all at once if `concurrent`. An entry is None if its analysis failed,
+    it is retried on the next refresh.
+    """
+    recent = await load_recent_sessions(person)
+
+    async def analysis_of(entry: RecentSession) -> Optional[SessionAnalysis]:
+        if entry.analysis is not None:
+            return entry.analysis
+        if before_llm_call is not None:
+            await before_llm_call()
+        return await analyze_session(
+            client, entry.session, entry.content_hash, person, user, use_cache
+        )
+
+    if concurrent:
+        return list(await asyncio.gather(*(analysis_of(entry) for entry in recent)))
+    return [await analysis_of(entry) for entry in recent]
+
+
+async def analyze_session(
+    client: instructor.AsyncInstructor,
+    session: ConversationSession,
+    content_hash: str,
+    person: Person,
+    user: User,
+    use_cache: bool = True,
+) -> Optional[SessionAnalysis]:
+    messages = await session_messages(session, limit=LLM_HISTORY_MESSAGES)
+    try:
+        result = await analyze_conversation(
+            client=client,
+            first_name=person.first_name,
+            user_name=user.username,
+            message_history=messages,
+            use_cache=use_cache,
+        )
+    except Exception:
+        logger.warning(f"Analysis of a session of person {person.id} failed")
+        return None
+    return await store_session_analysis(session, content_hash, result)
+
+
+async def store_session_analysis(
+    session: ConversationSession, content_hash: str, result: ConversationAnalysis
+) -> SessionAnalysis:
+    analysis = SessionAnalysis(
+        person_id=session.person_id,
+        content_hash=content_hash,
+        started_at=session.started_at,
+        topic=result.topic,
+        sentiment=result.sentiment,
+        summary=result.summary,
+    )
+    # A concurrent refresh may have stored the same session meanwhile
+    await SessionAnalysis.bulk_create([analysis], ignore_conflicts=True)
+    return analysis
+
+
+async def session_content_hash(session: ConversationSession) -> str:
+    fingerprints = (
+        await Record.filter(
+            person_id=session.person_id,
+            time__gte=session.started_at,
+            time__lte=session.ended_at,
+        )
+        # Not by id, the same messages uploaded again keep their hash
+        .order_by("time", "fingerprint").values_list("fingerprint", flat=True)
+    )
+    return hashlib.sha256("".join(fingerprints).encode("ascii")).hexdigest()
@@ -1,16 +1,16 @@
-from datetime import datetime, timedelta
+from datetime import date, datetime
 from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
 
-from app.db import ContactStatsCache, Person, Record, User
+from app.db import ContactStatsCache, Person, User
 from app.dependencies import get_user_token_header
-from app.utils.llm.client import (
-    analyze_last_conversation_topic,
-    analyze_relationship_health,
-    get_instructor_client,
-)
+from app.utils.stats.response_times import ResponseTimes
+
+from .stats_cache import create_stats_caches, rebuild_stats_cache
+from .stats_rollup import Bucket, interaction_periods
+from .stats_scheduler import stats_scheduler
 
 
 class ContactStats(BaseModel):
@@ -20,169 +20,144 @@ class ContactStats(BaseModel):
     last_interaction_date: Optional[datetime]
     last_conversation_topic: str
     response_time_median_min: Optional[float]
+    response_time_p90_min: Optional[float]
+    response_time_p99_min: Optional[float]
+    # Median time the user takes to answer the contact, and vice versa
+    user_response_time_median_min: Optional[float]
+    contact_response_time_median_min: Optional[float]
     communication_balance: Optional[float]
+    # When health score and topic were analyzed, None for the placeholders
+    computed_at: Optional[datetime]
+    # Messages arrived since, a background refresh is queued
+    stale: bool
 
 
-router = APIRouter(prefix="/{person_id}/stats", tags=["stats"])
+class ContactStatsEntry(ContactStats):
+    person_id: int
 
 
-@router.get("", response_model=ContactStats)
-async def get_person(
-    person_id: int,
-    user: Annotated[User, Depends(get_user_token_header)],
-):
-    # Check if cached stats exist
-    cached_stats = await ContactStatsCache.filter(
-        person_id=person_id, person__user_id=user.id
-    ).first()
-
-    if cached_stats:
-        return ContactStats(
-            health_score=cached_stats.health_score,
-            health_status=cached_stats.health_status,
-            total_interactions=cached_stats.total_interactions,
-            last_interaction_date=cached_stats.last_interaction_date,
-            last_conversation_topic=cached_stats.last_conversation_topic,
-            response_time_median_min=cached_stats.response_time_median_min,
-            communication_balance=cached_stats.communication_balance,
-        )
+class InteractionBucket(BaseModel):
+    # First day of the bucket, weeks start on Monday
+    start: date
+    sent_count: int
+    received_count: int
+    # Days in the bucket on which the user, or the contact, wrote first
+    user_initiated_days: int
+    contact_initiated_days: int
+    response_time_median_min: Optional[float]
 
-    # No cache exists, calculate stats
-    person = await Person.filter(id=person_id, user_id=user.id).first()
-    records = await Record.filter(person_id=person_id, person__user__id=user.id).all()
 
-    # Calculate basic metrics first
-    total_interactions = len(records)
-    last_interaction_date = await calculate_last_interaction_date(person_id, user)
-    response_time_median_min = await calculate_response_time_median_min(
-        person_id, user
-    )
-    communication_balance = await calculate_communication_balance(person_id, user)
+router = APIRouter(prefix="/{person_id}/stats", tags=["stats"])
+# Mounted by the contacts router ahead of its /{person_id} routes
+batch_router = APIRouter(prefix="/stats", tags=["stats"])
 
-    # Prepare message history for LLM
-    message_history = [
-        {"sent_from": r.sent_from, "message_text": r.message_text}
-        for r in sorted(records, key=lambda r: r.time)
-    ]
 
-    # Use LLM for health score and topic analysis
-    try:
-        client = get_instructor_client()
-
-        # Analyze health score
-        health_analysis = analyze_relationship_health(
-            client=client,
-            first_name=person.first_name if person else "Contacto",
-            relationship_type=person.relationship_type if person else "Desconocido",
-            message_history=message_history,
-            user_name=user.username,
-            total_interactions=total_interactions,
-            response_time_median_min=response_time_median_min,
-            communication_balance=communication_balance,
-        )
-        health_score = health_analysis.health_score
-        health_status = health_analysis.health_status
-
-        # Analyze last conversation topic
-        topic_analysis = analyze_last_conversation_topic(
-            client=client,
-            first_name=person.first_name if person else "Contacto",
-            message_history=message_history,
+@batch_router.get("", response_model=List[ContactStatsEntry])
+async def get_all_persons(
+    user: Annotated[User, Depends(get_user_token_header)],
+):
+    person_ids = await Person.filter(user_id=user.id).values_list("id", flat=True)
+    cached_stats = {
+        cache.person_id: cache
+        for cache in await ContactStatsCache.filter(person__user_id=user.id)
+    }
+
+    missing = [person_id for person_id in person_ids if person_id not in cached_stats]
+    if missing:
+        cached_stats.update(await create_stats_caches(missing))
+
+    # Serve the last analysis, stale ones are refreshed in the background
+    stats_scheduler.touch_user(user.id)
+    for person_id in person_ids:
+        schedule_if_stale(cached_stats[person_id], user)
+
+    return [
+        ContactStatsEntry(
+            person_id=person_id,
+            **contact_stats_from_cache(cached_stats[person_id]).model_dump(),
         )
-        last_conversation_topic = topic_analysis.topic
-
-    except Exception:
-        # Fallback to placeholder values if LLM fails
-        health_score = 50
-        health_status = "Sin analizar"
-        last_conversation_topic = "General Chat"
-
-    # Save to cache
-    await ContactStatsCache.create(
-        person_id=person_id,
-        health_score=health_score,
-        health_status=health_status,
-        last_conversation_topic=last_conversation_topic,
-        total_interactions=total_interactions,
-        last_interaction_date=last_interaction_date,
-        response_time_median_min=response_time_median_min,
-        communication_balance=communication_balance,
-    )
-
-    return ContactStats(
-        health_score=health_score,
-        health_status=health_status,
-        total_interactions=total_interactions,
-        last_interaction_date=last_interaction_date,
-        last_conversation_topic=last_conversation_topic,
-        response_time_median_min=response_time_median_min,
-        communication_balance=communication_balance,
-    )
-
-
-async def calculate_last_interaction_date(
-    person_id: int, user: User
-) -> Optional[datetime]:
-    record = await Record.filter(person_id=person_id, person__user__id=user.id).latest(
-        "time"
-    )
-
-    if not record:
-        return None
-
-    return record.time
-
-
-async def calculate_response_time_median_min(
-    person_id: int, user: User
-) -> Optional[float]:
-    records = await Record.filter(person_id=person_id, person__user__id=user.id).all()
-
-    if len(records) < 2:
-        return None
-
-    records.sort(key=lambda r: r.time)
-
-    p1 = 0
-    p2 = 1
-    response_times: List[timedelta] = []
+        for person_id in person_ids
+    ]
 
-    while p2 < len(records):
-        p1_record = records[p1]
-        p2_record = records[p2]
-        if p2 - p1 > 1 and p1_record.sent_from != p2_record.sent_from:
-            p1 = p2 - 1
 
-        if p1_record.sent_from == p2_record.sent_from:
-            p2 += 1
-            continue
+@router.get("", response_model=ContactStats)
+async def get_person(
+    person_id: int,
+    user: Annotated[User, Depends(get_user_token_header)],
+):
+    person = await Person.filter(id=person_id, user_id=user.id).first()
+    if person is None:
+        raise HTTPException(status_code=404, detail="Person not found")
 
-        diff = p2_record.time - p1_record.time
+    # Deterministic stats are kept up to date by each upload, see stats_cache
+    cached_stats = await ContactStatsCache.filter(person_id=person_id).first()
+    if cached_stats is None:
+        cached_stats = await rebuild_stats_cache(person_id)
 
-        response_times.append(diff)
+    stats_scheduler.touch_user(user.id)
+    schedule_if_stale(cached_stats, user)
 
-        p1 += 1
-        p2 += 1
+    return contact_stats_from_cache(cached_stats)
 
-    median_response_time = sorted(
-        [diff.total_seconds() / 60 for diff in response_times]
-    )[len(response_times) // 2]
 
-    return median_response_time
+@router.get("/timeseries", response_model=List[InteractionBucket])
+async def get_timeseries(
+    person_id: int,
+    user: Annotated[User, Depends(get_user_token_header)],
+    bucket: Bucket = "day",
+    start: Annotated[Optional[date], Query(alias="from")] = None,
+    end: Annotated[Optional[date], Query(alias="to")] = None,
+):
+    if not await Person.exists(id=person_id, user_id=user.id):
+        raise HTTPException(status_code=404, detail="Person not found")
+    if start is not None and end is not None and start > end:
+        raise HTTPException(status_code=400, detail="from must not be after to")
 
+    # The daily rollup is rebuilt with a missing cache, see rebuild_stats_cache
+    if not await ContactStatsCache.exists(person_id=person_id):
+        await rebuild_stats_cache(person_id)
 
-async def calculate_communication_balance(
-    person_id: int, user: User
-) -> Optional[float]:
-    records = await Record.filter(person_id=person_id, person__user__id=user.id).all()
+    try:
+        periods = await interaction_periods(person_id, bucket, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return [
+        InteractionBucket(
+            start=period.start,
+            sent_count=period.stats.sent_count,
+            received_count=period.stats.received_count,
+            user_initiated_days=period.user_initiated_days,
+            contact_initiated_days=period.contact_initiated_days,
+            response_time_median_min=period.stats.response_time_median_min,
+        )
+        for period in periods
+    ]
 
-    if not records:
-        return 0.0
 
-    sent_count = sum(1 for r in records if r.sent_from == "user")
-    received_count = sum(1 for r in records if r.sent_from != "user")
+def contact_stats_from_cache(cached_stats: ContactStatsCache) -> ContactStats:
+    response_times = ResponseTimes.from_json(
+        cached_stats.response_time_sketch
+    ).summary()
+    return ContactStats(
+        health_score=cached_stats.health_score,
+        health_status=cached_stats.health_status,
+        total_interactions=cached_stats.total_interactions,
+        last_interaction_date=cached_stats.last_interaction_date,
+        last_conversation_topic=cached_stats.last_conversation_topic,
+        response_time_median_min=response_times.median_min,
+        response_time_p90_min=response_times.p90_min,
+        response_time_p99_min=response_times.p99_min,
+        user_response_time_median_min=response_times.user_median_min,
+        contact_response_time_median_min=response_times.contact_median_min,
+        communication_balance=cached_stats.communication_balance,
+        computed_at=cached_stats.computed_at,
+        stale=cached_stats.llm_stale,
+    )
 
-    if received_count == 0:
-        return 1.0
 
-    return sent_count / received_count
+def schedule_if_stale(cached_stats: ContactStatsCache, user: User):
+    if cached_stats.llm_stale:
+        stats_scheduler.schedule(
+            cached_stats.person_id, user.id, cached_stats.changed_at
+        )
@@ -0,0 +1,502 @@
+import asyncio
+import logging
+import os
+from datetime import date, datetime
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+    cast,
+)
+
+import instructor
+from tortoise import Tortoise, timezone
+
+from app.db import ContactStatsCache, Person, Record, SessionAnalysis, User
+from app.utils.llm.client import (
+    analyze_relationship_health,
+    analyze_sessions_and_health,
+)
+from app.utils.stats.contact_stats import ContactStatsAccumulator
+from app.utils.stats.daily import DailyStats, day_of
+from app.utils.stats.response_times import ResponseTimes
+
+from .conversation_sessions import (
+    SessionBuilder,
+    rebuild_contacts_sessions,
+    rebuild_sessions,
+    session_messages,
+)
+from .session_analysis import (
+    LLM_HISTORY_MESSAGES,
+    BeforeLLMCall,
+    analyze_recent_sessions,
+    load_recent_sessions,
+    store_session_analysis,
+)
+from .stats_engine import (
+    compute_contact_stats,
+    compute_contacts_daily_stats,
+    compute_contacts_stats,
+    compute_daily_stats,
+)
+from .stats_rollup import (
+    merge_daily_interactions,
+    replace_contacts_daily_interactions,
+    replace_daily_interactions,
+)
+
+# Shown until the LLM has analyzed the conversation for the first time
+DEFAULT_HEALTH_SCORE = 50
+DEFAULT_HEALTH_STATUS = "Sin analizar"
+DEFAULT_CONVERSATION_TOPIC = "General Chat"
+
+# How a refresh uses the LLM. "sequential" analyzes each new session, then
+# scores health from the summaries. "concurrent" does the same with the
+# session analyses all in flight at once. "fused" does everything in one call.
+AnalysisMode = Literal["sequential", "concurrent", "fused"]
+STATS_ANALYSIS_MODE = cast(AnalysisMode, os.getenv("STATS_ANALYSIS_MODE", "concurrent"))
+
+DETERMINISTIC_FIELDS = [
+    "total_interactions",
+    "last_interaction_date",
+    "response_time_median_min",
+    "communication_balance",
+    "sent_count",
+    "received_count",
+    "last_sender",
+    "last_run_start",
+    "response_time_sketch",
+    "llm_stale",
+    "changed_at",
+]
+
+T = TypeVar("T")
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight(Generic[T]):
+    """Shares one running computation between every caller asking for its key.
+
+    The first caller starts it, later ones await the same future until it
+    finishes; the next call after that starts afresh. A caller going away
+    doesn't cancel the computation for the others.
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[Hashable, "asyncio.Future[T]"] = {}
+
+    async def do(self, key: Hashable, compute: Callable[[], Awaitable[T]]) -> T:
+        future = self._in_flight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(compute())
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(future)
+
+    def running(self, key: Hashable) -> bool:
+        return key in self._in_flight
+
+    def _forget(self, key: Hashable, future: "asyncio.Future[T]"):
+        if self._in_flight.get(key) is future:
+            del self._in_flight[key]
+
+
+# Bumped when a person gets new records while their stats are being rebuilt,
+# so the rebuild goes again over them. Only kept while the rebuild runs.
+_data_versions: Dict[int, int] = {}
+_rebuilds: SingleFlight[ContactStatsCache] = SingleFlight()
+
+
+async def upgrade_stats_cache():
+    """Recreate the stats cache table if it predates some of its columns.
+
+    generate_schemas only creates missing tables, so an older table lacks
+    the columns added since. Its rows only cache what the records hold, so
+    the table is dropped and created again empty, and each person's stats
+    are rebuilt the next time they are read. Runs at startup.
+    """
+    connection = ContactStatsCache._meta.db
+    table = ContactStatsCache._meta.db_table
+    columns = await connection.execute_query_dict(f'PRAGMA table_info("{table}")')
+    missing = ContactStatsCache._meta.db_fields - {column["name"] for column in columns}
+    if not missing:
+        return
+
+    logger.info(f"Recreating {table}, missing columns: {', '.join(sorted(missing))}")
+    await connection.execute_script(f'DROP TABLE "{table}"')
+    await Tortoise.generate_schemas(safe=True)
+
+
+def bump_data_version(person_id: int):
+    if _rebuilds.running(person_id):
+        _data_versions[person_id] = _data_versions.get(person_id, 0) + 1
+
+
+class StatsCacheUpdate:
+    """Folds the records inserted by one upload into the person's stats cache.
+
+    The writer reports each batch of new records, which are added to the
+    cached accumulator, to the days they fall on and to the conversation
+    sessions. Saving is then a single row update plus upserts of those days
+    and sessions. If there is no cache yet, or the upload reaches back before
+    the last cached message, the deterministic stats, daily rollup and
+    sessions are rebuilt from the records instead.
+    """
+
+    person_id: int
+    cache: Optional[ContactStatsCache]
+    accumulator: Optional[ContactStatsAccumulator]
+    daily: Dict[date, DailyStats]
+    sessions: Optional[SessionBuilder]
+    inserted: int
+
+    def __init__(
+        self,
+        person_id: int,
+        cache: Optional[ContactStatsCache],
+        sessions: Optional[SessionBuilder] = None,
+    ):
+        self.person_id = person_id
+        self.cache = cache
+        self.accumulator = accumulator_from_cache(cache) if cache else None
+        self.daily = {}
+        self.sessions = sessions
+        self.inserted = 0
+
+    @classmethod
+    async def load(cls, person_id: int) -> "StatsCacheUpdate":
+        cache = await ContactStatsCache.get_or_none(person_id=person_id)
+        if cache is None:
+            return cls(person_id, None)
+        return cls(person_id, cache, await SessionBuilder.load(person_id))
+
+    def add_records(self, records: List[Record]):
+        if records:
+            bump_data_version(self.person_id)
+        self.inserted += len(records)
+        if self.accumulator is None or self.sessions is None:
+            return
+        for record in records:
+            time = as_stored(record.time)
+            response_time_min = self.accumulator.add(time, record.sent_from)
+            if not self.accumulator.in_order:
+                # Everything gets rebuilt on save
+                return
+
+            day = day_of(time)
+            if day not in self.daily:
+                self.daily[day] = DailyStats(initiator=record.sent_from)
+            self.daily[day].add(record.sent_from, response_time_min)
+            self.sessions.add(time, record.sent_from)
+
+    async def save(self):
+        if not self.inserted:
+            return
+
+        if self.cache is None or self.accumulator is None or self.sessions is None:
+            await rebuild_stats_cache(self.person_id)
+            return
+        if not self.accumulator.in_order:
+            await rebuild_stats_cache(self.person_id, cache=self.cache)
+            return
+
+        store_accumulator(self.cache, self.accumulator)
+        await self.cache.save(update_fields=DETERMINISTIC_FIELDS)
+        await merge_daily_interactions(self.person_id, self.daily)
+        await self.sessions.save()
+
+
+async def rebuild_stats_cache(
+    person_id: int, cache: Optional[ContactStatsCache] = None
+) -> ContactStatsCache:
+    """Recompute the deterministic stats from every record of the person.
+
+    LLM fields are kept, or set to placeholders for a new row, and flagged
+    stale either way. The daily rollup and sessions are rebuilt along.
+    Concurrent rebuilds of a person, e.g. the dashboard and a detail view
+    missing the cache together, share one run, so no two of them replace the
+    same daily rollup and sessions at once. If records arrive meanwhile it
+    runs again, and no caller gets stats older than its call.
+    """
+    return await _rebuilds.do(
+        person_id, lambda: _rebuild_until_current(person_id, cache)
+    )
+
+
+async def _rebuild_until_current(
+    person_id: int, cache: Optional[ContactStatsCache]
+) -> ContactStatsCache:
+    try:
+        while True:
+            version = _data_versions.get(person_id, 0)
+            cache = await _rebuild_stats_cache(person_id, cache)
+            if _data_versions.get(person_id, 0) == version:
+                return cache
+            logger.info(f"Records of person {person_id} changed, rebuilding again")
+    finally:
+        _data_versions.pop(person_id, None)
+
+
+async def _rebuild_stats_cache(
+    person_id: int, cache: Optional[ContactStatsCache]
+) -> ContactStatsCache:
+    accumulator = await compute_contact_stats(person_id)
+    await replace_daily_interactions(person_id, await compute_daily_stats(person_id))
+    await rebuild_sessions(person_id)
+
+    if cache is None:
+        cache = await ContactStatsCache.get_or_none(person_id=person_id)
+    if cache is None:
+        cache = ContactStatsCache(
+            person_id=person_id,
+            health_score=DEFAULT_HEALTH_SCORE,
+            health_status=DEFAULT_HEALTH_STATUS,
+            last_conversation_topic=DEFAULT_CONVERSATION_TOPIC,
+        )
+        store_accumulator(cache, accumulator)
+        # Another process, or the batch endpoint, may insert the row first.
+        # Upsert on the person so this updates it instead of failing.
+        await ContactStatsCache.bulk_create(
+            [cache], on_conflict=["person_id"], update_fields=DETERMINISTIC_FIELDS
+        )
+        return await ContactStatsCache.get(person_id=person_id)
+
+    store_accumulator(cache, accumulator)
+    await cache.save(update_fields=DETERMINISTIC_FIELDS)
+    return cache
+
+
+async def create_stats_caches(person_ids: List[int]) -> Dict[int, ContactStatsCache]:
+    """Build cache rows for people that have none, in one grouped SQL pass.
+
+    The stats, daily rollups and sessions of all of them are each computed
+    with queries grouped by person, see PERSON_IDS_PER_QUERY.
+    """
+    accumulators = await compute_contacts_stats(person_ids)
+    await replace_contacts_daily_interactions(
+        await compute_contacts_daily_stats(person_ids)
+    )
+    await rebuild_contacts_sessions(person_ids)
+    caches: Dict[int, ContactStatsCache] = {}
+    for person_id, accumulator in accumulators.items():
+        cache = ContactStatsCache(
+            person_id=person_id,
+            health_score=DEFAULT_HEALTH_SCORE,
+            health_status=DEFAULT_HEALTH_STATUS,
+            last_conversation_topic=DEFAULT_CONVERSATION_TOPIC,
+        )
+        store_accumulator(cache, accumulator)
+        caches[person_id] = cache
+
+    # An upload may have created some of the rows meanwhile, keep those
+    await ContactStatsCache.bulk_create(caches.values(), ignore_conflicts=True)
+    return caches
+
+
+async def refresh_llm_stats(
+    client: instructor.AsyncInstructor,
+    cached_stats: ContactStatsCache,
+    person: Person,
+    user: User,
+    before_llm_call: Optional[BeforeLLMCall] = None,
+    mode: AnalysisMode = STATS_ANALYSIS_MODE,
+    use_cache: bool = True,
+) -> bool:
+    """Analyze new sessions, then score health from the session summaries.
+
+    The topic is that of the last session. Sessions analyzed before are not
+    sent again, so the LLM sees new conversations plus one short summary per
+    recent conversation, however long the history. How the calls are made
+    depends on `mode`, see STATS_ANALYSIS_MODE. Unless `use_cache` is off,
+    a prompt identical to a recent one is answered from the LLM response cache.
+
+    A failed LLM call never overwrites the last good value: only the health
+    score and topic that were analyzed are saved, and the cache stays stale.
+    Returns whether everything was analyzed, so the caller can retry if not.
+    """
+    if mode == "fused":
+        analyses, health = await analyze_fused(
+            client, cached_stats, person, user, before_llm_call, use_cache
+        )
+    else:
+        analyses = await analyze_recent_sessions(
+            client,
+            person,
+            user,
+            before_llm_call,
+            concurrent=mode == "concurrent",
+            use_cache=use_cache,
+        )
+        if before_llm_call is not None:
+            await before_llm_call()
+        health = await analyze_health(
+            client,
+            cached_stats,
+            person,
+            user,
+            conversation_summaries(analyses),
+            use_cache,
+        )
+
+    complete = health is not None and all(analysis is not None for analysis in analyses)
+    update_fields = ["llm_stale"]
+    if health is not None:
+        cached_stats.health_score, cached_stats.health_status = health
+        cached_stats.computed_at = timezone.now()
+        update_fields += ["health_score", "health_status", "computed_at"]
+    if analyses and analyses[-1] is not None:
+        cached_stats.last_conversation_topic = analyses[-1].topic
+        update_fields.append("last_conversation_topic")
+    cached_stats.llm_stale = not complete
+    await cached_stats.save(update_fields=update_fields)
+    return complete
+
+
+async def analyze_fused(
+    client: instructor.AsyncInstructor,
+    cached_stats: ContactStatsCache,
+    person: Person,
+    user: User,
+    before_llm_call: Optional[BeforeLLMCall],
+    use_cache: bool = True,
+) -> Tuple[List[Optional[SessionAnalysis]], Optional[Tuple[int, str]]]:
+    """Analyze the new sessions and score health in a single LLM call.
+
+    Returns the analyses of the latest sessions, as analyze_recent_sessions
+    does, and the health score and status. If the call fails, the new
+    sessions' analyses and the health are None.
+    """
+    recent = await load_recent_sessions(person)
+    new = [entry for entry in recent if entry.analysis is None]
+    if before_llm_call is not None:
+        await before_llm_call()
+    if not new:
+        analyses = [entry.analysis for entry in recent]
+        health = await analyze_health(
+            client,
+            cached_stats,
+            person,
+            user,
+            conversation_summaries(analyses),
+            use_cache,
+        )
+        return analyses, health
+
+    new_conversations = [
+        await session_messages(entry.session, limit=LLM_HISTORY_MESSAGES)
+        for entry in new
+    ]
+    try:
+        result = await analyze_sessions_and_health(
+            client=client,
+            first_name=person.first_name,
+            relationship_type=person.relationship_type,
+            conversation_summaries=conversation_summaries(
+                [entry.analysis for entry in recent]
+            ),
+            new_conversations=new_conversations,
+            user_name=user.username,
+            total_interactions=cached_stats.total_interactions,
+            response_time_median_min=cached_stats.response_time_median_min,
+            communication_balance=cached_stats.communication_balance,
+            use_cache=use_cache,
+        )
+    except Exception:
+        logger.warning(f"Fused analysis of person {person.id} failed")
+        return [entry.analysis for entry in recent], None
+
+    if len(result.conversations) == len(new):
+        for entry, conversation in zip(new, result.conversations):
+            entry.analysis = await store_session_analysis(
+                entry.session, entry.content_hash, conversation
+            )
+    else:
+        # Can't tell which analysis is whose, the sessions are retried
+        logger.warning(
+            f"Got {len(result.conversations)} analyses for {len(new)} "
+            f"new sessions of person {person.id}"
+        )
+    analyses = [entry.analysis for entry in recent]
+    return analyses, (result.health.health_score, result.health.health_status)
+
+
+async def analyze_health(
+    client: instructor.AsyncInstructor,
+    cached_stats: ContactStatsCache,
+    person: Person,
+    user: User,
+    conversation_summaries: List[dict],
+    use_cache: bool = True,
+) -> Optional[Tuple[int, str]]:
+    """Health score and status, or None if the LLM call failed."""
+    try:
+        health_analysis = await analyze_relationship_health(
+            client=client,
+            first_name=person.first_name,
+            relationship_type=person.relationship_type,
+            conversation_summaries=conversation_summaries,
+            user_name=user.username,
+            total_interactions=cached_stats.total_interactions,
+            response_time_median_min=cached_stats.response_time_median_min,
+            communication_balance=cached_stats.communication_balance,
+            use_cache=use_cache,
+        )
+    except Exception:
+        logger.warning(f"Health analysis of person {person.id} failed")
+        return None
+
+    return health_analysis.health_score, health_analysis.health_status
+
+
+def conversation_summaries(analyses: List[Optional[SessionAnalysis]]) -> List[dict]:
+    return [
+        {
+            "started_at": analysis.started_at.date().isoformat(),
+            "topic": analysis.topic,
+            "sentiment": analysis.sentiment,
+            "summary": analysis.summary,
+        }
+        for analysis in analyses
+        if analysis is not None
+    ]
+
+
+def accumulator_from_cache(cache: ContactStatsCache) -> ContactStatsAccumulator:
+    return ContactStatsAccumulator(
+        total_interactions=cache.total_interactions,
+        sent_count=cache.sent_count,
+        received_count=cache.received_count,
+        last_interaction_date=cache.last_interaction_date,
+        last_sender=cache.last_sender,
+        last_run_start=cache.last_run_start,
+        response_times=ResponseTimes.from_json(cache.response_time_sketch),
+    )
+
+
+def store_accumulator(cache: ContactStatsCache, accumulator: ContactStatsAccumulator):
+    cache.total_interactions = accumulator.total_interactions
+    cache.last_interaction_date = accumulator.last_interaction_date
+    cache.response_time_median_min = accumulator.response_time_median_min
+    cache.communication_balance = accumulator.communication_balance
+    cache.sent_count = accumulator.sent_count
+    cache.received_count = accumulator.received_count
+    cache.last_sender = accumulator.last_sender
+    cache.last_run_start = accumulator.last_run_start
+    cache.response_time_sketch = accumulator.response_times.to_json()
+    cache.llm_stale = True
+    cache.changed_at = timezone.now()
+
+
+def as_stored(time: datetime) -> datetime:
+    # Parsers produce naive datetimes, which read back from the database as
+    # aware ones in the default timezone. Compare them the same way.
+    return timezone.make_aware(time) if timezone.is_naive(time) else time
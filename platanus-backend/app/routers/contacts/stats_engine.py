@@ -0,0 +1,271 @@
+from datetime import date
+from typing import Dict, Iterator, List, Tuple
+
+from tortoise import connections
+
+from app.db import ConversationSession, Record
+from app.utils.stats.contact_stats import ContactStatsAccumulator
+from app.utils.stats.daily import DailyStats
+from app.utils.stats.response_times import USER_SENDER
+
+# Bound parameters per IN list, well under SQLite's limit of 999 in builds
+# before 3.32
+PERSON_IDS_PER_QUERY = 500
+
+TOTALS_QUERY = """
+SELECT
+    person_id,
+    COUNT(*) AS total_interactions,
+    COALESCE(SUM(sent_from = ?), 0) AS sent_count,
+    MAX(time) AS last_interaction_date
+FROM record
+WHERE person_id IN ({person_ids})
+GROUP BY person_id
+"""
+
+# A run is a streak of messages from the same sender. Response times go from
+# the start of one run to the start of the next, so only run starts are
+# returned, each with the minutes since the previous run start.
+RUN_STARTS_QUERY = """
+WITH ordered AS (
+    SELECT
+        id,
+        person_id,
+        time,
+        sent_from,
+        LAG(sent_from) OVER (PARTITION BY person_id ORDER BY time, id)
+            AS previous_sender
+    FROM record
+    WHERE person_id IN ({person_ids})
+),
+run_starts AS (
+    SELECT id, person_id, time, sent_from
+    FROM ordered
+    WHERE previous_sender IS NULL OR previous_sender != sent_from
+)
+SELECT
+    person_id,
+    time,
+    date(time) AS day,
+    sent_from,
+    (
+        julianday(time)
+        - julianday(LAG(time) OVER (PARTITION BY person_id ORDER BY time, id))
+    ) * 1440 AS response_time_min
+FROM run_starts
+ORDER BY person_id, time, id
+"""
+
+
+DAILY_TOTALS_QUERY = """
+WITH daily AS (
+    SELECT
+        person_id,
+        date(time) AS day,
+        sent_from,
+        ROW_NUMBER() OVER (
+            PARTITION BY person_id, date(time) ORDER BY time, id
+        ) AS position
+    FROM record
+    WHERE person_id IN ({person_ids})
+)
+SELECT
+    person_id,
+    day,
+    COALESCE(SUM(sent_from = ?), 0) AS sent_count,
+    COALESCE(SUM(sent_from != ?), 0) AS received_count,
+    MAX(CASE WHEN position = 1 THEN sent_from END) AS initiator
+FROM daily
+GROUP BY person_id, day
+"""
+
+
+# A session starts at the first message and after every gap over the limit,
+# so a running count of those starts numbers the sessions.
+SESSIONS_QUERY = """
+WITH gaps AS (
+    SELECT
+        id,
+        person_id,
+        time,
+        sent_from,
+        -- Rounded, julianday arithmetic is off by a hair on exact gaps
+        ROUND(
+            (
+                julianday(time)
+                - julianday(
+                    LAG(time) OVER (PARTITION BY person_id ORDER BY time, id)
+                )
+            ) * 86400,
+            3
+        ) AS gap_seconds
+    FROM record
+    WHERE person_id IN ({person_ids})
+),
+numbered AS (
+    SELECT
+        id,
+        person_id,
+        time,
+        sent_from,
+        SUM(CASE WHEN gap_seconds IS NULL OR gap_seconds > ? THEN 1 ELSE 0 END)
+            OVER (PARTITION BY person_id ORDER BY time, id) AS session
+    FROM gaps
+),
+positioned AS (
+    SELECT
+        person_id,
+        session,
+        time,
+        sent_from,
+        ROW_NUMBER() OVER (
+            PARTITION BY person_id, session ORDER BY time, id
+        ) AS position
+    FROM numbered
+)
+SELECT
+    person_id,
+    MIN(time) AS started_at,
+    MAX(time) AS ended_at,
+    COUNT(*) AS message_count,
+    MAX(CASE WHEN position = 1 THEN sent_from END) AS initiator
+FROM positioned
+GROUP BY person_id, session
+ORDER BY person_id, session
+"""
+
+
+async def compute_contact_stats(person_id: int) -> ContactStatsAccumulator:
+    return (await compute_contacts_stats([person_id]))[person_id]
+
+
+async def compute_contacts_stats(
+    person_ids: List[int],
+) -> Dict[int, ContactStatsAccumulator]:
+    """Deterministic stats for every record of each person, computed in SQL.
+
+    Two queries per PERSON_IDS_PER_QUERY people: one grouped aggregate for
+    the counts and last message, and one window query listing run starts. No
+    Record objects are built, and the Python work is proportional to the
+    number of replies.
+    """
+    accumulators = {person_id: ContactStatsAccumulator() for person_id in person_ids}
+    connection = connections.get("default")
+    time_field = Record._meta.fields_map["time"]
+
+    for chunk, placeholders in person_id_chunks(person_ids):
+        _, totals_rows = await connection.execute_query(
+            TOTALS_QUERY.format(person_ids=placeholders), [USER_SENDER, *chunk]
+        )
+        for totals in totals_rows:
+            accumulator = accumulators[totals["person_id"]]
+            accumulator.total_interactions = totals["total_interactions"]
+            accumulator.sent_count = totals["sent_count"]
+            accumulator.received_count = (
+                totals["total_interactions"] - totals["sent_count"]
+            )
+            accumulator.last_interaction_date = time_field.to_python_value(
+                totals["last_interaction_date"]
+            )
+
+        _, run_starts = await connection.execute_query(
+            RUN_STARTS_QUERY.format(person_ids=placeholders), chunk
+        )
+        for run_start in run_starts:
+            accumulator = accumulators[run_start["person_id"]]
+            # julianday arithmetic can land a hair below zero on equal times
+            if run_start["response_time_min"] is not None:
+                accumulator.response_times.add(
+                    max(run_start["response_time_min"], 0.0), run_start["sent_from"]
+                )
+            # Rows are ordered by time, so this ends on each person's last run
+            accumulator.last_sender = run_start["sent_from"]
+            accumulator.last_run_start = run_start["time"]
+
+    for accumulator in accumulators.values():
+        accumulator.last_run_start = time_field.to_python_value(
+            accumulator.last_run_start
+        )
+
+    return accumulators
+
+
+async def compute_daily_stats(person_id: int) -> Dict[date, DailyStats]:
+    """Per-day stats for every record of the person, see DailyInteraction."""
+    return (await compute_contacts_daily_stats([person_id]))[person_id]
+
+
+async def compute_contacts_daily_stats(
+    person_ids: List[int],
+) -> Dict[int, Dict[date, DailyStats]]:
+    """Per-day stats of each person, two queries per PERSON_IDS_PER_QUERY."""
+    daily: Dict[int, Dict[date, DailyStats]] = {
+        person_id: {} for person_id in person_ids
+    }
+    connection = connections.get("default")
+
+    for chunk, placeholders in person_id_chunks(person_ids):
+        _, totals_rows = await connection.execute_query(
+            DAILY_TOTALS_QUERY.format(person_ids=placeholders),
+            [*chunk, USER_SENDER, USER_SENDER],
+        )
+        for totals in totals_rows:
+            daily[totals["person_id"]][date.fromisoformat(totals["day"])] = DailyStats(
+                sent_count=totals["sent_count"],
+                received_count=totals["received_count"],
+                initiator=totals["initiator"],
+            )
+
+        _, run_starts = await connection.execute_query(
+            RUN_STARTS_QUERY.format(person_ids=placeholders), chunk
+        )
+        for run_start in run_starts:
+            if run_start["response_time_min"] is not None:
+                day = date.fromisoformat(run_start["day"])
+                daily[run_start["person_id"]][day].response_times.add(
+                    max(run_start["response_time_min"], 0.0)
+                )
+
+    return daily
+
+
+async def compute_sessions(
+    person_id: int, gap_minutes: float
+) -> List[ConversationSession]:
+    """Every conversation session of the person, unsaved, oldest first."""
+    return (await compute_contacts_sessions([person_id], gap_minutes))[person_id]
+
+
+async def compute_contacts_sessions(
+    person_ids: List[int], gap_minutes: float
+) -> Dict[int, List[ConversationSession]]:
+    """Sessions of each person, one query per PERSON_IDS_PER_QUERY."""
+    sessions: Dict[int, List[ConversationSession]] = {
+        person_id: [] for person_id in person_ids
+    }
+    connection = connections.get("default")
+    time_field = Record._meta.fields_map["time"]
+
+    for chunk, placeholders in person_id_chunks(person_ids):
+        _, rows = await connection.execute_query(
+            SESSIONS_QUERY.format(person_ids=placeholders), [*chunk, gap_minutes * 60]
+        )
+        for row in rows:
+            sessions[row["person_id"]].append(
+                ConversationSession(
+                    person_id=row["person_id"],
+                    started_at=time_field.to_python_value(row["started_at"]),
+                    ended_at=time_field.to_python_value(row["ended_at"]),
+                    message_count=row["message_count"],
+                    initiator=row["initiator"],
+                )
+            )
+
+    return sessions
+
+
+def person_id_chunks(person_ids: List[int]) -> Iterator[Tuple[List[int], str]]:
+    """Slices of at most PERSON_IDS_PER_QUERY ids, with their placeholders."""
+    for start in range(0, len(person_ids), PERSON_IDS_PER_QUERY):
+        chunk = person_ids[start : start + PERSON_IDS_PER_QUERY]
+        yield chunk, ", ".join("?" for _ in chunk)
@@ -0,0 +1,147 @@
+from datetime import date, timedelta
+from typing import Dict, List, Literal, Optional
+
+from app.db import DailyInteraction
+from app.utils.stats.daily import DailyStats
+from app.utils.stats.response_times import USER_SENDER
+from app.utils.stats.sketch import QuantileSketch
+
+Bucket = Literal["day", "week", "month"]
+
+# Keeps a wide range at a fine bucket from building a huge response
+MAX_TIMESERIES_BUCKETS = 5000
+
+ROLLUP_FIELDS = ["sent_count", "received_count", "initiator", "response_time_sketch"]
+
+
+class InteractionPeriod:
+    """Daily rollups folded into one chart bucket."""
+
+    def __init__(self, start: date):
+        self.start = start
+        self.stats = DailyStats()
+        self.user_initiated_days = 0
+        self.contact_initiated_days = 0
+
+    def add_day(self, stats: DailyStats):
+        self.stats.merge(stats)
+        if stats.initiator == USER_SENDER:
+            self.user_initiated_days += 1
+        elif stats.initiator is not None:
+            self.contact_initiated_days += 1
+
+
+async def interaction_periods(
+    person_id: int,
+    bucket: Bucket,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+) -> List[InteractionPeriod]:
+    """Bucketed rollups from `start` to `end`, inclusive, empty buckets too.
+
+    Reads one row per day with messages, never the records themselves.
+    """
+    query = DailyInteraction.filter(person_id=person_id).order_by("day")
+    if start is not None:
+        query = query.filter(day__gte=start)
+    if end is not None:
+        query = query.filter(day__lte=end)
+    rows = await query
+
+    periods: Dict[date, InteractionPeriod] = {}
+    for row in rows:
+        period_start = bucket_start(row.day, bucket)
+        if period_start not in periods:
+            periods[period_start] = InteractionPeriod(period_start)
+        periods[period_start].add_day(daily_stats_from_row(row))
+
+    if not rows and (start is None or end is None):
+        return []
+
+    first = bucket_start(start if start is not None else rows[0].day, bucket)
+    last = bucket_start(end if end is not None else rows[-1].day, bucket)
+    filled: List[InteractionPeriod] = []
+    period_start = first
+    while period_start <= last:
+        if len(filled) == MAX_TIMESERIES_BUCKETS:
+            raise ValueError(
+                f"More than {MAX_TIMESERIES_BUCKETS} buckets, "
+                "narrow the range or use a larger bucket."
+            )
+        filled.append(periods.get(period_start) or InteractionPeriod(period_start))
+        period_start = next_bucket_start(period_start, bucket)
+    return filled
+
+
+async def replace_daily_interactions(person_id: int, daily: Dict[date, DailyStats]):
+    await replace_contacts_daily_interactions({person_id: daily})
+
+
+async def replace_contacts_daily_interactions(
+    daily_by_person: Dict[int, Dict[date, DailyStats]],
+):
+    await DailyInteraction.filter(person_id__in=list(daily_by_person)).delete()
+    await DailyInteraction.bulk_create(
+        [
+            daily_interaction(person_id, day, stats)
+            for person_id, daily in daily_by_person.items()
+            for day, stats in daily.items()
+        ],
+        batch_size=1000,
+    )
+
+
+async def merge_daily_interactions(person_id: int, daily: Dict[date, DailyStats]):
+    """Add the days of an upload, all at or after the stored ones."""
+    if not daily:
+        return
+
+    stored = await DailyInteraction.filter(person_id=person_id, day__in=list(daily))
+    for row in stored:
+        merged = daily_stats_from_row(row)
+        merged.merge(daily[row.day])
+        daily[row.day] = merged
+
+    await DailyInteraction.bulk_create(
+        [daily_interaction(person_id, day, stats) for day, stats in daily.items()],
+        batch_size=1000,
+        on_conflict=["person_id", "day"],
+        update_fields=ROLLUP_FIELDS,
+    )
+
+
+def daily_stats_from_row(row: DailyInteraction) -> DailyStats:
+    return DailyStats(
+        sent_count=row.sent_count,
+        received_count=row.received_count,
+        initiator=row.initiator,
+        response_times=QuantileSketch.from_json(row.response_time_sketch),
+    )
+
+
+def daily_interaction(person_id: int, day: date, stats: DailyStats) -> DailyInteraction:
+    return DailyInteraction(
+        person_id=person_id,
+        day=day,
+        sent_count=stats.sent_count,
+        received_count=stats.received_count,
+        initiator=stats.initiator,
+        response_time_sketch=stats.sketch_json(),
+    )
+
+
+def bucket_start(day: date, bucket: Bucket) -> date:
+    if bucket == "week":
+        # ISO weeks, starting on Monday
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket_start(start: date, bucket: Bucket) -> date:
+    if bucket == "week":
+        return start + timedelta(days=7)
+    if bucket == "month":
+        return (start + timedelta(days=32)).replace(day=1)
+    return start + timedelta(days=1)
@@ -0,0 +1,223 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from tortoise import timezone
+
+from app.db import ContactStatsCache
+from app.utils.llm.pool import LLMClientPool, llm_client_pool
+
+from .stats_cache import refresh_llm_stats
+
+STATS_SCHEDULER_CONCURRENCY = int(os.getenv("STATS_SCHEDULER_CONCURRENCY", "4"))
+STATS_LLM_CALLS_PER_HOUR = int(os.getenv("STATS_LLM_CALLS_PER_HOUR", "600"))
+# A refresh whose LLM calls failed is retried after this, doubling per failure
+STATS_RETRY_SECONDS = float(os.getenv("STATS_RETRY_SECONDS", "60"))
+STATS_RETRY_MAX_SECONDS = float(os.getenv("STATS_RETRY_MAX_SECONDS", "3600"))
+
+BUDGET_WINDOW_SECONDS = 3600
+
+# (-user activity, -contact change, insertion order), smallest pops first
+Priority = Tuple[float, float, int]
+
+logger = logging.getLogger(__name__)
+
+
+class StatsScheduler:
+    """Refreshes stale LLM stats in the background, most relevant first.
+
+    Reads never wait on the LLM: they serve the cached values with a `stale`
+    flag and schedule the person here. The queue favors users that were
+    active most recently, then contacts whose stats changed most recently.
+    At most `concurrency` refreshes run at once, and LLM calls are capped
+    over a sliding hour so a burst of uploads can't run up the bill.
+
+    A refresh that overlaps an upload may save the analysis of the older
+    messages and clear `llm_stale`. Uploads schedule with `force`, which
+    reruns such a refresh once it finishes.
+
+    A refresh with failed LLM calls leaves the cache stale and is retried
+    with exponential backoff. Meanwhile reads don't schedule the person,
+    so an LLM outage isn't hammered by every dashboard load.
+    """
+
+    concurrency: int
+    llm_calls_per_hour: int
+    llm_pool: LLMClientPool
+
+    def __init__(
+        self,
+        concurrency: int = STATS_SCHEDULER_CONCURRENCY,
+        llm_calls_per_hour: int = STATS_LLM_CALLS_PER_HOUR,
+        llm_pool: LLMClientPool = llm_client_pool,
+    ):
+        self.concurrency = concurrency
+        self.llm_pool = llm_pool
+        # A zero budget would never let anything through
+        self.llm_calls_per_hour = max(llm_calls_per_hour, 1)
+        self._heap: List[Tuple[float, float, int, int]] = []
+        # Latest priority of each queued person, older heap entries are skipped
+        self._queued: Dict[int, Priority] = {}
+        self._forced: Set[int] = set()
+        self._in_flight: Set[int] = set()
+        self._rerun: Dict[int, int] = {}
+        self._user_activity: Dict[int, float] = {}
+        # Consecutive failed refreshes and pending retries, by person
+        self._failures: Dict[int, int] = {}
+        self._retries: Dict[int, asyncio.TimerHandle] = {}
+        self._llm_calls: Deque[float] = deque()
+        self._sequence = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        # Pick up what was left stale when the process last stopped
+        stale = await ContactStatsCache.filter(llm_stale=True).values(
+            "person_id", "person__user_id", "changed_at"
+        )
+        for row in stale:
+            self.schedule(row["person_id"], row["person__user_id"], row["changed_at"])
+        self._tasks = [
+            asyncio.create_task(self._work()) for _ in range(max(self.concurrency, 1))
+        ]
+
+    async def stop(self):
+        for retry in self._retries.values():
+            retry.cancel()
+        self._retries = {}
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def touch_user(self, user_id: int):
+        self._user_activity[user_id] = time.time()
+
+    def schedule(
+        self,
+        person_id: int,
+        user_id: int,
+        changed_at: Optional[datetime],
+        force: bool = False,
+    ):
+        """Queue a refresh of the person's LLM stats.
+
+        Without `force` the worker skips the person if the cache is no longer
+        stale by then, so reads can schedule freely. Nor is a person waiting
+        to retry a failed refresh queued earlier.
+        """
+        if not force and person_id in self._retries:
+            return
+        if person_id in self._in_flight:
+            if force:
+                self._rerun[person_id] = user_id
+            return
+
+        priority: Priority = (
+            -self._user_activity.get(user_id, 0.0),
+            -(changed_at.timestamp() if changed_at else 0.0),
+            next(self._sequence),
+        )
+        if force:
+            self._forced.add(person_id)
+
+        queued = self._queued.get(person_id)
+        if queued is not None and queued[:2] <= priority[:2]:
+            return
+        self._queued[person_id] = priority
+        heapq.heappush(self._heap, (*priority, person_id))
+        self._wakeup.set()
+
+    async def _work(self):
+        while True:
+            person_id, forced = await self._next()
+            self._in_flight.add(person_id)
+            try:
+                await self._refresh(person_id, forced)
+            except Exception:
+                logger.exception(f"Stats refresh for person {person_id} crashed")
+            finally:
+                self._in_flight.discard(person_id)
+
+            user_id = self._rerun.pop(person_id, None)
+            if user_id is not None:
+                self.schedule(person_id, user_id, timezone.now(), force=True)
+
+    async def _next(self) -> Tuple[int, bool]:
+        while True:
+            while self._heap:
+                *priority, person_id = heapq.heappop(self._heap)
+                if self._queued.get(person_id) != tuple(priority):
+                    continue
+                del self._queued[person_id]
+                forced = person_id in self._forced
+                self._forced.discard(person_id)
+                return person_id, forced
+
+            self._wakeup.clear()
+            await self._wakeup.wait()
+
+    async def _refresh(self, person_id: int, forced: bool):
+        if not forced and not await ContactStatsCache.exists(
+            person_id=person_id, llm_stale=True
+        ):
+            return
+
+        cached_stats = await ContactStatsCache.get_or_none(
+            person_id=person_id
+        ).select_related("person__user")
+        if cached_stats is None:
+            return
+        retry = self._retries.pop(person_id, None)
+        if retry is not None:
+            retry.cancel()
+        # New sessions cost a call each, known only once they are hashed
+        complete = await refresh_llm_stats(
+            self.llm_pool.client(),
+            cached_stats,
+            cached_stats.person,
+            cached_stats.person.user,
+            before_llm_call=self._spend_llm_budget,
+        )
+        if complete:
+            self._failures.pop(person_id, None)
+        else:
+            self._retry_later(person_id, cached_stats.person.user_id)
+
+    def _retry_later(self, person_id: int, user_id: int):
+        failures = self._failures.get(person_id, 0) + 1
+        self._failures[person_id] = failures
+        delay = min(STATS_RETRY_SECONDS * 2 ** (failures - 1), STATS_RETRY_MAX_SECONDS)
+        logger.info(
+            f"LLM stats of person {person_id} failed {failures} times in a row, "
+            f"retrying in {delay:.0f}s"
+        )
+
+        def retry():
+            del self._retries[person_id]
+            self.schedule(person_id, user_id, timezone.now())
+
+        self._retries[person_id] = asyncio.get_running_loop().call_later(delay, retry)
+
+    async def _spend_llm_budget(self):
+        while True:
+            now = time.monotonic()
+            while self._llm_calls and now - self._llm_calls[0] >= BUDGET_WINDOW_SECONDS:
+                self._llm_calls.popleft()
+
+            if len(self._llm_calls) < self.llm_calls_per_hour:
+                self._llm_calls.append(now)
+                return
+
+            wait = BUDGET_WINDOW_SECONDS - (now - self._llm_calls[0])
+            logger.info(f"Hourly LLM budget spent, next stats refresh in {wait:.0f}s")
+            await asyncio.sleep(wait)
+
+
+stats_scheduler = StatsScheduler()
@@ -0,0 +1,115 @@
+import json
+import re
+from typing import Any, List
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+# Returned by _decode when the value continues past the end of the buffer
+INCOMPLETE = object()
+
+
+class JsonArrayStream:
+    """Incrementally extracts the elements of one array in a top-level object.
+
+    Text is pushed with feed() as it arrives and each call returns the array
+    elements completed so far. Only the element being decoded is kept in
+    memory, so huge exports never have to be loaded as a single document.
+    Other top-level values are decoded and discarded.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.found = False
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._pos = 0
+        self._state = "start"
+        self._current_key = ""
+
+    def feed(self, text: str) -> List[Any]:
+        self._buffer = self._buffer[self._pos :] + text
+        self._pos = 0
+        return self._advance(final=False)
+
+    def close(self) -> List[Any]:
+        elements = self._advance(final=True)
+        if self._state != "done":
+            raise ValueError("Truncated or invalid JSON document.")
+        return elements
+
+    def _advance(self, final: bool) -> List[Any]:
+        elements: List[Any] = []
+        while self._state != "done":
+            self._skip_whitespace()
+            if self._pos >= len(self._buffer):
+                break
+            char = self._buffer[self._pos]
+
+            if self._state == "start":
+                if char != "{":
+                    raise ValueError("Expected a JSON object.")
+                self._pos += 1
+                self._state = "key"
+
+            elif self._state == "key":
+                if char == ",":
+                    self._pos += 1
+                elif char == "}":
+                    self._pos += 1
+                    self._state = "done"
+                else:
+                    key = self._decode(final)
+                    if key is INCOMPLETE:
+                        break
+                    if not isinstance(key, str):
+                        raise ValueError("Expected a string object key.")
+                    self._current_key = key
+                    self._state = "colon"
+
+            elif self._state == "colon":
+                if char != ":":
+                    raise ValueError("Expected ':' after object key.")
+                self._pos += 1
+                self._state = "value"
+
+            elif self._state == "value":
+                if self._current_key == self.key and char == "[":
+                    self._pos += 1
+                    self.found = True
+                    self._state = "array"
+                elif self._decode(final) is INCOMPLETE:
+                    break
+                else:
+                    self._state = "key"
+
+            elif self._state == "array":
+                if char == ",":
+                    self._pos += 1
+                elif char == "]":
+                    self._pos += 1
+                    self._state = "key"
+                else:
+                    element = self._decode(final)
+                    if element is INCOMPLETE:
+                        break
+                    elements.append(element)
+
+        return elements
+
+    def _decode(self, final: bool) -> Any:
+        """Decode the value at the cursor, or return INCOMPLETE."""
+        try:
+            value, end = self._decoder.raw_decode(self._buffer, self._pos)
+        except json.JSONDecodeError:
+            if final:
+                raise ValueError("Truncated or invalid JSON document.")
+            return INCOMPLETE
+        # A number or literal ending exactly at the buffer end may continue
+        # in the next chunk.
+        if end == len(self._buffer) and not final:
+            return INCOMPLETE
+        self._pos = end
+        return value
+
+    def _skip_whitespace(self):
+        self._pos = WHITESPACE.match(self._buffer, self._pos).end()
@@ -1,9 +1,27 @@
 from abc import ABC, abstractmethod
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import List, Literal, Optional
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Generic,
+    List,
+    Literal,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
 
 from pydantic import BaseModel, field_validator
 
+from .parallel import PARSE_SHARD_LINES, PARSE_WORKERS, iter_shards, map_in_order
+
+MAX_PARTICIPANTS = 2
+
+RawMessage = TypeVar("RawMessage")
+
 
 class ParsedMessage(BaseModel):
     timestamp: datetime
@@ -13,7 +31,7 @@ class ParsedMessage(BaseModel):
 
 class ParsedChat(BaseModel):
     messages: List[ParsedMessage]
-    source: Literal["whatsapp"]
+    source: Literal["whatsapp", "telegram"]
 
     @property
     def participants(self) -> List[str]:
@@ -37,29 +55,79 @@ class ParsedChat(BaseModel):
         for message in v:
             found_senders.add(message.sender)
 
-        if len(found_senders) > 2:
-            raise ValueError("Chat contains more than two participants.")
+        check_participants(found_senders)
 
         return v
 
 
-class MessagesParser(ABC):
+def check_participants(found_senders: Set[str]) -> None:
+    if len(found_senders) > MAX_PARTICIPANTS:
+        raise ValueError("Chat contains more than two participants.")
+
+
+async def validate_message_stream(
+    messages: AsyncIterable[ParsedMessage],
+) -> AsyncIterator[ParsedMessage]:
+    """Apply the ParsedChat checks to a stream of messages as they go by."""
+    found_senders: Set[str] = set()
+    async for message in messages:
+        found_senders.add(message.sender)
+        check_participants(found_senders)
+        yield message
+
+    if not found_senders:
+        raise ValueError("No messages were parsed from the chat.")
+
+
+class MessagesParser(ABC, Generic[RawMessage]):
+    skipped_messages: int = 0
 
     @abstractmethod
     def parse(self) -> ParsedChat:
         pass
 
-    @classmethod
+    async def aiter_parse_parallel(
+        self,
+        lines: AsyncIterable[str],
+        executor: Executor,
+        shard_lines: int = PARSE_SHARD_LINES,
+    ) -> AsyncIterator[ParsedMessage]:
+        """Parse shards of the input in executor, yielding messages in order.
+
+        Shards are only cut where a new message starts, so the output is the
+        same as parsing the whole input in one go.
+        """
+        lines = await self._prepare_stream(lines)
+        shards = iter_shards(lines, self._is_message_start, shard_lines)
+        results = map_in_order(
+            executor, self._shard_parser(), shards, max_pending=PARSE_WORKERS * 2
+        )
+        async for parsed_messages, skipped_messages in results:
+            self.skipped_messages += skipped_messages
+            for parsed_message in parsed_messages:
+                yield parsed_message
+
+    async def _prepare_stream(self, lines: AsyncIterable[str]) -> AsyncIterable[str]:
+        """Hook to inspect the start of the input before it is sharded."""
+        return lines
+
+    def _is_message_start(self, line: str) -> bool:
+        raise NotImplementedError(f"{type(self).__name__} has no parallel mode")
+
+    def _shard_parser(
+        self,
+    ) -> Callable[[List[str]], Tuple[List[ParsedMessage], int]]:
+        """Picklable callable returning (messages, skipped count) for a shard."""
+        raise NotImplementedError(f"{type(self).__name__} has no parallel mode")
+
     @abstractmethod
-    def _parse_time(cls, message: str) -> Optional[datetime]:
+    def _parse_time(self, message: RawMessage) -> Optional[datetime]:
         pass
 
-    @classmethod
     @abstractmethod
-    def _parse_sender(cls, message: str) -> Optional[str]:
+    def _parse_sender(self, message: RawMessage) -> Optional[str]:
         pass
 
-    @classmethod
     @abstractmethod
-    def _parse_message_text(cls, message: str) -> Optional[str]:
+    def _parse_message_text(self, message: RawMessage) -> Optional[str]:
         pass
@@ -0,0 +1,87 @@
+import asyncio
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    List,
+    Optional,
+    TypeVar,
+)
+
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+PARSE_SHARD_LINES = int(os.getenv("PARSE_SHARD_LINES", "20000"))
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_parse_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    """Process pool shared by every upload in this worker, created on first use."""
+    global _parse_executor
+    if _parse_executor is None:
+        # spawn so children don't inherit the event loop or open DB connections
+        _parse_executor = ProcessPoolExecutor(
+            max_workers=PARSE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _parse_executor
+
+
+def shutdown_parse_executor():
+    global _parse_executor
+    if _parse_executor is not None:
+        _parse_executor.shutdown(cancel_futures=True)
+        _parse_executor = None
+
+
+async def iter_shards(
+    lines: AsyncIterable[str],
+    is_boundary: Callable[[str], bool],
+    shard_lines: int = PARSE_SHARD_LINES,
+) -> AsyncIterator[List[str]]:
+    """Group lines into shards of about shard_lines, cut only at boundaries.
+
+    A shard is closed at the first boundary line once it reaches the target
+    size, so no message is ever split across two shards.
+    """
+    shard: List[str] = []
+    async for line in lines:
+        if len(shard) >= shard_lines and is_boundary(line):
+            yield shard
+            shard = []
+        shard.append(line)
+
+    if shard:
+        yield shard
+
+
+async def map_in_order(
+    executor: Executor,
+    func: Callable[[T], R],
+    items: AsyncIterable[T],
+    max_pending: int,
+) -> AsyncIterator[R]:
+    """Run func over items in the executor and yield results in input order.
+
+    At most max_pending items are in flight, which bounds memory when the
+    consumer is slower than the workers.
+    """
+    loop = asyncio.get_running_loop()
+    pending: Deque[asyncio.Future[R]] = deque()
+    try:
+        async for item in items:
+            pending.append(loop.run_in_executor(executor, func, item))
+            if len(pending) >= max_pending:
+                yield await pending.popleft()
+        while pending:
+            yield await pending.popleft()
+    finally:
+        for future in pending:
+            future.cancel()
@@ -0,0 +1,125 @@
+import logging
+from datetime import datetime
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    override,
+)
+
+from fastapi.concurrency import run_in_threadpool
+
+from ..json_stream import JsonArrayStream
+from ..message_parser import MessagesParser, ParsedChat, ParsedMessage
+
+logger = logging.getLogger(__name__)
+
+TelegramMessage = Dict[str, Any]
+
+
+class TelegramMessagesParser(MessagesParser[TelegramMessage]):
+    """Parser for the result.json of a Telegram Desktop single chat export.
+
+    The document is fed in text chunks and only the "messages" array is
+    walked, one element at a time. Service messages and messages without
+    text (stickers, photos without caption) are counted in skipped_messages.
+    """
+
+    raw_chunks: Iterable[str]
+    skipped_messages: int
+
+    def __init__(self, raw_chunks: Iterable[str] = ()):
+        self.raw_chunks = raw_chunks
+        self.skipped_messages = 0
+
+    @override
+    def parse(self) -> ParsedChat:
+        parsed_messages = list(self.iter_parse(self.raw_chunks))
+
+        parsed_chat = ParsedChat(messages=parsed_messages, source="telegram")
+        return parsed_chat
+
+    def iter_parse(self, chunks: Iterable[str]) -> Iterator[ParsedMessage]:
+        """Lazily parse chunks of the export document into messages."""
+        messages_stream = JsonArrayStream("messages")
+        for chunk in chunks:
+            yield from self._parse_batch(messages_stream.feed(chunk))
+
+        yield from self._parse_batch(self._close(messages_stream))
+
+    async def aiter_parse(
+        self, chunks: AsyncIterable[str]
+    ) -> AsyncIterator[ParsedMessage]:
+        """Async counterpart of iter_parse; JSON decoding runs in the threadpool."""
+        messages_stream = JsonArrayStream("messages")
+        async for chunk in chunks:
+            for parsed_message in self._parse_batch(
+                await run_in_threadpool(messages_stream.feed, chunk)
+            ):
+                yield parsed_message
+
+        for parsed_message in self._parse_batch(self._close(messages_stream)):
+            yield parsed_message
+
+    def _close(self, messages_stream: JsonArrayStream) -> List[TelegramMessage]:
+        messages = messages_stream.close()
+        if not messages_stream.found:
+            raise ValueError("No messages found in Telegram export.")
+        if self.skipped_messages:
+            logger.info(f"Skipped {self.skipped_messages} non-text messages")
+        return messages
+
+    def _parse_batch(self, messages: List[TelegramMessage]) -> Iterator[ParsedMessage]:
+        for message in messages:
+            parsed_message = self._parse_message(message)
+            if parsed_message is None:
+                self.skipped_messages += 1
+                continue
+            yield parsed_message
+
+    def _parse_message(self, message: TelegramMessage) -> Optional[ParsedMessage]:
+        if not isinstance(message, dict) or message.get("type") != "message":
+            return None
+        parsed_time = self._parse_time(message)
+        parsed_sender = self._parse_sender(message)
+        parsed_text = self._parse_message_text(message)
+        if not parsed_time or not parsed_sender or not parsed_text:
+            return None
+        return ParsedMessage(
+            timestamp=parsed_time, sender=parsed_sender, message_text=parsed_text
+        )
+
+    @override
+    def _parse_time(self, message: TelegramMessage) -> Optional[datetime]:
+        date = message.get("date")
+        if not isinstance(date, str):
+            return None
+        try:
+            return datetime.fromisoformat(date)
+        except ValueError:
+            return None
+
+    @override
+    def _parse_sender(self, message: TelegramMessage) -> Optional[str]:
+        # "from" is null for deleted accounts
+        sender = message.get("from") or message.get("from_id")
+        if not isinstance(sender, str):
+            return None
+        return sender.strip()
+
+    @override
+    def _parse_message_text(self, message: TelegramMessage) -> Optional[str]:
+        text = message.get("text")
+        if isinstance(text, str):
+            return text.strip()
+        if not isinstance(text, list):
+            return None
+        # Rich text is a list of plain strings and entity objects
+        return "".join(
+            part if isinstance(part, str) else part.get("text", "") for part in text
+        ).strip()
@@ -0,0 +1,81 @@
+import posixpath
+import zipfile
+from typing import AsyncIterator, List
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel
+
+from ..streaming import iter_file_chunks, iter_lines, iter_upload_chunks
+
+WHATSAPP_CHAT_MEMBER = "_chat.txt"
+
+
+class MediaEntry(BaseModel):
+    name: str
+    size: int
+
+
+class WhatsAppExport:
+    """An uploaded export: either the bare chat .txt or the .zip phones produce.
+
+    For archives only the chat member is decompressed, streamed straight from
+    the spooled upload. Media entries are indexed from the zip directory and
+    never read.
+    """
+
+    file: UploadFile
+    media: List[MediaEntry]
+
+    def __init__(self, file: UploadFile):
+        self.file = file
+        self.media = []
+
+    @property
+    def is_archive(self) -> bool:
+        return (self.file.filename or "").lower().endswith(".zip")
+
+    async def iter_lines(self) -> AsyncIterator[str]:
+        if not self.is_archive:
+            async for line in iter_lines(iter_upload_chunks(self.file)):
+                yield line
+            return
+
+        try:
+            archive = await run_in_threadpool(zipfile.ZipFile, self.file.file)
+        except zipfile.BadZipFile:
+            raise ValueError("Invalid zip archive.")
+
+        with archive:
+            chat_member = self._index_archive(archive)
+            with archive.open(chat_member) as chat_file:
+                async for line in iter_lines(iter_file_chunks(chat_file)):
+                    yield line
+
+    def _index_archive(self, archive: zipfile.ZipFile) -> zipfile.ZipInfo:
+        text_members: List[zipfile.ZipInfo] = []
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            if info.filename.lower().endswith(".txt"):
+                text_members.append(info)
+            else:
+                self.media.append(MediaEntry(name=info.filename, size=info.file_size))
+
+        # iOS names the chat _chat.txt, Android names it after the contact.
+        # Any other .txt in the archive is a shared document.
+        chat_member = next(
+            (
+                info
+                for info in text_members
+                if posixpath.basename(info.filename) == WHATSAPP_CHAT_MEMBER
+            ),
+            text_members[0] if len(text_members) == 1 else None,
+        )
+        if chat_member is None:
+            raise ValueError("Zip archive must contain exactly one chat .txt file.")
+
+        for info in text_members:
+            if info is not chat_member:
+                self.media.append(MediaEntry(name=info.filename, size=info.file_size))
+        return chat_member
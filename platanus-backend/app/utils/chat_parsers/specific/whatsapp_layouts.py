@@ -0,0 +1,173 @@
+import itertools
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from ..timestamps import TimestampDecoder
+
+TIMESTAMP_GROUPS = ("day", "month", "year", "hour", "minute", "second", "meridiem")
+
+# Timestamp, sender and text of one merged message
+MessageFields = Tuple[datetime, str, str]
+
+
+class WhatsAppLayout:
+    """One way a WhatsApp export can lay out the message header.
+
+    Exports differ by app platform and phone locale: iOS wraps the timestamp
+    in brackets while Android separates it with a dash, and the date and
+    clock formats follow the locale. Each layout compiles its own anchored
+    line regex and timestamp decoder.
+    """
+
+    def __init__(
+        self,
+        bracketed: bool,
+        day_first: bool,
+        four_digit_year: bool,
+        twelve_hour: bool,
+    ):
+        self.bracketed = bracketed
+        self.day_first = day_first
+        self.four_digit_year = four_digit_year
+        self.twelve_hour = twelve_hour
+        self.name = "{}, {}, {}, {}".format(
+            "bracketed" if bracketed else "dash",
+            "d/m" if day_first else "m/d",
+            "yyyy" if four_digit_year else "yy",
+            "12h" if twelve_hour else "24h",
+        )
+
+        first, second = ("day", "month") if day_first else ("month", "day")
+        year_digits = 4 if four_digit_year else 2
+        date = (
+            rf"(?P<{first}>\d{{1,2}})[./-](?P<{second}>\d{{1,2}})[./-]"
+            rf"(?P<year>\d{{{year_digits}}})"
+        )
+        time = r"(?P<hour>\d{1,2}):(?P<minute>\d{2})(?::(?P<second>\d{2}))?"
+        if twelve_hour:
+            time += r" ?(?P<meridiem>[AaPp])\.? ?[Mm]\.?"
+        header = rf"\[{date},? {time}\]" if bracketed else rf"{date},? {time} -"
+
+        self.line_pattern = re.compile(
+            header + r"(?P<sender>[^:]*): (?P<text>.*)", re.DOTALL
+        )
+        self.start_pattern = (
+            re.compile(r"\[") if bracketed else re.compile(rf"{date},? {time} -")
+        )
+        self.timestamp_decoder = TimestampDecoder(twelve_hour=twelve_hour)
+
+        groupindex = self.line_pattern.groupindex
+        self._timestamp_groups = tuple(
+            groupindex[name] for name in TIMESTAMP_GROUPS if name in groupindex
+        )
+        self._sender_group = groupindex["sender"]
+        self._text_group = groupindex["text"]
+
+    def __repr__(self) -> str:
+        return f"WhatsAppLayout({self.name})"
+
+    def starts_message(self, line: str) -> bool:
+        return self.start_pattern.match(line) is not None
+
+    def parse(self, message: str) -> Optional[MessageFields]:
+        """Split a merged message into timestamp, sender and text."""
+        line_match = self.line_pattern.match(message)
+        if not line_match:
+            return None
+        parsed_time = self.timestamp_decoder.decode(
+            *line_match.group(*self._timestamp_groups)
+        )
+        if parsed_time is None:
+            return None
+        return (
+            parsed_time,
+            line_match.group(self._sender_group).strip(),
+            line_match.group(self._text_group).strip(),
+        )
+
+
+# Ordered by preference: ties during detection go to the earliest layout.
+WHATSAPP_LAYOUTS: List[WhatsAppLayout] = [
+    WhatsAppLayout(
+        bracketed=bracketed,
+        day_first=day_first,
+        four_digit_year=four_digit_year,
+        twelve_hour=twelve_hour,
+    )
+    for bracketed, twelve_hour, day_first, four_digit_year in itertools.product(
+        (True, False), (True, False), (True, False), (False, True)
+    )
+]
+
+DEFAULT_WHATSAPP_LAYOUT = WHATSAPP_LAYOUTS[0]
+
+
+def detect_layout(sample_lines: List[str]) -> Optional[WhatsAppLayout]:
+    """Pick the layout that parses the most sample lines.
+
+    d/m and m/d layouts both accept dates where the day is at most 12, so
+    ties are broken by how many consecutive timestamps come out in
+    chronological order, then by the smallest total span between them: read
+    the wrong way round, the next day lands a month later.
+    """
+    best_layout: Optional[WhatsAppLayout] = None
+    best_score: Tuple[int, int, float] = (0, 0, 0.0)
+    for layout in WHATSAPP_LAYOUTS:
+        score = _score_layout(layout, sample_lines)
+        if score > best_score:
+            best_layout, best_score = layout, score
+
+    return best_layout
+
+
+def day_order_twin(layout: WhatsAppLayout) -> WhatsAppLayout:
+    """The layout that only differs from layout in the day and month order."""
+    return next(
+        twin
+        for twin in WHATSAPP_LAYOUTS
+        if twin.day_first != layout.day_first
+        and twin.bracketed == layout.bracketed
+        and twin.four_digit_year == layout.four_digit_year
+        and twin.twelve_hour == layout.twelve_hour
+    )
+
+
+def is_day_order_settled(layout: WhatsAppLayout, sample_lines: List[str]) -> bool:
+    """Whether some sample line has a day or month past 12, ruling out the twin."""
+    twin = day_order_twin(layout)
+    return any(
+        layout.parse(line) is not None and twin.parse(line) is None
+        for line in sample_lines
+    )
+
+
+def settle_day_order(layout: WhatsAppLayout, line: str) -> Optional[WhatsAppLayout]:
+    """Whichever of layout and its twin parses line, if only one of them does."""
+    twin = day_order_twin(layout)
+    parses = layout.parse(line) is not None
+    if parses == (twin.parse(line) is not None):
+        return None
+    return layout if parses else twin
+
+
+def pick_day_order(layout: WhatsAppLayout, sample_lines: List[str]) -> WhatsAppLayout:
+    """Whichever of layout and its twin scores better on the whole sample."""
+    twin = day_order_twin(layout)
+    if _score_layout(twin, sample_lines) > _score_layout(layout, sample_lines):
+        return twin
+    return layout
+
+
+def _score_layout(
+    layout: WhatsAppLayout, sample_lines: List[str]
+) -> Tuple[int, int, float]:
+    timestamps = []
+    for line in sample_lines:
+        parsed = layout.parse(line)
+        if parsed is not None:
+            timestamps.append(parsed[0])
+    pairs = list(zip(timestamps, timestamps[1:]))
+    in_order = sum(1 for earlier, later in pairs if earlier <= later)
+    span = sum(abs((later - earlier).total_seconds()) for earlier, later in pairs)
+    return len(timestamps), in_order, -span
@@ -1,92 +1,324 @@
+import itertools
 import logging
-import re
+from concurrent.futures import Executor
 from datetime import datetime
-from typing import List, Optional, override
+from functools import partial
+from typing import (
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    override,
+)
 
 from ..message_parser import MessagesParser, ParsedChat, ParsedMessage
+from ..parallel import PARSE_SHARD_LINES
+from .whatsapp_layouts import (
+    DEFAULT_WHATSAPP_LAYOUT,
+    WHATSAPP_LAYOUTS,
+    MessageFields,
+    WhatsAppLayout,
+    detect_layout,
+    is_day_order_settled,
+    pick_day_order,
+    settle_day_order,
+)
 
 logger = logging.getLogger(__name__)
 
+LAYOUT_SAMPLE_LINES = 200
+# While every sampled date reads both as d/m and m/d, detection keeps reading
+# up to this many lines for one that only fits one of them
+LAYOUT_MAX_SAMPLE_LINES = 100_000
+# Past this share of skipped messages the export was most likely misread, so
+# parsing fails instead of silently dropping them
+MAX_SKIPPED_SHARE = 0.2
+MIN_SKIPPED_TO_FAIL = 50
 
-class WhatsAppMessagesParser(MessagesParser):
-    time_pattern = re.compile(r"\[(.*?)\]")
-    message_pattern = re.compile(r": (.*)")
-    user_pattern = re.compile(r"\](.*?):")
 
-    merged_messages: List[str]
+def normalize_line(line: str) -> str:
+    line = line.replace("\u202f", " ")
+    line = line.replace("\xa0", " ")
+    line = line.replace("\u200e", "")
+    return line
 
-    def __init__(self, raw_messages: List[str]):
-        messages = raw_messages
-        self.merged_messages = self._merge_messages(messages)
 
-    def _merge_messages(self, messages: List[str]) -> List[str]:
-        merged_messages = []
-        for message in messages:
-            message = message.replace("\u202f", " ")
-            message = message.replace("\u200e", "")
-            if not message:
-                logger.info("Skipping empty message")
-                continue
-            if message[0] == "[":
-                merged_messages.append(message)
-            else:
-                merged_messages[-1] += message + "\n"
-        return merged_messages
+class WhatsAppMessageMerger:
+    """Joins continuation lines onto the message they belong to.
+
+    Lines are fed one at a time; a merged message is handed back as soon as
+    the next message starts, so only one message is ever buffered.
+    """
+
+    def __init__(self, layout: WhatsAppLayout = DEFAULT_WHATSAPP_LAYOUT):
+        self.layout = layout
+        self._buffer: List[str] = []
+
+    def feed(self, line: str) -> Optional[str]:
+        line = normalize_line(line)
+        if not line:
+            return None
+        if not self.layout.starts_message(line):
+            if not self._buffer:
+                logger.info("Skipping continuation line without a message")
+                return None
+            self._buffer.append(line)
+            return None
+
+        merged_message = self.flush()
+        self._buffer.append(line)
+        return merged_message
+
+    def flush(self) -> Optional[str]:
+        if not self._buffer:
+            return None
+        merged_message = "\n".join(self._buffer)
+        self._buffer = []
+        return merged_message
+
+
+class WhatsAppMessagesParser(MessagesParser[MessageFields]):
+    """Parser for WhatsApp text exports.
+
+    Unless a layout is given, it is detected once per file from the first
+    LAYOUT_SAMPLE_LINES lines, or more if they leave the day order open.
+    Messages that still fail to parse are counted in skipped_messages and
+    reported once at the end, unless they exceed MAX_SKIPPED_SHARE.
+    """
+
+    raw_messages: Iterable[str]
+    layout: Optional[WhatsAppLayout]
+    skipped_messages: int
+    parsed_messages: int
+    check_skipped: bool
+
+    def __init__(
+        self,
+        raw_messages: Iterable[str] = (),
+        layout: Optional[WhatsAppLayout] = None,
+        check_skipped: bool = True,
+    ):
+        self.raw_messages = raw_messages
+        self.layout = layout
+        self.skipped_messages = 0
+        self.parsed_messages = 0
+        self.check_skipped = check_skipped
+        self._day_order_open = False
 
     @override
     def parse(self) -> ParsedChat:
-        parsed_messages: List[ParsedMessage] = []
-        for message in self.merged_messages:
-            parsed_message = self._parse_message(message)
-            if parsed_message is None:
-                logger.info(f"Skipping unparseable message: {message}")
-                continue
-            parsed_messages.append(parsed_message)
+        parsed_messages = list(self.iter_parse(self.raw_messages))
 
         parsed_chat = ParsedChat(messages=parsed_messages, source="whatsapp")
         return parsed_chat
 
+    def iter_parse(self, lines: Iterable[str]) -> Iterator[ParsedMessage]:
+        """Lazily parse raw export lines into messages."""
+        lines_iterator = iter(lines)
+        sample = list(itertools.islice(lines_iterator, LAYOUT_SAMPLE_LINES))
+        self._select_layout(sample)
+        while self._needs_more_sample(sample):
+            line = next(lines_iterator, None)
+            if line is None:
+                break
+            self._add_sample_line(sample, line)
+        self._settle_day_order(sample)
+
+        yield from self._iter_messages(itertools.chain(sample, lines_iterator))
+        self._report_skipped()
+
+    async def aiter_parse(
+        self, lines: AsyncIterable[str]
+    ) -> AsyncIterator[ParsedMessage]:
+        """Async counterpart of iter_parse, for lines streamed from an upload."""
+        lines = await self._prepare_stream(lines)
+        merger = WhatsAppMessageMerger(self._layout)
+        async for line in lines:
+            for parsed_message in self._iter_messages([line], merger, flush=False):
+                yield parsed_message
+
+        for parsed_message in self._iter_messages([], merger):
+            yield parsed_message
+        self._report_skipped()
+
+    async def aiter_parse_parallel(
+        self,
+        lines: AsyncIterable[str],
+        executor: Executor,
+        shard_lines: int = PARSE_SHARD_LINES,
+    ) -> AsyncIterator[ParsedMessage]:
+        async for parsed_message in super().aiter_parse_parallel(
+            lines, executor, shard_lines
+        ):
+            # Shards only count their own messages, the share is checked here
+            self.parsed_messages += 1
+            self._check_skipped()
+            yield parsed_message
+        self._report_skipped()
+
+    @classmethod
+    def parse_shard(
+        cls, layout_index: int, lines: List[str]
+    ) -> Tuple[List[ParsedMessage], int]:
+        """Parse one shard in a worker process; layouts travel by index."""
+        whatsapp_parser = cls(
+            layout=WHATSAPP_LAYOUTS[layout_index], check_skipped=False
+        )
+        parsed_messages = list(whatsapp_parser._iter_messages(lines))
+        return parsed_messages, whatsapp_parser.skipped_messages
+
+    def _iter_messages(
+        self,
+        lines: Iterable[str],
+        merger: Optional[WhatsAppMessageMerger] = None,
+        flush: bool = True,
+    ) -> Iterator[ParsedMessage]:
+        """Merge and parse lines, through merger if given.
+
+        Without flush the last message stays buffered in merger, for a later
+        call to complete once its continuation lines have arrived.
+        """
+        if merger is None:
+            merger = WhatsAppMessageMerger(self._layout)
+        for line in lines:
+            parsed_message = self._parse_merged(merger.feed(line))
+            if parsed_message is not None:
+                yield parsed_message
+
+        if flush:
+            parsed_message = self._parse_merged(merger.flush())
+            if parsed_message is not None:
+                yield parsed_message
+
+    @override
+    async def _prepare_stream(self, lines: AsyncIterable[str]) -> AsyncIterable[str]:
+        lines_iterator = aiter(lines)
+        sample: List[str] = []
+        if self.layout is None:
+            async for line in lines_iterator:
+                sample.append(line)
+                if len(sample) >= LAYOUT_SAMPLE_LINES:
+                    break
+            self._select_layout(sample)
+            while self._needs_more_sample(sample):
+                line = await anext(lines_iterator, None)
+                if line is None:
+                    break
+                self._add_sample_line(sample, line)
+            self._settle_day_order(sample)
+        return _replay(sample, lines_iterator)
+
+    @override
+    def _is_message_start(self, line: str) -> bool:
+        return self._layout.starts_message(normalize_line(line))
+
+    @override
+    def _shard_parser(self) -> Callable[[List[str]], Tuple[List[ParsedMessage], int]]:
+        return partial(type(self).parse_shard, WHATSAPP_LAYOUTS.index(self._layout))
+
+    def _select_layout(self, sample: List[str]) -> WhatsAppLayout:
+        if self.layout is not None:
+            return self.layout
+        if not sample:
+            self.layout = DEFAULT_WHATSAPP_LAYOUT
+            return self.layout
+
+        normalized_sample = [normalize_line(line) for line in sample]
+        layout = detect_layout(normalized_sample)
+        if layout is None:
+            raise ValueError("Unrecognized WhatsApp export format.")
+        logger.info(f"Detected WhatsApp export layout: {layout.name}")
+        self.layout = layout
+        self._day_order_open = not is_day_order_settled(layout, normalized_sample)
+        return layout
+
+    def _needs_more_sample(self, sample: List[str]) -> bool:
+        return self._day_order_open and len(sample) < LAYOUT_MAX_SAMPLE_LINES
+
+    def _add_sample_line(self, sample: List[str], line: str):
+        """Extend the sample past LAYOUT_SAMPLE_LINES to settle the day order."""
+        sample.append(line)
+        layout = settle_day_order(self._layout, normalize_line(line))
+        if layout is None:
+            return
+        self._day_order_open = False
+        self._switch_layout(layout)
+
+    def _settle_day_order(self, sample: List[str]):
+        """If no line ruled out either day order, pick one on the whole sample."""
+        if not self._day_order_open:
+            return
+        self._day_order_open = False
+        normalized_sample = [normalize_line(line) for line in sample]
+        self._switch_layout(pick_day_order(self._layout, normalized_sample))
+
+    def _switch_layout(self, layout: WhatsAppLayout):
+        if layout is not self.layout:
+            logger.info(f"Day order settled, switching layout to {layout.name}")
+            self.layout = layout
+
+    def _check_skipped(self):
+        if not self.check_skipped or self.skipped_messages < MIN_SKIPPED_TO_FAIL:
+            return
+        total_messages = self.parsed_messages + self.skipped_messages
+        if self.skipped_messages > MAX_SKIPPED_SHARE * total_messages:
+            raise ValueError(
+                f"Could not read {self.skipped_messages} of {total_messages} "
+                f"messages, the WhatsApp export format was not recognized."
+            )
+
+    def _report_skipped(self):
+        if self.skipped_messages:
+            logger.info(f"Skipped {self.skipped_messages} unparseable messages")
+
+    def _parse_merged(self, message: Optional[str]) -> Optional[ParsedMessage]:
+        if message is None:
+            return None
+        parsed_message = self._parse_message(message)
+        if parsed_message is None:
+            self.skipped_messages += 1
+            self._check_skipped()
+        else:
+            self.parsed_messages += 1
+        return parsed_message
+
     def _parse_message(self, message: str) -> Optional[ParsedMessage]:
-        parsed_time = self._parse_time(message)
-        parsed_sender = self._parse_sender(message)
-        parsed_text = self._parse_message_text(message)
-        if not parsed_time or not parsed_sender or not parsed_text:
+        # The layout regex runs once, the accessors below only pick fields
+        fields = self._layout.parse(message)
+        if fields is None:
+            return None
+        parsed_time = self._parse_time(fields)
+        parsed_sender = self._parse_sender(fields)
+        parsed_text = self._parse_message_text(fields)
+        if not parsed_sender or not parsed_text:
             return None
         return ParsedMessage(
             timestamp=parsed_time, sender=parsed_sender, message_text=parsed_text
         )
 
-    @classmethod
-    def _parse_time(cls, message: str) -> Optional[datetime]:
-        time_match = cls.time_pattern.search(message)
-        if not time_match:
-            logger.warning(f"Time pattern not found in message: {message}")
-            return None
-        time_str = time_match.group(1)
-        try:
-            parsed_time = datetime.strptime(time_str, "%d-%m-%y, %I:%M:%S %p")
-        except Exception:
-            logger.warning(f"Failed to parse time string: {time_str}")
-            return None
-        return parsed_time
+    @property
+    def _layout(self) -> WhatsAppLayout:
+        return self.layout or DEFAULT_WHATSAPP_LAYOUT
 
-    @classmethod
-    def _parse_sender(cls, message: str) -> Optional[str]:
-        user_match = cls.user_pattern.search(message)
-        if not user_match:
-            logger.warning("User pattern not found in message")
-            return None
-        user_str = user_match.group(1)
-        if not isinstance(user_str, str):
-            logger.warning("Parsed user is not a string")
-            return None
-        return user_str.strip()
+    @override
+    def _parse_time(self, message: MessageFields) -> datetime:
+        return message[0]
 
-    @classmethod
-    def _parse_message_text(cls, message) -> Optional[str]:
-        message_match = cls.message_pattern.search(message)
-        if not message_match:
-            logger.warning("Message text pattern not found in message")
-            return None
-        message_str = message_match.group(1)
-        return message_str.strip()
+    @override
+    def _parse_sender(self, message: MessageFields) -> str:
+        return message[1]
+
+    @override
+    def _parse_message_text(self, message: MessageFields) -> str:
+        return message[2]
+
+
+async def _replay(sample: List[str], rest: AsyncIterator[str]) -> AsyncIterator[str]:
+    for line in sample:
+        yield line
+    async for line in rest:
+        yield line
@@ -0,0 +1,72 @@
+import codecs
+from typing import AsyncIterable, AsyncIterator, BinaryIO
+
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Every separator str.splitlines() breaks on, so a chunk ending in one of
+# these has no partial line left over.
+LINE_BREAKS = (
+    "\n",
+    "\r",
+    "\v",
+    "\f",
+    "\x1c",
+    "\x1d",
+    "\x1e",
+    "\x85",
+    "\u2028",
+    "\u2029",
+)
+
+
+async def iter_upload_chunks(
+    file: UploadFile, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Read an uploaded file in fixed size chunks instead of all at once."""
+    while chunk := await file.read(chunk_size):
+        yield chunk
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes], encoding: str = "utf-8-sig"
+) -> AsyncIterator[str]:
+    """Decode byte chunks incrementally and yield complete lines.
+
+    Only the trailing partial line of each chunk is kept between reads, so
+    memory stays bounded by the chunk size regardless of the file size.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)()
+    pending = ""
+    async for chunk in chunks:
+        text = pending + decoder.decode(chunk)
+        lines = text.splitlines()
+        pending = lines.pop() if lines and not text.endswith(LINE_BREAKS) else ""
+        for line in lines:
+            yield line
+
+    for line in (pending + decoder.decode(b"", final=True)).splitlines():
+        yield line
+
+
+async def iter_file_chunks(
+    file: BinaryIO, chunk_size: int = UPLOAD_CHUNK_SIZE
+) -> AsyncIterator[bytes]:
+    """Read a blocking file object in chunks without blocking the event loop."""
+    while chunk := await run_in_threadpool(file.read, chunk_size):
+        yield chunk
+
+
+async def iter_text(
+    chunks: AsyncIterable[bytes], encoding: str = "utf-8-sig"
+) -> AsyncIterator[str]:
+    """Decode byte chunks incrementally, without splitting them into lines."""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    async for chunk in chunks:
+        if text := decoder.decode(chunk):
+            yield text
+
+    if text := decoder.decode(b"", final=True):
+        yield text
@@ -0,0 +1,58 @@
+from datetime import datetime
+from functools import lru_cache
+from typing import Optional, Tuple
+
+
+class TimestampDecoder:
+    """Builds datetimes from the integer groups captured by a line regex.
+
+    Exports repeat the same date on every message of a day, so the date part
+    is decoded and validated once per distinct prefix and memoized.
+    """
+
+    def __init__(self, twelve_hour: bool = True, cache_size: int = 4096):
+        self.twelve_hour = twelve_hour
+        self._decode_date = lru_cache(maxsize=cache_size)(self._decode_date_uncached)
+
+    def decode(
+        self,
+        day: str,
+        month: str,
+        year: str,
+        hour: str,
+        minute: str,
+        second: Optional[str] = None,
+        meridiem: Optional[str] = None,
+    ) -> Optional[datetime]:
+        date_parts = self._decode_date(day, month, year)
+        if date_parts is None:
+            return None
+
+        hour_value = int(hour)
+        if self.twelve_hour:
+            if not meridiem or not 1 <= hour_value <= 12:
+                return None
+            hour_value %= 12
+            if meridiem[0] in "pP":
+                hour_value += 12
+
+        try:
+            return datetime(
+                *date_parts, hour_value, int(minute), int(second) if second else 0
+            )
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _decode_date_uncached(
+        day: str, month: str, year: str
+    ) -> Optional[Tuple[int, int, int]]:
+        year_value = int(year)
+        if len(year) == 2:
+            # Same pivot as strptime's %y
+            year_value += 2000 if year_value < 69 else 1900
+        try:
+            parsed_date = datetime(year_value, int(month), int(day))
+        except ValueError:
+            return None
+        return parsed_date.year, parsed_date.month, parsed_date.day
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Optional, Set, Tuple, Type, TypeVar
+
+from pydantic import BaseModel
+from tortoise import timezone
+
+from app.db import LLMResponse
+
+LLM_CACHE_MEMORY_ENTRIES = int(os.getenv("LLM_CACHE_MEMORY_ENTRIES", "256"))
+LLM_CACHE_MAX_ROWS = int(os.getenv("LLM_CACHE_MAX_ROWS", "10000"))
+LLM_CACHE_TTL_HOURS = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+
+# Expired and excess rows are deleted once every this many stores
+PRUNE_EVERY_STORES = 100
+# Memory hits are written to used_at in one update at most this often
+USED_AT_FLUSH_SECONDS = 60
+
+M = TypeVar("M", bound=BaseModel)
+
+
+class CacheMetrics(BaseModel):
+    """LLM response cache hits and misses since the process started."""
+
+    memory_hits: int
+    disk_hits: int
+    misses: int
+    memory_entries: int
+
+
+class LLMResponseCache:
+    """Structured LLM responses by request content, in memory and in SQLite.
+
+    The key hashes everything that shapes the response: model, messages,
+    response schema and max_tokens. Recent responses are served from an
+    in-memory LRU, older ones from the llm_response table, which outlives
+    restarts. Rows expire after the TTL and the least recently used go once
+    the table is over its size. Memory hits count as use too: their keys
+    are collected and their used_at updated together, see
+    USED_AT_FLUSH_SECONDS, and always before pruning.
+    """
+
+    memory_entries: int
+    max_rows: int
+    ttl: timedelta
+
+    def __init__(
+        self,
+        memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+        max_rows: int = LLM_CACHE_MAX_ROWS,
+        ttl_hours: float = LLM_CACHE_TTL_HOURS,
+    ):
+        self.memory_entries = memory_entries
+        self.max_rows = max_rows
+        self.ttl = timedelta(hours=ttl_hours)
+        # key -> (response JSON, created at)
+        self._memory: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+        self._stores = 0
+        # Keys hit in memory since used_at was last written
+        self._touched: Set[str] = set()
+        self._touched_flushed_at = 0.0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str, response_model: Type[M]) -> Optional[M]:
+        now = timezone.now()
+        cached = self._memory.get(key)
+        if cached is not None:
+            response, created_at = cached
+            if now.timestamp() - created_at < self.ttl.total_seconds():
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self._touched.add(key)
+                if now.timestamp() - self._touched_flushed_at >= USED_AT_FLUSH_SECONDS:
+                    await self.flush_used_at()
+                return response_model.model_validate_json(response)
+            del self._memory[key]
+
+        row = await LLMResponse.get_or_none(key=key, created_at__gt=now - self.ttl)
+        if row is None:
+            self.misses += 1
+            return None
+        await LLMResponse.filter(key=key).update(used_at=now)
+        self._remember(key, row.response, row.created_at.timestamp())
+        self.disk_hits += 1
+        return response_model.model_validate_json(row.response)
+
+    async def put(self, key: str, response: BaseModel):
+        now = timezone.now()
+        response_json = response.model_dump_json()
+        self._remember(key, response_json, now.timestamp())
+        await LLMResponse.bulk_create(
+            [LLMResponse(key=key, response=response_json, created_at=now, used_at=now)],
+            on_conflict=["key"],
+            update_fields=["response", "created_at", "used_at"],
+        )
+        self._stores += 1
+        if self._stores % PRUNE_EVERY_STORES == 0:
+            await self.prune()
+
+    async def flush_used_at(self):
+        """Write the time of the memory hits since the last flush to used_at."""
+        now = timezone.now()
+        touched = list(self._touched)
+        self._touched.clear()
+        self._touched_flushed_at = now.timestamp()
+        if touched:
+            await LLMResponse.filter(key__in=touched).update(used_at=now)
+
+    async def prune(self):
+        """Delete expired rows, then the least recently used over max_rows."""
+        await self.flush_used_at()
+        await LLMResponse.filter(created_at__lte=timezone.now() - self.ttl).delete()
+        excess = await LLMResponse.all().count() - self.max_rows
+        if excess > 0:
+            stale_keys = (
+                await LLMResponse.all()
+                .order_by("used_at")
+                .limit(excess)
+                .values_list("key", flat=True)
+            )
+            await LLMResponse.filter(key__in=stale_keys).delete()
+
+    def metrics(self) -> CacheMetrics:
+        return CacheMetrics(
+            memory_hits=self.memory_hits,
+            disk_hits=self.disk_hits,
+            misses=self.misses,
+            memory_entries=len(self._memory),
+        )
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+
+def cache_key(
+    model: str, messages: list[dict], response_model: Type[BaseModel], max_tokens: int
+) -> str:
+    content = json.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "schema": response_model.model_json_schema(),
+            "max_tokens": max_tokens,
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+llm_response_cache = LLMResponseCache()
@@ -1,7 +1,21 @@
+from typing import AsyncIterator, Type, TypeVar
+
 import instructor
-from anthropic import Anthropic
 from pydantic import BaseModel, Field
 
+from .cache import cache_key, llm_response_cache
+from .prompts import (
+    ANALYSIS_PROMPT_TOKENS,
+    PERSONA_PROMPT_TOKENS,
+    BuiltPrompt,
+    build_prompt,
+    clip,
+    estimate_tokens,
+    prompt_metrics,
+)
+
+M = TypeVar("M", bound=BaseModel)
+
 
 class ChatResponse(BaseModel):
     """Structured response from the LLM acting as the person."""
@@ -25,18 +39,27 @@ class HealthScoreAnalysis(BaseModel):
     )
 
 
-class ConversationTopicAnalysis(BaseModel):
-    """Structured response for last conversation topic analysis."""
+class ConversationAnalysis(BaseModel):
+    """Structured response for the analysis of one conversation."""
 
     topic: str = Field(
-        description="Main topic or theme of the recent conversation in 2-5 words (in Spanish)"
+        description="Main topic or theme of the conversation in 2-5 words (in Spanish)"
+    )
+    sentiment: str = Field(
+        description="Overall tone of the conversation: 'Positivo', 'Neutral', 'Negativo' or 'Tenso'"
     )
-    summary: str = Field(description="Brief one-sentence summary of what was discussed")
+    summary: str = Field(
+        description="Brief one-sentence summary of what was discussed (in Spanish)"
+    )
+
 
+class SessionsAndHealthAnalysis(BaseModel):
+    """Structured response for new conversations and relationship health at once."""
 
-def get_instructor_client() -> instructor.Instructor:
-    """Create an instructor-wrapped Anthropic client."""
-    return instructor.from_anthropic(Anthropic())
+    conversations: list[ConversationAnalysis] = Field(
+        description="Analysis of each new conversation, in the order they were given"
+    )
+    health: HealthScoreAnalysis
 
 
 def create_person_system_prompt(
@@ -49,16 +72,12 @@ def create_person_system_prompt(
     message_history: list[dict],
     user_name: str,
 ) -> str:
-    """Create a system prompt that instructs the LLM to act as the person."""
+    """Create a system prompt that instructs the LLM to act as the person.
 
-    history_text = ""
-    if message_history:
-        history_text = f"\n\nHistorial de conversaciones anteriores entre tu ({first_name}) y {user_name}:\n"
-        for msg in message_history[-250:]:  # Last 50 messages for context
-            sender = msg["sent_from"]
-            history_text += f"- Sent from ({sender}): {msg['message_text']}\n"
-
-    return f"""Eres {first_name} {last_name}. Estas hablando directamente con {user_name}.
+    The profile and instructions are always included, followed by as many of
+    the latest messages as fit in PERSONA_PROMPT_TOKENS.
+    """
+    profile = f"""Eres {first_name} {last_name}. Estas hablando directamente con {user_name}.
 
 Informacion sobre ti:
 - Nombre completo: {first_name} {last_name}
@@ -78,81 +97,116 @@ Instrucciones:
 8. No seas muy buena onda si tu personalidad no lo es
 9. Eres chileno, porsia
 10. Te van a usar para simular conversaciones reales, asi que se coherente con tu personalidad
-11. Infiere de tu nombre, cual lado del historial de mensajes eres tu y cual es {user_name}. Solo hay dos participantes en el historial de mensajes, uno eres tu, y el otro es {user_name}.
-{history_text}"""
+11. Infiere de tu nombre, cual lado del historial de mensajes eres tu y cual es {user_name}. Solo hay dos participantes en el historial de mensajes, uno eres tu, y el otro es {user_name}."""
+
+    # Every line takes at least two tokens, older messages could never fit
+    recent_history = message_history[-(PERSONA_PROMPT_TOKENS // 2) :]
+    prompt = build_prompt(
+        head=profile,
+        history=[
+            persona_history_line(msg["sent_from"], msg["message_text"])
+            for msg in recent_history
+        ],
+        budget=PERSONA_PROMPT_TOKENS,
+        history_heading=f"\nHistorial de conversaciones anteriores entre tu ({first_name}) y {user_name}:",
+    )
+    prompt_metrics.record("persona", prompt)
+    return prompt.text
 
 
-def chat_with_person(
-    client: instructor.Instructor,
-    system_prompt: str,
-    user_message: str,
-    conversation_history: list[dict],
-) -> ChatResponse:
-    """Send a message and get a structured response.
+def persona_history_line(sent_from: str, message_text: str) -> str:
+    return f"- Sent from ({sent_from}): {clip(message_text)}"
 
-    Args:
-        client: The instructor-wrapped Anthropic client
-        system_prompt: The system prompt with person context
-        user_message: The current message from the user
-        conversation_history: List of previous messages in the current session
-                            Format: [{"role": "user"|"assistant", "content": "..."}]
+
+def chat_messages(
+    system_prompt: str | list[str], user_message: str, conversation_history: list[dict]
+) -> list[dict]:
+    """Build the messages list: person context, session history, new message.
+
+    A system prompt given in parts, e.g. a stable prefix and a growing tail,
+    gets a prompt cache breakpoint after each, so a changed tail still
+    reuses the cached prefix.
     """
-    # Build messages list with conversation history + new message
+    parts = [system_prompt] if isinstance(system_prompt, str) else system_prompt
     system_message = {
         "role": "user",
         "content": [
-            {
-                "type": "text",
-                "text": system_prompt,
-                "cache_control": {"type": "ephemeral"},
-            }
+            {"type": "text", "text": part, "cache_control": {"type": "ephemeral"}}
+            # Empty text blocks are rejected
+            for part in parts
+            if part
         ],
     }
-    messages = (
+    return (
         [system_message]
         + conversation_history
         + [{"role": "user", "content": user_message}]
     )
 
-    response = client.chat.completions.create(
+
+async def chat_with_person(
+    client: instructor.AsyncInstructor,
+    system_prompt: str | list[str],
+    user_message: str,
+    conversation_history: list[dict],
+) -> ChatResponse:
+    """Send a message and get a structured response.
+
+    Args:
+        client: The instructor-wrapped async Anthropic client
+        system_prompt: The system prompt with person context, or its parts
+        user_message: The current message from the user
+        conversation_history: List of previous messages in the current session
+                            Format: [{"role": "user"|"assistant", "content": "..."}]
+    """
+    response = await client.chat.completions.create(
         model="claude-sonnet-4-5-20250929",
         max_tokens=1024,
-        messages=messages,
+        messages=chat_messages(system_prompt, user_message, conversation_history),
         response_model=ChatResponse,
     )
     return response
 
 
-def analyze_relationship_health(
-    client: instructor.Instructor,
+async def stream_chat_with_person(
+    client: instructor.AsyncInstructor,
+    system_prompt: str | list[str],
+    user_message: str,
+    conversation_history: list[dict],
+) -> AsyncIterator[str]:
+    """Send a message and yield the response text as it is generated.
+
+    Takes the same arguments as `chat_with_person`. The chunks joined
+    together are the complete `ChatResponse.message`.
+    """
+    partials = client.chat.completions.create_partial(
+        model="claude-sonnet-4-5-20250929",
+        max_tokens=1024,
+        messages=chat_messages(system_prompt, user_message, conversation_history),
+        response_model=ChatResponse,
+    )
+    sent = 0
+    async for partial in partials:
+        # Each partial holds the message generated so far
+        message = partial.message or ""
+        if len(message) > sent:
+            yield message[sent:]
+            sent = len(message)
+
+
+def relationship_health_prompt(
     first_name: str,
     relationship_type: str,
-    message_history: list[dict],
+    conversation_summaries: list[dict],
     user_name: str,
     total_interactions: int,
     response_time_median_min: float | None,
     communication_balance: float | None,
-) -> HealthScoreAnalysis:
-    """Analyze the health of a relationship based on conversation history and metrics.
+) -> BuiltPrompt:
+    """Prompt for the health analysis, see analyze_relationship_health.
 
-    Args:
-        client: The instructor-wrapped Anthropic client
-        first_name: The contact's first name
-        relationship_type: The type of relationship (e.g., "Familia", "Amigo Cercano")
-        message_history: List of messages with sent_from and message_text
-        user_name: The user's name
-        total_interactions: Total number of messages exchanged
-        response_time_median_min: Median response time in minutes
-        communication_balance: Ratio of sent vs received messages
+    Keeps the most recent summaries that fit in ANALYSIS_PROMPT_TOKENS.
     """
-    # Build context from recent messages
-    history_text = ""
-    if message_history:
-        history_text = "\n\nÚltimos mensajes de la conversación:\n"
-        for msg in message_history[-50:]:  # Last 50 messages for analysis
-            sender = msg["sent_from"]
-            history_text += f"- {sender}: {msg['message_text']}\n"
-
     metrics_text = f"""
 Métricas de la relación:
 - Total de interacciones: {total_interactions}
@@ -160,9 +214,9 @@ Métricas de la relación:
 - Balance de comunicación (enviados/recibidos): {f'{communication_balance:.2f}' if communication_balance is not None else 'No disponible'}
 """
 
-    system_prompt = f"""Eres un analista de relaciones personales. Debes evaluar la salud de la relación entre {user_name} y {first_name} ({relationship_type}).
+    instructions = f"""Eres un analista de relaciones personales. Debes evaluar la salud de la relación entre {user_name} y {first_name} ({relationship_type}).
 
-Basándote en el historial de conversaciones y las métricas proporcionadas, evalúa:
+Basándote en los resúmenes de conversaciones y las métricas proporcionadas, evalúa:
 1. Frecuencia y consistencia de la comunicación
 2. Tono y sentimiento de las conversaciones
 3. Balance en la comunicación (quién inicia más, quién responde más)
@@ -174,59 +228,211 @@ Considera que:
 - Más interacciones generalmente indican una relación más activa
 - El tono positivo y conversaciones significativas son indicadores de buena salud
 
-{metrics_text}
-{history_text}
+{metrics_text}"""
 
-Proporciona un análisis objetivo y constructivo."""
+    return build_prompt(
+        head=instructions,
+        history=[
+            f"- {conversation['started_at']} ({conversation['sentiment']}) "
+            f"{conversation['topic']}: {clip(conversation['summary'])}"
+            for conversation in conversation_summaries
+        ],
+        budget=ANALYSIS_PROMPT_TOKENS,
+        history_heading="Últimas conversaciones, de la más antigua a la más reciente:",
+        tail="\nProporciona un análisis objetivo y constructivo.",
+    )
 
-    messages = [{"role": "user", "content": system_prompt}]
 
-    response = client.chat.completions.create(
+async def analyze_relationship_health(
+    client: instructor.AsyncInstructor,
+    first_name: str,
+    relationship_type: str,
+    conversation_summaries: list[dict],
+    user_name: str,
+    total_interactions: int,
+    response_time_median_min: float | None,
+    communication_balance: float | None,
+    use_cache: bool = True,
+) -> HealthScoreAnalysis:
+    """Analyze the health of a relationship based on past conversations and metrics.
+
+    Args:
+        client: The instructor-wrapped async Anthropic client
+        first_name: The contact's first name
+        relationship_type: The type of relationship (e.g., "Familia", "Amigo Cercano")
+        conversation_summaries: Recent conversations, oldest first, each with
+            started_at, topic, sentiment and summary, see analyze_conversation
+        user_name: The user's name
+        total_interactions: Total number of messages exchanged
+        response_time_median_min: Median response time in minutes
+        communication_balance: Ratio of sent vs received messages
+        use_cache: Reuse the response to an identical earlier request
+    """
+    prompt = relationship_health_prompt(
+        first_name=first_name,
+        relationship_type=relationship_type,
+        conversation_summaries=conversation_summaries,
+        user_name=user_name,
+        total_interactions=total_interactions,
+        response_time_median_min=response_time_median_min,
+        communication_balance=communication_balance,
+    )
+    prompt_metrics.record("health", prompt)
+    messages = [{"role": "user", "content": prompt.text}]
+
+    return await create_cached(
+        client,
         model="claude-sonnet-4-5-20250929",
         max_tokens=512,
         messages=messages,
         response_model=HealthScoreAnalysis,
+        use_cache=use_cache,
     )
-    return response
 
 
-def analyze_last_conversation_topic(
-    client: instructor.Instructor,
+async def analyze_conversation(
+    client: instructor.AsyncInstructor,
     first_name: str,
+    user_name: str,
     message_history: list[dict],
-) -> ConversationTopicAnalysis:
-    """Analyze the topic of the most recent conversation.
+    use_cache: bool = True,
+) -> ConversationAnalysis:
+    """Analyze the topic, tone and content of one conversation.
 
     Args:
-        client: The instructor-wrapped Anthropic client
+        client: The instructor-wrapped async Anthropic client
         first_name: The contact's first name
-        message_history: List of messages with sent_from and message_text
+        user_name: The user's name
+        message_history: The conversation's messages with sent_from and message_text
+        use_cache: Reuse the response to an identical earlier request
     """
-    if not message_history:
-        return ConversationTopicAnalysis(
-            topic="Sin conversaciones",
-            summary="No hay mensajes registrados para analizar.",
-        )
+    prompt = build_prompt(
+        head=f"Analiza la siguiente conversación entre {user_name} y {first_name}.",
+        history=conversation_lines(message_history),
+        budget=ANALYSIS_PROMPT_TOKENS,
+        history_heading="\nMensajes:",
+        tail="\nIdentifica el tema principal de forma concisa (2-5 palabras), el tono general de la conversación y proporciona un breve resumen de lo que se discutió.",
+    )
+    prompt_metrics.record("conversation", prompt)
+    messages = [{"role": "user", "content": prompt.text}]
 
-    # Get the last 20 messages for topic analysis
-    recent_messages = message_history[-20:]
-    history_text = "\n".join(
-        f"- {msg['sent_from']}: {msg['message_text']}" for msg in recent_messages
+    return await create_cached(
+        client,
+        model="claude-sonnet-4-5-20250929",
+        max_tokens=256,
+        messages=messages,
+        response_model=ConversationAnalysis,
+        use_cache=use_cache,
     )
 
-    system_prompt = f"""Analiza los siguientes mensajes recientes de una conversación con {first_name} y determina el tema principal de la última conversación.
 
-Mensajes recientes:
-{history_text}
+async def analyze_sessions_and_health(
+    client: instructor.AsyncInstructor,
+    first_name: str,
+    relationship_type: str,
+    conversation_summaries: list[dict],
+    new_conversations: list[list[dict]],
+    user_name: str,
+    total_interactions: int,
+    response_time_median_min: float | None,
+    communication_balance: float | None,
+    use_cache: bool = True,
+) -> SessionsAndHealthAnalysis:
+    """Analyze new conversations and the relationship health in one call.
+
+    Does the work of analyze_conversation for each new conversation and of
+    analyze_relationship_health, over a single shared context.
 
-Identifica el tema principal de forma concisa (2-5 palabras) y proporciona un breve resumen de lo que se discutió."""
+    Args:
+        new_conversations: Messages of each conversation not summarized yet,
+            oldest first, with sent_from and message_text
+        Others as in analyze_relationship_health, conversation_summaries
+        only holding the conversations analyzed before.
 
-    messages = [{"role": "user", "content": system_prompt}]
+    Each part gets the budget it would have in its own call.
+    """
+    conversations = [
+        build_prompt(
+            head=f"\nConversación nueva {number}:",
+            history=conversation_lines(messages),
+            budget=ANALYSIS_PROMPT_TOKENS,
+        )
+        for number, messages in enumerate(new_conversations, start=1)
+    ]
+    health = relationship_health_prompt(
+        first_name=first_name,
+        relationship_type=relationship_type,
+        conversation_summaries=conversation_summaries,
+        user_name=user_name,
+        total_interactions=total_interactions,
+        response_time_median_min=response_time_median_min,
+        communication_balance=communication_balance,
+    )
+    text = "\n".join(
+        [
+            health.text,
+            "\nConversaciones nuevas, de la más antigua a la más reciente:",
+            *(conversation.text for conversation in conversations),
+            "\nPrimero, para cada conversación nueva y en el mismo orden, identifica el tema principal de forma concisa (2-5 palabras), el tono general y proporciona un breve resumen de lo que se discutió. Luego evalúa la salud de la relación considerando también las conversaciones nuevas.",
+        ]
+    )
+    prompt = BuiltPrompt(
+        text=text,
+        tokens=estimate_tokens(text),
+        history_included=health.history_included
+        + sum(conversation.history_included for conversation in conversations),
+        history_total=health.history_total
+        + sum(conversation.history_total for conversation in conversations),
+    )
+    prompt_metrics.record("fused", prompt)
+    messages = [{"role": "user", "content": prompt.text}]
 
-    response = client.chat.completions.create(
+    return await create_cached(
+        client,
         model="claude-sonnet-4-5-20250929",
-        max_tokens=256,
+        max_tokens=512 + 256 * len(new_conversations),
         messages=messages,
-        response_model=ConversationTopicAnalysis,
+        response_model=SessionsAndHealthAnalysis,
+        use_cache=use_cache,
     )
+
+
+async def create_cached(
+    client: instructor.AsyncInstructor,
+    model: str,
+    max_tokens: int,
+    messages: list[dict],
+    response_model: Type[M],
+    use_cache: bool = True,
+) -> M:
+    """Structured completion, answered from the response cache if possible.
+
+    Only for analyses, whose answer may be reused. The persona chat must
+    never go through here.
+    """
+    if not use_cache:
+        return await client.chat.completions.create(
+            model=model,
+            max_tokens=max_tokens,
+            messages=messages,
+            response_model=response_model,
+        )
+
+    key = cache_key(model, messages, response_model, max_tokens)
+    cached = await llm_response_cache.get(key, response_model)
+    if cached is not None:
+        return cached
+    response = await client.chat.completions.create(
+        model=model,
+        max_tokens=max_tokens,
+        messages=messages,
+        response_model=response_model,
+    )
+    await llm_response_cache.put(key, response)
     return response
+
+
+def conversation_lines(message_history: list[dict]) -> list[str]:
+    return [
+        f"- {msg['sent_from']}: {clip(msg['message_text'])}" for msg in message_history
+    ]
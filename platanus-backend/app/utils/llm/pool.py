@@ -0,0 +1,198 @@
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Callable, Optional
+
+import httpx
+import instructor
+from anthropic import AsyncAnthropic
+from pydantic import BaseModel
+
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "5"))
+# Generous, a long completion sends nothing until it is done
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+
+
+class PoolMetrics(BaseModel):
+    """Connection pool usage since the client was created."""
+
+    max_connections: int
+    in_use: int
+    idle: int
+    # Requests waiting for a connection right now
+    waiting: int
+    requests: int
+    wait_seconds_total: float
+    wait_seconds_max: float
+    wait_seconds_mean: float
+
+
+class MeteredTransport(httpx.AsyncBaseTransport):
+    """Hands out at most `max_connections` connections and measures the wait.
+
+    A request holds its slot until its response is closed, so a streamed
+    completion counts as in use for as long as it streams.
+    """
+
+    def __init__(self, transport: httpx.AsyncHTTPTransport, max_connections: int):
+        self.transport = transport
+        self.max_connections = max_connections
+        self._slots = asyncio.Semaphore(max_connections)
+        self.in_use = 0
+        self.waiting = 0
+        self.requests = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        wait = time.perf_counter() - started
+        self.requests += 1
+        self.wait_seconds_total += wait
+        self.wait_seconds_max = max(self.wait_seconds_max, wait)
+
+        self.in_use += 1
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            self._release()
+            raise
+        response.stream = ReleasingStream(response.stream, self._release)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+    def idle_connections(self) -> int:
+        # httpx doesn't expose its pool, only httpcore's connections say if idle
+        pool = getattr(self.transport, "_pool", None)
+        if pool is None:
+            return 0
+        return sum(1 for connection in pool.connections if connection.is_idle())
+
+    def _release(self):
+        self.in_use -= 1
+        self._slots.release()
+
+
+class ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives the connection slot back once closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self.stream = stream
+        self.release: Optional[Callable[[], None]] = release
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self.stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self.stream.aclose()
+        finally:
+            if self.release is not None:
+                self.release()
+                self.release = None
+
+
+class LLMClientPool:
+    """One LLM client for the whole process, over a shared connection pool.
+
+    Connections are kept alive between requests, so chats and stats
+    refreshes skip the TCP and TLS setup after the first call. The client
+    is created on first use, or when the app starts, and closed on shutdown.
+    """
+
+    max_connections: int
+    max_keepalive_connections: int
+    keepalive_seconds: float
+    connect_timeout_seconds: float
+    timeout_seconds: float
+
+    def __init__(
+        self,
+        max_connections: int = LLM_MAX_CONNECTIONS,
+        max_keepalive_connections: int = LLM_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_seconds: float = LLM_KEEPALIVE_SECONDS,
+        connect_timeout_seconds: float = LLM_CONNECT_TIMEOUT_SECONDS,
+        timeout_seconds: float = LLM_TIMEOUT_SECONDS,
+    ):
+        self.max_connections = max(max_connections, 1)
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_seconds = keepalive_seconds
+        self.connect_timeout_seconds = connect_timeout_seconds
+        self.timeout_seconds = timeout_seconds
+        self._transport: Optional[MeteredTransport] = None
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._client: Optional[instructor.AsyncInstructor] = None
+
+    async def start(self):
+        self.client()
+
+    async def stop(self):
+        if self._http_client is not None:
+            await self._http_client.aclose()
+        self._transport = None
+        self._http_client = None
+        self._client = None
+
+    def client(self) -> instructor.AsyncInstructor:
+        """The shared instructor-wrapped async Anthropic client."""
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_keepalive_connections,
+                keepalive_expiry=self.keepalive_seconds,
+            )
+            timeout = httpx.Timeout(
+                self.timeout_seconds, connect=self.connect_timeout_seconds
+            )
+            self._transport = MeteredTransport(
+                httpx.AsyncHTTPTransport(limits=limits), self.max_connections
+            )
+            self._http_client = httpx.AsyncClient(
+                transport=self._transport, timeout=timeout
+            )
+            self._client = instructor.from_anthropic(
+                AsyncAnthropic(http_client=self._http_client, timeout=timeout)
+            )
+        return self._client
+
+    def metrics(self) -> PoolMetrics:
+        transport = self._transport
+        if transport is None:
+            return PoolMetrics(
+                max_connections=self.max_connections,
+                in_use=0,
+                idle=0,
+                waiting=0,
+                requests=0,
+                wait_seconds_total=0.0,
+                wait_seconds_max=0.0,
+                wait_seconds_mean=0.0,
+            )
+        return PoolMetrics(
+            max_connections=self.max_connections,
+            in_use=transport.in_use,
+            idle=transport.idle_connections(),
+            waiting=transport.waiting,
+            requests=transport.requests,
+            wait_seconds_total=transport.wait_seconds_total,
+            wait_seconds_max=transport.wait_seconds_max,
+            wait_seconds_mean=(
+                transport.wait_seconds_total / transport.requests
+                if transport.requests
+                else 0.0
+            ),
+        )
+
+
+llm_client_pool = LLMClientPool()
@@ -0,0 +1,112 @@
+import logging
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Sequence
+
+from pydantic import BaseModel
+
+# Budgets in estimated tokens, for the whole prompt including the profile
+# or instructions block, which is always kept
+PERSONA_PROMPT_TOKENS = int(os.getenv("PERSONA_PROMPT_TOKENS", "6000"))
+ANALYSIS_PROMPT_TOKENS = int(os.getenv("ANALYSIS_PROMPT_TOKENS", "3000"))
+# A single pasted wall of text is clipped to this
+MAX_MESSAGE_TOKENS = int(os.getenv("MAX_MESSAGE_TOKENS", "250"))
+
+# Claude averages about 4 characters per token on Spanish and English chat
+CHARS_PER_TOKEN = 4
+
+logger = logging.getLogger(__name__)
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count, for budgeting without a tokenizer round trip."""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def clip(text: str, max_tokens: int = MAX_MESSAGE_TOKENS) -> str:
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    return text if len(text) <= max_chars else text[: max_chars - 1] + "…"
+
+
+@dataclass
+class BuiltPrompt:
+    text: str
+    tokens: int
+    # History lines that fit the budget, out of those given
+    history_included: int
+    history_total: int
+
+
+def build_prompt(
+    head: str,
+    history: Sequence[str],
+    budget: int,
+    history_heading: str = "",
+    tail: str = "",
+) -> BuiltPrompt:
+    """Head, then as much recent history as fits the budget, then tail.
+
+    The head (profile, metrics, instructions) and tail are reserved first.
+    History lines are oldest first and packed from the newest back, so the
+    oldest are dropped when over budget. The heading is left out along with
+    the history if none of it fits.
+    """
+    reserved = estimate_tokens(head) + estimate_tokens(tail)
+    if history:
+        reserved += estimate_tokens(history_heading) + 1
+    lines = pack_history(history, budget - reserved)
+
+    parts = [head]
+    if lines:
+        parts.append(history_heading)
+        parts.extend(lines)
+    if tail:
+        parts.append(tail)
+    text = "\n".join(parts)
+    return BuiltPrompt(text, estimate_tokens(text), len(lines), len(history))
+
+
+def pack_history(lines: Sequence[str], budget: int) -> List[str]:
+    """The most recent lines whose estimated tokens fit the budget, in order."""
+    packed: List[str] = []
+    used = 0
+    for line in reversed(lines):
+        # Plus the newline joining it
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            break
+        packed.append(line)
+        used += cost
+    packed.reverse()
+    return packed
+
+
+class PromptKindMetrics(BaseModel):
+    prompts: int = 0
+    tokens_total: int = 0
+    tokens_max: int = 0
+    history_included: int = 0
+    history_dropped: int = 0
+
+
+class PromptMetrics:
+    """Estimated prompt sizes per kind of prompt, since the process started."""
+
+    def __init__(self):
+        self.kinds: Dict[str, PromptKindMetrics] = {}
+
+    def record(self, kind: str, prompt: BuiltPrompt):
+        metrics = self.kinds.setdefault(kind, PromptKindMetrics())
+        dropped = prompt.history_total - prompt.history_included
+        metrics.prompts += 1
+        metrics.tokens_total += prompt.tokens
+        metrics.tokens_max = max(metrics.tokens_max, prompt.tokens)
+        metrics.history_included += prompt.history_included
+        metrics.history_dropped += dropped
+        logger.info(
+            f"{kind} prompt: ~{prompt.tokens} tokens, "
+            f"{prompt.history_included}/{prompt.history_total} history lines"
+        )
+
+
+prompt_metrics = PromptMetrics()
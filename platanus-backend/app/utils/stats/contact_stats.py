@@ -0,0 +1,68 @@
+from datetime import datetime
+from typing import Optional
+
+from .response_times import USER_SENDER, ResponseTimes
+
+
+class ContactStatsAccumulator:
+    """Deterministic contact stats, folded one message at a time in time order.
+
+    A response time runs from the first message of one sender's run to the
+    first message of the other sender's reply. Carrying the current run in
+    `last_sender` and `last_run_start` lets a stored accumulator pick up new
+    messages exactly where it stopped. A message older than the last one seen
+    can't be folded in; it flips `in_order` and the stats must be rebuilt.
+    """
+
+    def __init__(
+        self,
+        total_interactions: int = 0,
+        sent_count: int = 0,
+        received_count: int = 0,
+        last_interaction_date: Optional[datetime] = None,
+        last_sender: Optional[str] = None,
+        last_run_start: Optional[datetime] = None,
+        response_times: Optional[ResponseTimes] = None,
+    ):
+        self.total_interactions = total_interactions
+        self.sent_count = sent_count
+        self.received_count = received_count
+        self.last_interaction_date = last_interaction_date
+        self.last_sender = last_sender
+        self.last_run_start = last_run_start
+        self.response_times = response_times or ResponseTimes()
+        self.in_order = True
+
+    def add(self, time: datetime, sent_from: str) -> Optional[float]:
+        """Fold in a message, returning the response time it closes, if any."""
+        if self.last_interaction_date is not None and time < self.last_interaction_date:
+            self.in_order = False
+            return None
+
+        self.total_interactions += 1
+        if sent_from == USER_SENDER:
+            self.sent_count += 1
+        else:
+            self.received_count += 1
+
+        response_time_min = None
+        if sent_from != self.last_sender:
+            if self.last_run_start is not None:
+                response_time_min = (time - self.last_run_start).total_seconds() / 60
+                self.response_times.add(response_time_min, sent_from)
+            self.last_sender = sent_from
+            self.last_run_start = time
+        self.last_interaction_date = time
+        return response_time_min
+
+    @property
+    def response_time_median_min(self) -> Optional[float]:
+        return self.response_times.overall.quantile(0.5)
+
+    @property
+    def communication_balance(self) -> float:
+        if not self.total_interactions:
+            return 0.0
+        if self.received_count == 0:
+            return 1.0
+        return self.sent_count / self.received_count
@@ -0,0 +1,54 @@
+from datetime import date, datetime, timezone
+from typing import Any, Dict, Optional
+
+from .response_times import USER_SENDER
+from .sketch import QuantileSketch
+
+
+class DailyStats:
+    """Interactions of one day: messages each way, who opened, reply times.
+
+    A reply counts on the day it was sent, however long the wait. Sketches
+    merge, so days fold into weeks or months without the records, and an
+    upload adds to a stored day without revisiting it.
+    """
+
+    def __init__(
+        self,
+        sent_count: int = 0,
+        received_count: int = 0,
+        initiator: Optional[str] = None,
+        response_times: Optional[QuantileSketch] = None,
+    ):
+        self.sent_count = sent_count
+        self.received_count = received_count
+        self.initiator = initiator
+        self.response_times = response_times or QuantileSketch()
+
+    def add(self, sent_from: str, response_time_min: Optional[float] = None):
+        if sent_from == USER_SENDER:
+            self.sent_count += 1
+        else:
+            self.received_count += 1
+        if response_time_min is not None:
+            self.response_times.add(response_time_min)
+
+    def merge(self, later: "DailyStats"):
+        """Fold in stats of the same or a later period."""
+        self.sent_count += later.sent_count
+        self.received_count += later.received_count
+        if self.initiator is None:
+            self.initiator = later.initiator
+        self.response_times.merge(later.response_times)
+
+    @property
+    def response_time_median_min(self) -> Optional[float]:
+        return self.response_times.quantile(0.5)
+
+    def sketch_json(self) -> Optional[Dict[str, Any]]:
+        return self.response_times.to_json() if self.response_times.count else None
+
+
+def day_of(time: datetime) -> date:
+    # Days are UTC, matching date() over the stored times in SQL
+    return time.astimezone(timezone.utc).date()
@@ -0,0 +1,77 @@
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from .sketch import QuantileSketch
+
+USER_SENDER = "user"
+
+
+class ResponseTimeSummary(BaseModel):
+    median_min: Optional[float]
+    p90_min: Optional[float]
+    p99_min: Optional[float]
+    # How long the user takes to answer the contact, and the other way round
+    user_median_min: Optional[float]
+    contact_median_min: Optional[float]
+
+
+class ResponseTimes:
+    """Response-time distribution, overall and split by who is answering.
+
+    Each split is a mergeable QuantileSketch, so samples can be added one at
+    a time while streaming the records, and a stored distribution can take
+    in a new upload without the history.
+    """
+
+    overall: QuantileSketch
+    by_user: QuantileSketch
+    by_contact: QuantileSketch
+
+    def __init__(
+        self,
+        overall: Optional[QuantileSketch] = None,
+        by_user: Optional[QuantileSketch] = None,
+        by_contact: Optional[QuantileSketch] = None,
+    ):
+        self.overall = overall or QuantileSketch()
+        self.by_user = by_user or QuantileSketch()
+        self.by_contact = by_contact or QuantileSketch()
+
+    def add(self, minutes: float, responder: str):
+        self.overall.add(minutes)
+        if responder == USER_SENDER:
+            self.by_user.add(minutes)
+        else:
+            self.by_contact.add(minutes)
+
+    def merge(self, other: "ResponseTimes"):
+        self.overall.merge(other.overall)
+        self.by_user.merge(other.by_user)
+        self.by_contact.merge(other.by_contact)
+
+    def summary(self) -> ResponseTimeSummary:
+        return ResponseTimeSummary(
+            median_min=self.overall.quantile(0.5),
+            p90_min=self.overall.quantile(0.9),
+            p99_min=self.overall.quantile(0.99),
+            user_median_min=self.by_user.quantile(0.5),
+            contact_median_min=self.by_contact.quantile(0.5),
+        )
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "overall": self.overall.to_json(),
+            "by_user": self.by_user.to_json(),
+            "by_contact": self.by_contact.to_json(),
+        }
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> "ResponseTimes":
+        if not data:
+            return cls()
+        return cls(
+            overall=QuantileSketch.from_json(data["overall"]),
+            by_user=QuantileSketch.from_json(data["by_user"]),
+            by_contact=QuantileSketch.from_json(data["by_contact"]),
+        )
@@ -0,0 +1,71 @@
+import math
+from typing import Any, Dict, Optional
+
+
+class QuantileSketch:
+    """Mergeable quantile sketch with bounded relative error (DDSketch style).
+
+    Positive values land in logarithmic buckets, so any quantile is known to
+    within `relative_accuracy` of the true value. Memory grows with the range
+    of values, not with how many were added, and two sketches merge by adding
+    their bucket counts. That lets a stored sketch absorb new samples without
+    revisiting the old ones.
+    """
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        self.relative_accuracy = relative_accuracy
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+
+    def add(self, value: float, count: int = 1):
+        if value <= 0:
+            self.zero_count += count
+        else:
+            key = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.count += count
+
+    def merge(self, other: "QuantileSketch"):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Can't merge sketches with different accuracy.")
+        for key, count in other.bins.items():
+            self.bins[key] = self.bins.get(key, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Value at rank floor(q * count), matching `sorted(values)[n // 2]`."""
+        if not self.count:
+            return None
+
+        rank = min(int(q * self.count), self.count - 1)
+        if rank < self.zero_count:
+            return 0.0
+
+        seen = self.zero_count
+        for key in sorted(self.bins):
+            seen += self.bins[key]
+            if seen > rank:
+                return 2 * self._gamma**key / (self._gamma + 1)
+        raise AssertionError("rank beyond sketch count")
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            # JSON object keys are strings
+            "bins": {str(key): count for key, count in self.bins.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: Optional[Dict[str, Any]]) -> "QuantileSketch":
+        if not data:
+            return cls()
+        sketch = cls(relative_accuracy=data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.bins = {int(key): count for key, count in data["bins"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.bins.values())
+        return sketch
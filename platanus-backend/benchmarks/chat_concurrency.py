@@ -0,0 +1,235 @@
+"""Wall time of N concurrent chat websockets against a slow fake LLM.
+
+A fake Anthropic Messages API answers every request after --latency
+seconds, from its own process. The app is served in the benchmark's event
+loop, and N websocket sessions each send one message at the same time.
+With a blocking LLM client the replies come one after another, taking about
+N * latency. With the async client they overlap and take about one latency,
+as long as the shared LLM connection pool (LLM_MAX_CONNECTIONS) has room.
+Run from platanus-backend/:
+
+    uv run python -m benchmarks.chat_concurrency --sessions 1 10 50 --latency 1
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import socket
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, List
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+from websockets.asyncio.client import connect
+
+from benchmarks.record_writer import fresh_database
+
+REPLY = "Hola! Todo bien por acá, ¿y tú qué cuentas de nuevo?"
+# Characters of tool input per streamed event, about a token
+CHUNK_SIZE = 4
+
+
+def fake_anthropic(latency: float, chunk_interval: float = 0.0) -> Starlette:
+    """Starts answering after `latency`, then takes `chunk_interval` seconds
+    per chunk of the reply, streamed as generated if the request asks to."""
+
+    async def messages(request: Request) -> Response:
+        body = await request.json()
+        await asyncio.sleep(latency)
+        tool_name = body["tools"][0]["name"]
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_events(body["model"], tool_name, chunk_interval),
+                media_type="text/event-stream",
+            )
+        # Generated just as long, but sent at once
+        await asyncio.sleep(chunk_interval * len(tool_input_chunks()))
+        # instructor asks for the response model as a forced tool call
+        return JSONResponse(
+            {
+                **message_start(body["model"]),
+                "content": [
+                    {
+                        "type": "tool_use",
+                        "id": "toolu_benchmark",
+                        "name": tool_name,
+                        "input": {"message": REPLY},
+                    }
+                ],
+                "stop_reason": "tool_use",
+                "usage": {"input_tokens": 1, "output_tokens": 1},
+            }
+        )
+
+    return Starlette(routes=[Route("/v1/messages", messages, methods=["POST"])])
+
+
+def message_start(model: str) -> dict:
+    return {
+        "id": "msg_benchmark",
+        "type": "message",
+        "role": "assistant",
+        "model": model,
+        "content": [],
+        "stop_reason": None,
+        "stop_sequence": None,
+        "usage": {"input_tokens": 1, "output_tokens": 0},
+    }
+
+
+def tool_input_chunks() -> List[str]:
+    tool_input = json.dumps({"message": REPLY}, ensure_ascii=False)
+    return [
+        tool_input[start : start + CHUNK_SIZE]
+        for start in range(0, len(tool_input), CHUNK_SIZE)
+    ]
+
+
+async def stream_events(
+    model: str, tool_name: str, chunk_interval: float
+) -> AsyncIterator[str]:
+    yield sse({"type": "message_start", "message": message_start(model)})
+    yield sse(
+        {
+            "type": "content_block_start",
+            "index": 0,
+            "content_block": {
+                "type": "tool_use",
+                "id": "toolu_benchmark",
+                "name": tool_name,
+                "input": {},
+            },
+        }
+    )
+    for chunk in tool_input_chunks():
+        yield sse(
+            {
+                "type": "content_block_delta",
+                "index": 0,
+                "delta": {"type": "input_json_delta", "partial_json": chunk},
+            }
+        )
+        await asyncio.sleep(chunk_interval)
+    yield sse({"type": "content_block_stop", "index": 0})
+    yield sse(
+        {
+            "type": "message_delta",
+            "delta": {"stop_reason": "tool_use", "stop_sequence": None},
+            "usage": {"output_tokens": 1},
+        }
+    )
+    yield sse({"type": "message_stop"})
+
+
+def sse(event: dict) -> str:
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+
+def bound_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+def serve_fake_anthropic(
+    sock: socket.socket,
+    app_factory: Callable[[float, float], Starlette],
+    latency: float,
+    chunk_interval: float,
+):
+    uvicorn.Server(
+        uvicorn.Config(app_factory(latency, chunk_interval), log_level="warning")
+    ).run(sockets=[sock])
+
+
+def start_fake_anthropic(
+    latency: float,
+    chunk_interval: float = 0.0,
+    app_factory: Callable[[float, float], Starlette] = fake_anthropic,
+) -> multiprocessing.Process:
+    """Serve the fake API from its own process, so it never waits on the app."""
+    sock = bound_socket()
+    sock.listen(1024)
+    process = multiprocessing.Process(
+        target=serve_fake_anthropic,
+        args=(sock, app_factory, latency, chunk_interval),
+        daemon=True,
+    )
+    process.start()
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{sock.getsockname()[1]}"
+    return process
+
+
+async def chat_session(port: int, person_id: int, token: str):
+    async with connect(f"ws://127.0.0.1:{port}/chat/{person_id}?token={token}") as ws:
+        await ws.send(json.dumps({"message": "Hola, cómo estás?"}))
+        reply = json.loads(await ws.recv())
+        if "response" not in reply:
+            raise RuntimeError(f"Chat failed: {reply}")
+
+
+@asynccontextmanager
+async def serving_app() -> AsyncIterator[int]:
+    """Serve the app on a free port, in this event loop, and yield the port."""
+    # Imported once the fake API is configured
+    from app.main import app
+
+    sock = bound_socket()
+    # The benchmark database is already set up, skip the app lifespan
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    serving = asyncio.create_task(server.serve(sockets=[sock]))
+    while not server.started:
+        await asyncio.sleep(0.01)
+    try:
+        yield sock.getsockname()[1]
+    finally:
+        server.should_exit = True
+        await serving
+
+
+async def run(sessions: List[int], latency: float):
+    fake_api = start_fake_anthropic(latency)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    from app.utils.llm.pool import llm_client_pool
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with fresh_database(directory) as (user, person):
+            async with serving_app() as port:
+                print(f"LLM latency {latency:.2f}s")
+                for count in sessions:
+                    start = time.perf_counter()
+                    await asyncio.gather(
+                        *(
+                            chat_session(port, person.id, user.username)
+                            for _ in range(count)
+                        )
+                    )
+                    elapsed = time.perf_counter() - start
+                    pool = llm_client_pool.metrics()
+                    print(
+                        f"{count:>5} sessions: {elapsed:>7.2f}s "
+                        f"(serialized would be {count * latency:.2f}s), "
+                        f"pool wait max {pool.wait_seconds_max:.2f}s, "
+                        f"{pool.idle}/{pool.max_connections} connections idle"
+                    )
+    fake_api.terminate()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 50])
+    argument_parser.add_argument("--latency", type=float, default=1.0)
+    args = argument_parser.parse_args()
+    asyncio.run(run(args.sessions, args.latency))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Time to first byte of chat replies, streamed and not, against a fake LLM.
+
+The fake Anthropic Messages API starts answering after --latency seconds
+and then streams the reply a few characters every --chunk-interval seconds.
+Over a streaming connection (?stream=true) the first delta frame should
+arrive about when the LLM starts answering, well before the complete
+response. Without streaming the first byte is the complete response. Checks
+that the deltas arrive incrementally and add up to the final response. Run
+from platanus-backend/:
+
+    uv run python -m benchmarks.chat_streaming --sessions 10 \\
+        --latency 0.5 --chunk-interval 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import List
+
+from websockets.asyncio.client import connect
+
+from benchmarks.chat_concurrency import REPLY, serving_app, start_fake_anthropic
+from benchmarks.record_writer import fresh_database
+
+
+@dataclass
+class Reply:
+    first_byte_seconds: float
+    complete_seconds: float
+    deltas: int
+
+
+async def chat_reply(port: int, person_id: int, token: str, stream: bool) -> Reply:
+    url = f"ws://127.0.0.1:{port}/chat/{person_id}?token={token}"
+    if stream:
+        url += "&stream=true"
+    async with connect(url) as ws:
+        start = time.perf_counter()
+        await ws.send(json.dumps({"message": "Hola, cómo estás?"}))
+        first_byte = None
+        arrivals: List[float] = []
+        text = ""
+        while True:
+            frame = json.loads(await ws.recv())
+            now = time.perf_counter() - start
+            if first_byte is None:
+                first_byte = now
+            if "delta" in frame:
+                arrivals.append(now)
+                text += frame["delta"]
+            elif "response" in frame:
+                break
+            else:
+                raise RuntimeError(f"Chat failed: {frame}")
+
+    if frame["response"] != REPLY:
+        raise AssertionError(f"Unexpected response: {frame['response']!r}")
+    if stream:
+        if text != frame["response"]:
+            raise AssertionError(f"Deltas add up to {text!r}, not the response")
+        if len(arrivals) < 2 or arrivals[-1] - arrivals[0] <= 0:
+            raise AssertionError(f"Deltas didn't arrive incrementally: {arrivals}")
+    return Reply(first_byte, now, len(arrivals))
+
+
+async def measure(
+    port: int, person_id: int, token: str, sessions: int, stream: bool
+) -> List[Reply]:
+    return await asyncio.gather(
+        *(chat_reply(port, person_id, token, stream) for _ in range(sessions))
+    )
+
+
+async def run(sessions: int, latency: float, chunk_interval: float):
+    fake_api = start_fake_anthropic(latency, chunk_interval)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with fresh_database(directory) as (user, person):
+            async with serving_app() as port:
+                print(
+                    f"LLM latency {latency:.2f}s, "
+                    f"a chunk every {chunk_interval:.3f}s, {sessions} sessions"
+                )
+                for stream in (False, True):
+                    replies = await measure(
+                        port, person.id, user.username, sessions, stream
+                    )
+                    first_byte = statistics.median(
+                        reply.first_byte_seconds for reply in replies
+                    )
+                    complete = statistics.median(
+                        reply.complete_seconds for reply in replies
+                    )
+                    deltas = statistics.median(reply.deltas for reply in replies)
+                    print(
+                        f"{'streamed' if stream else 'whole':>9}: "
+                        f"first byte {first_byte:>6.2f}s, "
+                        f"complete {complete:>6.2f}s, {deltas:.0f} deltas (medians)"
+                    )
+    fake_api.terminate()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--sessions", type=int, default=10)
+    argument_parser.add_argument("--latency", type=float, default=0.5)
+    argument_parser.add_argument("--chunk-interval", type=float, default=0.05)
+    args = argument_parser.parse_args()
+    asyncio.run(run(args.sessions, args.latency, args.chunk_interval))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Rows/sec of RecordWriter per batch size, and end-to-end WhatsApp upload time.
+
+Every run gets a fresh SQLite database in a temporary directory. Run from
+platanus-backend/:
+
+    uv run python -m benchmarks.record_writer --rows 100000 \\
+        --batch-sizes 100 500 1000 2000 5000 10000 \\
+        --uploads 100000 1000000 5000000
+"""
+
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Tuple
+
+from starlette.datastructures import Headers, UploadFile
+from tortoise import Tortoise
+
+from app.db import Person, User
+from app.routers.contacts.records.integrations.whatsapp import _parse_export
+from app.routers.contacts.records.utils import (
+    ingest_parsed_messages,
+    parsed_message_to_record,
+)
+from app.routers.contacts.records.writer import RecordWriter
+from app.utils.chat_parsers.message_parser import ParsedMessage
+from app.utils.chat_parsers.parallel import shutdown_parse_executor
+from app.utils.chat_parsers.specific.whatsapp_archive import WhatsAppExport
+from app.utils.chat_parsers.specific.whatsapp_message_parser import (
+    WhatsAppMessagesParser,
+)
+from benchmarks.whatsapp_parser import iter_synthetic_export, synthetic_export
+
+
+@asynccontextmanager
+async def fresh_database(directory: str) -> AsyncIterator[Tuple[User, Person]]:
+    path = tempfile.mktemp(suffix=".db", dir=directory)
+    await Tortoise.init(db_url=f"sqlite://{path}", modules={"models": ["app.db"]})
+    await Tortoise.generate_schemas()
+    try:
+        user = await User.create(username="benchmark", password="-")
+        person = await Person.create(
+            user=user,
+            first_name="Ana",
+            last_name="Benchmark",
+            relationship_type="Amigo",
+            birthday="1990-01-01",
+            personality_tags=[],
+            notes="",
+        )
+        yield user, person
+    finally:
+        await Tortoise.close_connections()
+
+
+async def compare_batch_sizes(rows: int, batch_sizes: List[int], directory: str):
+    messages = list(WhatsAppMessagesParser().iter_parse(synthetic_export(rows)))
+    print(f"RecordWriter, {len(messages):,} records")
+    for batch_size in batch_sizes:
+        async with fresh_database(directory) as (_, person):
+            result = await RecordWriter(batch_size=batch_size).write(
+                records(messages, person.id)
+            )
+        print(
+            f"{batch_size:>8}: {result.rows_per_second:>12,.0f} rows/s "
+            f"({result.elapsed_seconds:.2f}s, {result.batches:,} batches)"
+        )
+
+
+async def records(messages: List[ParsedMessage], person_id: int):
+    for message in messages:
+        yield parsed_message_to_record(message, person_id=person_id, source="whatsapp")
+
+
+async def measure_upload(lines: int, directory: str):
+    path = os.path.join(directory, f"chat-{lines}.txt")
+    with open(path, "w", encoding="utf-8") as export_file:
+        for line in iter_synthetic_export(lines):
+            export_file.write(line + "\n")
+
+    async with fresh_database(directory) as (user, person):
+        with open(path, "rb") as export_file:
+            upload = UploadFile(
+                export_file,
+                filename="chat.txt",
+                headers=Headers({"content-type": "text/plain"}),
+            )
+            start = time.perf_counter()
+            result = await ingest_parsed_messages(
+                _parse_export(WhatsAppMessagesParser(), WhatsAppExport(upload)),
+                person_id=person.id,
+                user=user,
+                source="whatsapp",
+            )
+            elapsed = time.perf_counter() - start
+    os.remove(path)
+
+    print(
+        f"{lines:>10,} lines: {elapsed:>8.2f}s end to end "
+        f"({result.inserted:,} records, {result.rows_per_second:,.0f} rows/s)"
+    )
+
+
+async def run(args: argparse.Namespace):
+    with tempfile.TemporaryDirectory() as directory:
+        if args.batch_sizes:
+            await compare_batch_sizes(args.rows, args.batch_sizes, directory)
+        if args.uploads:
+            print("WhatsApp upload")
+            for lines in args.uploads:
+                await measure_upload(lines, directory)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--rows", type=int, default=100_000)
+    argument_parser.add_argument(
+        "--batch-sizes", type=int, nargs="*", default=[100, 500, 1000, 2000, 5000]
+    )
+    argument_parser.add_argument(
+        "--uploads", type=int, nargs="*", default=[100_000, 1_000_000, 5_000_000]
+    )
+    args = argument_parser.parse_args()
+    try:
+        asyncio.run(run(args))
+    finally:
+        shutdown_parse_executor()
+
+
+if __name__ == "__main__":
+    main()
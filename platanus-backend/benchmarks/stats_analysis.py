@@ -0,0 +1,201 @@
+"""LLM wall time and tokens of a stats refresh in each analysis mode.
+
+A fake Anthropic Messages API, in its own process, answers the session,
+health and fused analyses after --latency seconds plus --token-interval
+seconds per output token, and counts the tokens it was sent and returned
+(about 4 characters each, tool schemas included). A contact gets --sessions
+conversations of --messages messages. Each mode then refreshes its stats
+twice: with none of the sessions analyzed yet, as after an import, and with
+only the last one new, as after a regular upload. These skip the LLM
+response cache, which is then shown answering a refresh with nothing new.
+Run from platanus-backend/:
+
+    uv run python -m benchmarks.stats_analysis --sessions 10 --messages 40 \\
+        --latency 1 --token-interval 0.01
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, get_args
+
+import httpx
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+from app.db import Person, Record, SessionAnalysis, User
+from app.routers.contacts.records.utils import parsed_message_to_record
+from app.routers.contacts.stats_cache import (
+    AnalysisMode,
+    rebuild_stats_cache,
+    refresh_llm_stats,
+)
+from app.utils.chat_parsers.message_parser import ParsedMessage
+from app.utils.llm.pool import llm_client_pool
+from benchmarks.chat_concurrency import message_start, start_fake_anthropic
+from benchmarks.record_writer import fresh_database
+
+CONVERSATION = {
+    "topic": "Planes del fin de semana",
+    "sentiment": "Positivo",
+    "summary": "Coordinaron una salida al cerro el sábado y quién lleva qué.",
+}
+HEALTH = {
+    "health_score": 78,
+    "health_status": "Buena",
+    "reasoning": "Conversan seguido, con tono cercano y respuestas rápidas.",
+}
+# Marks each conversation in the fused prompt
+NEW_CONVERSATION = "Conversación nueva "
+
+
+def tokens(value) -> int:
+    return len(json.dumps(value, ensure_ascii=False)) // 4
+
+
+def fake_analysis_llm(latency: float, token_interval: float) -> Starlette:
+    usage = {"requests": 0, "input_tokens": 0, "output_tokens": 0}
+
+    async def messages(request: Request) -> JSONResponse:
+        body = await request.json()
+        tool_name = body["tools"][0]["name"]
+        if tool_name == "ConversationAnalysis":
+            tool_input = CONVERSATION
+        elif tool_name == "HealthScoreAnalysis":
+            tool_input = HEALTH
+        else:
+            prompt = body["messages"][0]["content"]
+            count = prompt.count(NEW_CONVERSATION)
+            tool_input = {"conversations": [CONVERSATION] * count, "health": HEALTH}
+
+        input_tokens = tokens(body["messages"]) + tokens(body["tools"])
+        output_tokens = tokens(tool_input)
+        usage["requests"] += 1
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+        await asyncio.sleep(latency + output_tokens * token_interval)
+        return JSONResponse(
+            {
+                **message_start(body["model"]),
+                "content": [
+                    {
+                        "type": "tool_use",
+                        "id": "toolu_benchmark",
+                        "name": tool_name,
+                        "input": tool_input,
+                    }
+                ],
+                "stop_reason": "tool_use",
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            }
+        )
+
+    async def read_usage(request: Request) -> JSONResponse:
+        return JSONResponse(usage)
+
+    return Starlette(
+        routes=[
+            Route("/v1/messages", messages, methods=["POST"]),
+            Route("/usage", read_usage),
+        ]
+    )
+
+
+async def fake_usage() -> Dict[str, int]:
+    async with httpx.AsyncClient() as client:
+        response = await client.get(f"{os.environ['ANTHROPIC_BASE_URL']}/usage")
+        return response.json()
+
+
+async def add_conversations(person: Person, sessions: int, messages: int):
+    """Conversations a day apart, alternating senders a minute apart."""
+    start = datetime(2024, 1, 1, 10)
+    records = []
+    for session in range(sessions):
+        for index in range(messages):
+            sender = "Ana Benchmark" if index % 2 else "benchmark"
+            records.append(
+                parsed_message_to_record(
+                    ParsedMessage(
+                        timestamp=start + timedelta(days=session, minutes=index),
+                        sender=sender,
+                        message_text=f"Mensaje {index} de la conversación {session}, "
+                        "sobre lo que vamos a hacer el fin de semana",
+                    ),
+                    person_id=person.id,
+                    source="whatsapp",
+                )
+            )
+    await Record.bulk_create(records, batch_size=1000)
+
+
+async def measure(
+    person: Person,
+    user: User,
+    mode: AnalysisMode,
+    forget: int,
+    use_cache: bool = False,
+):
+    """Refresh with the analyses of the latest `forget` sessions dropped."""
+    analyses = await SessionAnalysis.filter(person_id=person.id).order_by("-started_at")
+    for analysis in analyses[:forget]:
+        await analysis.delete()
+    cache = await rebuild_stats_cache(person.id)
+
+    before = await fake_usage()
+    start = time.perf_counter()
+    await refresh_llm_stats(
+        llm_client_pool.client(), cache, person, user, mode=mode, use_cache=use_cache
+    )
+    elapsed = time.perf_counter() - start
+    after = await fake_usage()
+
+    calls = after["requests"] - before["requests"]
+    input_tokens = after["input_tokens"] - before["input_tokens"]
+    output_tokens = after["output_tokens"] - before["output_tokens"]
+    print(
+        f"{mode:>11}: {elapsed:>6.2f}s, {calls:>3} calls, "
+        f"{input_tokens:>7,} input + {output_tokens:>5,} output tokens"
+    )
+
+
+async def run(sessions: int, messages: int, latency: float, token_interval: float):
+    fake_api = start_fake_anthropic(latency, token_interval, fake_analysis_llm)
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+
+    with tempfile.TemporaryDirectory() as directory:
+        async with fresh_database(directory) as (user, person):
+            await add_conversations(person, sessions, messages)
+            print(
+                f"{sessions} sessions of {messages} messages, LLM latency "
+                f"{latency:.2f}s + {token_interval * 1000:.0f}ms per output token"
+            )
+            for forget, label in ((sessions, "all sessions new"), (1, "one new")):
+                print(label)
+                for mode in get_args(AnalysisMode):
+                    await measure(person, user, mode, forget)
+            print("nothing new, twice through the LLM response cache")
+            for _ in range(2):
+                await measure(person, user, "concurrent", 0, use_cache=True)
+    await llm_client_pool.stop()
+    fake_api.terminate()
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--sessions", type=int, default=10)
+    argument_parser.add_argument("--messages", type=int, default=40)
+    argument_parser.add_argument("--latency", type=float, default=1.0)
+    argument_parser.add_argument("--token-interval", type=float, default=0.01)
+    args = argument_parser.parse_args()
+    asyncio.run(run(args.sessions, args.messages, args.latency, args.token_interval))
+
+
+if __name__ == "__main__":
+    main()
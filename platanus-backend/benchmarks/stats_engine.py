@@ -0,0 +1,71 @@
+"""Cold contact stats: the old four record scans against the SQL stats engine.
+
+Run from platanus-backend/:
+
+    uv run python -m benchmarks.stats_engine --messages 300000
+"""
+
+import argparse
+import asyncio
+import tempfile
+import time
+from typing import List, Optional
+
+from app.db import Record
+from app.routers.contacts.records.writer import RecordWriter
+from app.routers.contacts.stats_engine import compute_contact_stats
+from app.utils.chat_parsers.specific.whatsapp_message_parser import (
+    WhatsAppMessagesParser,
+)
+from benchmarks.record_writer import fresh_database, records
+from benchmarks.whatsapp_parser import synthetic_export
+
+
+async def legacy_stats(person_id: int) -> Optional[float]:
+    """What a cache miss used to cost: three full loads and a latest()."""
+    all_records = await Record.filter(person_id=person_id).all()
+    await Record.filter(person_id=person_id).latest("time")
+
+    ordered = sorted(
+        await Record.filter(person_id=person_id).all(), key=lambda r: r.time
+    )
+    response_times: List[float] = []
+    for previous, current in zip(ordered, ordered[1:]):
+        if previous.sent_from != current.sent_from:
+            response_times.append((current.time - previous.time).total_seconds() / 60)
+
+    balance_records = await Record.filter(person_id=person_id).all()
+    sum(1 for r in balance_records if r.sent_from == "user")
+    len(all_records)
+
+    response_times.sort()
+    return response_times[len(response_times) // 2] if response_times else None
+
+
+async def measure(name: str, compute, person_id: int):
+    start = time.perf_counter()
+    await compute(person_id)
+    print(f"{name:>8}: {time.perf_counter() - start:>8.2f}s")
+
+
+async def run(messages: int):
+    parsed_messages = list(
+        WhatsAppMessagesParser().iter_parse(synthetic_export(messages))
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        async with fresh_database(directory) as (_, person):
+            await RecordWriter().write(records(parsed_messages, person.id))
+            print(f"Cold stats for {len(parsed_messages):,} records")
+            await measure("before", legacy_stats, person.id)
+            await measure("after", compute_contact_stats, person.id)
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--messages", type=int, default=300_000)
+    args = argument_parser.parse_args()
+    asyncio.run(run(args.messages))
+
+
+if __name__ == "__main__":
+    main()
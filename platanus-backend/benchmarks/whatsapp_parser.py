@@ -0,0 +1,108 @@
+"""Lines/sec of the WhatsApp parser against the previous regex + strptime path.
+
+Run from platanus-backend/:
+
+    uv run python -m benchmarks.whatsapp_parser --lines 1000000
+"""
+
+import argparse
+import random
+import re
+import time
+from datetime import datetime, timedelta
+from typing import Iterator, List, Optional
+
+from app.utils.chat_parsers.message_parser import ParsedMessage
+from app.utils.chat_parsers.specific.whatsapp_message_parser import (
+    WhatsAppMessageMerger,
+    WhatsAppMessagesParser,
+)
+
+SENDERS = ("Juan Perez", "Ana")
+WORDS = ("hola", "que", "tal", "bien", "oye", "mañana", "vamos", "jaja", "ok", "si")
+
+
+def synthetic_export(lines: int, seed: int = 0) -> List[str]:
+    """Two-person export with a few multi-line messages, as exported by iOS."""
+    return list(iter_synthetic_export(lines, seed))
+
+
+def iter_synthetic_export(lines: int, seed: int = 0) -> Iterator[str]:
+    rng = random.Random(seed)
+    current = datetime(2019, 1, 1, 8, 0, 0)
+    produced = 0
+    while produced < lines:
+        current += timedelta(seconds=rng.randint(1, 3600))
+        stamp = current.strftime("%d-%m-%y, %I:%M:%S %p")
+        text = " ".join(rng.choices(WORDS, k=rng.randint(1, 12)))
+        yield f"[{stamp}] {rng.choice(SENDERS)}: {text}"
+        produced += 1
+        if produced < lines and rng.random() < 0.05:
+            yield " ".join(rng.choices(WORDS, k=rng.randint(1, 8)))
+            produced += 1
+
+
+class LegacyParser:
+    """The three-search + strptime parser this module replaced."""
+
+    time_pattern = re.compile(r"\[(.*?)\]")
+    message_pattern = re.compile(r": (.*)", re.DOTALL)
+    user_pattern = re.compile(r"\](.*?):")
+
+    @classmethod
+    def iter_parse(cls, lines: List[str]) -> Iterator[ParsedMessage]:
+        merger = WhatsAppMessageMerger()
+        for line in lines:
+            parsed_message = cls._parse_message(merger.feed(line))
+            if parsed_message is not None:
+                yield parsed_message
+        parsed_message = cls._parse_message(merger.flush())
+        if parsed_message is not None:
+            yield parsed_message
+
+    @classmethod
+    def _parse_message(cls, message: Optional[str]) -> Optional[ParsedMessage]:
+        if message is None:
+            return None
+        time_match = cls.time_pattern.search(message)
+        user_match = cls.user_pattern.search(message)
+        message_match = cls.message_pattern.search(message)
+        if not time_match or not user_match or not message_match:
+            return None
+        try:
+            parsed_time = datetime.strptime(
+                time_match.group(1), "%d-%m-%y, %I:%M:%S %p"
+            )
+        except ValueError:
+            return None
+        return ParsedMessage(
+            timestamp=parsed_time,
+            sender=user_match.group(1).strip(),
+            message_text=message_match.group(1).strip(),
+        )
+
+
+def measure(name: str, parse, lines: List[str]) -> List[ParsedMessage]:
+    start = time.perf_counter()
+    parsed = list(parse(lines))
+    elapsed = time.perf_counter() - start
+    print(
+        f"{name:>8}: {len(lines) / elapsed:>12,.0f} lines/s "
+        f"({elapsed:.2f}s, {len(parsed):,} messages)"
+    )
+    return parsed
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__)
+    argument_parser.add_argument("--lines", type=int, default=1_000_000)
+    args = argument_parser.parse_args()
+
+    lines = synthetic_export(args.lines)
+    before = measure("before", LegacyParser.iter_parse, lines)
+    after = measure("after", WhatsAppMessagesParser().iter_parse, lines)
+    assert before == after, "parsers disagree"
+
+
+if __name__ == "__main__":
+    main()